@@ -1,30 +1,333 @@
 import logging
+import time
 
-from werkzeug.serving import run_simple
+from types import MappingProxyType
 
+from alexandra.deadline import TIMED_OUT, wait_for
+from alexandra.instrument import Instrumentation
 from alexandra.session import Session
-from alexandra.util import respond
-from alexandra.wsgi import WsgiApp
+from alexandra.slots import parse_slots
+from alexandra.util import StaticResponse, application_id, respond
 
 log = logging.getLogger(__name__)
 
+_FunctionType = type(lambda: None)
+
+# inspect.CO_VARARGS and CO_COROUTINE, without importing inspect.
+_CO_VARARGS = 0x04
+_CO_COROUTINE = 0x80
+
 
 class Application:
-    def __init__(self):
-        self.intent_map = {}
-        self.unknown_intent_fn = lambda x, y: respond(text='unknown intent')
-        self.launch_fn = lambda _: respond()
-        self.session_end_fn = respond
+    """An Alexa skill.
+
+    :param application_id: The skill's ID, from the Alexa developer
+        console. When given, requests sent to any other skill are rejected.
+    """
+
+    def __init__(self, application_id=None):
+        self.application_id = application_id
+
+        #: Per-request timing hooks, see :py:mod:`alexandra.instrument`.
+        self.instrumentation = Instrumentation()
+
+        #: :py:class:`alexandra.metrics.MetricsRegistry`, if enabled.
+        self.metrics = None
+
+        #: :py:class:`alexandra.cache.ResponseCache`, if enabled.
+        self.response_cache = None
+
+        #: :py:class:`alexandra.deadline.DeadlineExecutor` handlers are run
+        #: on, if enabled.
+        self.deadline = None
+        self.deadline_fallback_fn = lambda: respond(
+            text="Sorry, that's taking longer than expected. "
+                 "Please try again in a moment.")
+
+        #: :py:class:`alexandra.session.SessionStore` holding session
+        #: attributes server-side, if enabled.
+        self.session_store = None
+        self._session_key = None
+
+        # Hooks registered with before_request, after_request and
+        # error_handler, and the chain they're compiled into (None when
+        # there aren't any, so dispatching doesn't go through it).
+        self.before_request_fns = []
+        self.after_request_fns = []
+        self.error_handler_fns = []
+        self._middleware = None
+        self._async_middleware = None
+
+        # Event loop kept alive between Lambda invocations, for running
+        # async handlers. Created on first use.
+        self._lambda_loop = None
+
+        # Map of request type -> `fn(body, session)`, with every handler
+        # already wrapped to take exactly those two arguments so that
+        # dispatching is a single lookup and call.
+        self._intent_dispatcher = self._dispatch_intent
+        self.request_handlers = {
+            'IntentRequest': self._intent_dispatcher,
+        }
+
+        # Same idea for intents: `{intent_name: fn(slots, session)}`, and
+        # the functions they were registered with.
+        self._intent_handlers = {}
+        self._intent_fns = {}
+
+        # Wrapped handlers (from either map) of ``async def`` functions, by
+        # id() since handlers needn't be hashable. Calling these only
+        # creates a coroutine, so under a deadline they are called directly
+        # rather than on the thread pool.
+        self._coroutine_handlers = {}
+
+        self.launch(lambda _: respond())
+        self.unknown_intent(lambda x, y: respond(text='unknown intent'))
+        self.session_end(respond)
+
+    # Handlers are dispatched from the wrapped forms built when they're
+    # registered, so assigning these goes through the same registration.
+
+    @property
+    def intent_map(self):
+        """Read-only `{intent_name: function}` map of intent handlers. Use
+        :py:meth:`intent` to add to it.
+        """
+
+        return MappingProxyType(self._intent_fns)
+
+    @intent_map.setter
+    def intent_map(self, intent_map):
+        self._intent_handlers.clear()
+        self._intent_fns.clear()
+
+        for intent_name, func in intent_map.items():
+            self.intent(intent_name)(func)
+
+    @property
+    def launch_fn(self):
+        return self._launch_fn
+
+    @launch_fn.setter
+    def launch_fn(self, func):
+        self.launch(func)
+
+    @property
+    def unknown_intent_fn(self):
+        return self._unknown_intent_fn
+
+    @unknown_intent_fn.setter
+    def unknown_intent_fn(self, func):
+        self.unknown_intent(func)
+
+    @property
+    def session_end_fn(self):
+        return self._session_end_fn
+
+    @session_end_fn.setter
+    def session_end_fn(self, func):
+        self.session_end(func)
 
-    def create_wsgi_app(self, validate_requests=True):
+    def create_wsgi_app(self, validate_requests=True, codec=None,
+                        max_content_length=None):
         """Return an object that can be run by any WSGI server (uWSGI,
         etc.) to serve this Alexa application.
+
+        :param codec: JSON codec to use, see :py:mod:`alexandra.codec`.
+            Defaults to orjson if it's installed, otherwise the standard
+            library.
+        :param max_content_length: Largest request body (in bytes) to
+            accept. Bigger requests are rejected with a 413 without being
+            read.
         """
 
-        return WsgiApp(self, validate_requests)
+        # Imported here so Lambda functions never pay for loading Werkzeug.
+        from alexandra.wsgi import WsgiApp
+
+        return WsgiApp(self, validate_requests, codec, max_content_length)
+
+    def create_asgi_app(self, validate_requests=True, codec=None,
+                        max_content_length=None):
+        """Return an object that can be run by any ASGI server (uvicorn,
+        hypercorn, etc.) to serve this Alexa application.
+
+        Handlers may be defined with ``async def`` when served this way.
+
+        :param codec: JSON codec to use, see :py:mod:`alexandra.codec`.
+        :param max_content_length: Largest request body (in bytes) to
+            accept.
+        """
+
+        from alexandra.asgi import AsgiApp
+
+        return AsgiApp(self, validate_requests, codec, max_content_length)
+
+    def enable_metrics(self, path='/metrics', directory=None):
+        """Start collecting per-intent request metrics, and serve them in
+        the Prometheus text format from `GET path` on the WSGI and ASGI apps.
+
+        :param directory: Directory shared by all worker processes of a
+            pre-forking server, so that every scrape reports the totals
+            across all of them rather than whichever worker answered.
+        """
+
+        from alexandra.metrics import MetricsRegistry
+
+        if self.metrics is None:
+            self.metrics = MetricsRegistry(path, directory)
+            self.instrumentation.subscribe(self.metrics.observe)
+
+        return self.metrics
+
+    def enable_response_cache(self, maxsize=4096, window=300):
+        """Remember the response to each request for `window` seconds, and
+        send it straight back (without calling any handler) when Alexa
+        retries the same request.
+
+        Only applies to the WSGI and ASGI apps. See
+        :py:class:`alexandra.cache.ResponseCache`.
+        """
+
+        from alexandra.cache import ResponseCache
+
+        if self.response_cache is None:
+            self.response_cache = ResponseCache(maxsize, window)
+
+        return self.response_cache
+
+    def use_session_store(self, store, key='session_id'):
+        """Keep session attributes in `store` instead of round-tripping them
+        through Alexa on every turn.
+
+        Handlers keep using :py:meth:`alexandra.session.Session.get` and
+        `respond(attributes=...)` exactly as before, but the attributes
+        they return are saved to the store and sent back to Alexa empty.
+
+        :param store: A :py:class:`alexandra.session.SessionStore`, e.g.
+            :py:class:`~alexandra.session.MemorySessionStore` or
+            :py:class:`~alexandra.session.SQLiteSessionStore`.
+        :param key: Either `'session_id'`, to forget attributes when the
+            session ends, or `'user_id'` to remember them for a user across
+            sessions.
+        """
+
+        if key not in ('session_id', 'user_id'):
+            raise ValueError("key must be 'session_id' or 'user_id'")
+
+        self.session_store = store
+        self._session_key = key
+
+    def set_deadline(self, seconds=7.0, max_workers=16):
+        """Run handlers on a bounded thread pool, and give up on any that
+        take longer than `seconds`, responding with the function registered
+        with :py:meth:`deadline_fallback` instead.
+
+        Handlers can find out how much time they have left with
+        :py:func:`alexandra.deadline.remaining`.
+
+        :param seconds: Time budget for each handler. Alexa gives up after
+            about 8 seconds, so leave some room for everything else.
+        :param max_workers: Size of the thread pool.
+        """
+
+        from alexandra.deadline import DeadlineExecutor
+
+        if self.deadline is not None:
+            self.deadline.shutdown()
+
+        self.deadline = DeadlineExecutor(seconds, max_workers)
+
+    def deadline_fallback(self, func):
+        """Decorator to register a function (taking no arguments) whose
+        response is sent when a handler misses its deadline. ::
+
+            @alexa_app.deadline_fallback
+            def still_working():
+                return alexandra.reprompt("I'm still working on that. "
+                                          "Ask me again in a moment.")
+        """
+
+        self.deadline_fallback_fn = func
+        return func
+
+    def before_request(self, func):
+        """Decorator to register a function called with `(body, session)`
+        before every request handler. If it returns anything but None, that
+        is sent as the response and the handler isn't called. ::
+
+            @alexa_app.before_request
+            def require_linked_account(body, session):
+                if session and not session.user_access_token:
+                    return alexandra.respond('Please link your account.')
+
+        See :py:mod:`alexandra.middleware`.
+        """
+
+        self.before_request_fns.append(func)
+        self._compile_middleware()
+
+        return func
+
+    def after_request(self, func):
+        """Decorator to register a function called with `(body, session,
+        response)` after every request, returning the response to send. ::
+
+            @alexa_app.after_request
+            def log_response(body, session, response):
+                log.info('%s -> %s', body['request']['type'], response)
+                return response
+        """
+
+        self.after_request_fns.append(func)
+        self._compile_middleware()
+
+        return func
+
+    def error_handler(self, func):
+        """Decorator to register a function called with `(body, session,
+        exception)` when a handler or hook raises. It returns a response to
+        send instead, or None to let the exception propagate. ::
+
+            @alexa_app.error_handler
+            def apologize(body, session, error):
+                log.exception('handler failed')
+                return alexandra.respond('Sorry, something went wrong.')
+        """
+
+        self.error_handler_fns.append(func)
+        self._compile_middleware()
+
+        return func
+
+    def _compile_middleware(self):
+        from alexandra.middleware import chain
+
+        hooks = (self.before_request_fns, self.after_request_fns,
+                 self.error_handler_fns)
+
+        self._middleware = chain(self._call_handler, *hooks)
+        self._async_middleware = chain(self._call_handler_async, *hooks)
+
+    def _deadline_fallback(self):
+        if self.metrics is not None:
+            self.metrics.deadline_exceeded()
+
+        return self.deadline_fallback_fn()
+
+    async def _await_with_deadline(self, resp, deadline_at):
+        resp = await wait_for(resp, max(0.0, deadline_at - time.monotonic()))
+
+        if resp is TIMED_OUT:
+            log.error('async handler missed its %.1fs deadline',
+                      self.deadline.seconds)
+            return self._deadline_fallback()
+
+        return resp
 
     def run(self, host, port, debug=True, validate_requests=True):
-        """Utility method to quickly get a server up and running.
+        """Utility method to quickly get a server up and running. This is
+        Werkzeug's single-threaded development server; use :py:meth:`serve`
+        in production.
 
         :param debug: turns on Werkzeug debugger, code reloading, and full
             logging.
@@ -36,61 +339,289 @@ class Application:
             # Turn on all alexandra log output
             logging.basicConfig(level=logging.DEBUG)
 
+        from werkzeug.serving import run_simple
+
         app = self.create_wsgi_app(validate_requests)
         run_simple(host, port, app, use_reloader=debug, use_debugger=debug)
 
+    def serve(self, host='0.0.0.0', port=8080, workers=None, threads=8,
+              validate_requests=True, **options):
+        """Serve this application in production from a pre-forked pool of
+        worker processes, each handling requests on several threads. Blocks
+        until the server is stopped with `SIGTERM` or `SIGINT`; `SIGHUP`
+        gracefully replaces the workers.
+
+        :param workers: Number of worker processes. Defaults to the number
+            of CPUs.
+        :param threads: Requests handled concurrently by each worker.
+        :param options: Passed on to
+            :py:class:`alexandra.server.PreforkServer`, e.g. `keepalive`,
+            `certificates` to download before forking, or a `warmup`
+            function.
+        """
+
+        from alexandra.server import PreforkServer
+
+        server = PreforkServer(self.create_wsgi_app(validate_requests),
+                               host, port, workers, threads, **options)
+        server.serve_forever()
+
+    def lambda_handler(self, event, context=None):
+        """Entry point for an AWS Lambda function. Point the function's
+        handler at this directly, e.g. `skill_module.app.lambda_handler`, or
+        call it from your own handler.
+
+        Everything set up at import time (the compiled handler registry,
+        static responses, and the event loop used for ``async def``
+        handlers) is reused by later invocations of a warm container.
+
+        :param event: The Alexa request, as parsed by Lambda.
+        :param context: Lambda context object (unused).
+        """
+
+        if not self.accepts(event):
+            raise ValueError('request for another application: %s' %
+                             application_id(event))
+
+        resp = self.dispatch_request(event)
+
+        if hasattr(resp, '__await__'):
+            if self._lambda_loop is None:
+                import asyncio
+                self._lambda_loop = asyncio.new_event_loop()
+
+            resp = self._lambda_loop.run_until_complete(resp)
+
+        return resp
+
+    def accepts(self, body):
+        """Whether `body` was sent to this skill. Always True unless an
+        `application_id` was given.
+        """
+
+        return self.application_id is None or \
+            application_id(body) == self.application_id
+
     def dispatch_request(self, body):
         """Given a parsed JSON request object, call the correct Intent, Launch,
-        or SessionEnded function.
+        SessionEnded, or other registered request handler.
 
         This function is called after request parsing and validaion and will
         raise a `ValueError` if an unknown request type comes in.
 
+        If the matching handler is a coroutine function, the coroutine is
+        returned un-awaited, for the caller to run. From an event loop, use
+        :py:meth:`dispatch_request_async` instead.
+
         :param body: JSON object loaded from incoming request's POST data.
         """
 
+        req_type, handler, session = self._prepare(body)
+
+        if self._middleware is not None:
+            resp = self._middleware(handler, body, session)
+        elif self.deadline is None:
+            resp = handler(body, session)
+        else:
+            resp = self._call_with_deadline(handler, body, session)
+
+        if session is None or self.session_store is None:
+            return resp
+
+        if hasattr(resp, '__await__'):
+            return self._store_attributes_async(req_type, session, resp)
+
+        return self._store_attributes(req_type, session, resp)
+
+    async def dispatch_request_async(self, body):
+        """Coroutine doing the same as :py:meth:`dispatch_request`, for
+        running on an existing event loop (as the ASGI app does).
+
+        ``async def`` handlers are awaited, and when a deadline is set,
+        plain handlers run on its thread pool without blocking the loop.
+        """
+
+        req_type, handler, session = self._prepare(body)
+
+        if self._async_middleware is not None:
+            resp = self._async_middleware(handler, body, session)
+        else:
+            resp = self._call_handler_async(handler, body, session)
+
+        if hasattr(resp, '__await__'):
+            resp = await resp
+
+        if session is None or self.session_store is None:
+            return resp
+
+        return self._store_attributes(req_type, session, resp)
+
+    def _prepare(self, body):
+        """Find the handler for `body`, and build its session."""
+
         req_type = body.get('request', {}).get('type')
+        handler = self.request_handlers.get(req_type)
+
+        # Namespaced request types (AudioPlayer.PlaybackStarted, ...) can
+        # be handled all at once by registering 'AudioPlayer.*'
+        if handler is None and req_type and '.' in req_type:
+            namespace = req_type.split('.', 1)[0]
+            handler = self.request_handlers.get(namespace + '.*')
+
+        if handler is None:
+            log.error('invalid request type: %s', req_type)
+            raise ValueError('bad request: %s', body)
+
         session_obj = body.get('session')
+        store = self.session_store
+
+        if not session_obj:
+            session = None
+        elif store is None:
+            session = Session(session_obj)
+        else:
+            session = Session(session_obj, store)
+            session.store_key = getattr(session, self._session_key)
+
+        return req_type, handler, session
+
+    def _call_handler(self, handler, body, session):
+        if self.deadline is None:
+            return handler(body, session)
+
+        return self._call_with_deadline(handler, body, session)
+
+    def _call_handler_async(self, handler, body, session):
+        if self.deadline is None:
+            return handler(body, session)
+
+        return self._call_with_deadline_async(handler, body, session)
+
+    def _call_with_deadline(self, handler, body, session):
+        deadline_at = time.monotonic() + self.deadline.seconds
+
+        if self._is_coroutine_handler(handler, body):
+            return self._await_with_deadline(handler(body, session),
+                                             deadline_at)
+
+        resp = self.deadline.call(handler, body, session)
+
+        if resp is TIMED_OUT:
+            return self._deadline_fallback()
+
+        # Coroutines returned by plain functions (e.g. decorators wrapping
+        # an async handler) were created on the pool, so give them whatever
+        # is left of the budget on the event loop.
+        if hasattr(resp, '__await__'):
+            resp = self._await_with_deadline(resp, deadline_at)
+
+        return resp
+
+    async def _call_with_deadline_async(self, handler, body, session):
+        deadline_at = time.monotonic() + self.deadline.seconds
+
+        if self._is_coroutine_handler(handler, body):
+            return await self._await_with_deadline(handler(body, session),
+                                                   deadline_at)
+
+        resp = await self.deadline.call_async(handler, body, session)
+
+        if resp is TIMED_OUT:
+            return self._deadline_fallback()
+
+        if hasattr(resp, '__await__'):
+            resp = await self._await_with_deadline(resp, deadline_at)
+
+        return resp
+
+    def _is_coroutine_handler(self, handler, body):
+        if handler is self._intent_dispatcher:
+            handler = self._intent_handlers.get(
+                body['request']['intent']['name'],
+                self._unknown_intent_handler)
+
+        return id(handler) in self._coroutine_handlers
+
+    def _wrap(self, func, handler):
+        """Remember `handler`, the wrapped form of `func`, if `func` is an
+        ``async def`` function.
+        """
+
+        if _is_coroutine_function(func):
+            self._coroutine_handlers[id(handler)] = handler
+
+        return handler
+
+    def _store_attributes(self, req_type, session, resp):
+        """Move the attributes returned by a handler into the session
+        store, leaving an empty `sessionAttributes` on the response.
+
+        Sessions keyed by session ID are deleted when they end (or when
+        the handler returns no attributes). Attributes keyed by user ID are
+        only ever replaced, and otherwise left to expire.
+        """
 
-        session = Session(session_obj) if session_obj else None
+        if not isinstance(resp, dict):
+            return resp
 
-        if req_type == 'LaunchRequest':
-            return self.launch_fn(session)
+        store = self.session_store
+        attributes = resp.get('sessionAttributes')
 
-        elif req_type == 'IntentRequest':
-            intent = body['request']['intent']['name']
-            intent_fn = self.intent_map.get(intent, self.unknown_intent_fn)
+        if self._session_key == 'session_id':
+            ended = req_type == 'SessionEndedRequest' or \
+                (resp.get('response') or {}).get('shouldEndSession')
 
-            slots = {
-                slot['name']: slot.get('value')
-                for _, slot in
-                body['request']['intent'].get('slots', {}).items()
-            }
+            if ended or not attributes:
+                store.delete(session.store_key)
+            else:
+                store.save(session.store_key, attributes)
 
-            arity = intent_fn.__code__.co_argcount
+        elif attributes:
+            store.save(session.store_key, attributes)
 
-            if arity == 2:
-                return intent_fn(slots, session)
+        # Static responses are read-only, and shared between requests.
+        if attributes and type(resp) is not StaticResponse:
+            resp['sessionAttributes'] = {}
 
-            return intent_fn()
+        return resp
 
-        elif req_type == 'SessionEndedRequest':
-            return self.session_end_fn()
+    async def _store_attributes_async(self, req_type, session, resp):
+        return self._store_attributes(req_type, session, await resp)
 
-        log.error('invalid request type: %s', req_type)
-        raise ValueError('bad request: %s', body)
+    def _dispatch_intent(self, body, session):
+        intent = body['request']['intent']
+        intent_fn = self._intent_handlers.get(intent['name'])
+
+        if intent_fn is None:
+            intent_fn = self._unknown_intent_handler
+
+            if self.metrics is not None:
+                self.metrics.unknown_intent(intent['name'])
+
+        return intent_fn(parse_slots(intent.get('slots', {})), session)
 
     def launch(self, func):
         """Decorator to register a function to be called whenever the
         app receives a LaunchRequest (which happens when someone
-        invokes your skill without specifying an intent). ::
+        invokes your skill without specifying an intent).
+
+        The function can take the :py:class:`alexandra.session.Session`,
+        or no arguments at all. ::
 
             @alexa_app.launch
             def launch_handler(session):
                 pass
         """
 
-        self.launch_fn = func
+        if _accepts(func, 1):
+            handler = self._wrap(func, lambda body, session: func(session))
+        elif _accepts(func, 0):
+            handler = self._wrap(func, lambda body, session: func())
+        else:
+            raise ValueError("expected 0 or 1 argument function")
+
+        self.request_handlers['LaunchRequest'] = handler
+        self._launch_fn = func
         return func
 
     def intent(self, intent_name):
@@ -98,7 +629,12 @@ class Application:
 
         The decorated function can either take 0 or 2 arguments. If two are
         specified, it will be provided a dictionary of `{slot_name: value}` and
-        a :py:class:`alexandra.session.Session` instance.
+        a :py:class:`alexandra.session.Session` instance. Values are
+        :py:class:`alexandra.slots.Slot` strings, which can also be read as
+        numbers, dates, durations or entity resolution IDs.
+
+        Like every other kind of handler, it can be an ``async def``
+        function, see :py:meth:`dispatch_request_async`.
 
         If no session was provided in the request, the session object will be
         `None`. ::
@@ -114,12 +650,40 @@ class Application:
 
         # nested decorator so we can have params.
         def _decorator(func):
-            arity = func.__code__.co_argcount
+            self._intent_handlers[intent_name] = \
+                self._wrap(func, _two_arg_handler(func))
+            self._intent_fns[intent_name] = func
+            return func
+
+        return _decorator
 
-            if arity not in [0, 2]:
-                raise ValueError("expected 0 or 2 argument function")
+    def request_handler(self, request_type):
+        """Decorator to register a handler for any other type of request,
+        such as `CanFulfillIntentRequest`, `Display.ElementSelected` or
+        `System.ExceptionEncountered`.
+
+        Every request type in a namespace can be handled at once by
+        registering e.g. `AudioPlayer.*`; handlers for an exact type take
+        precedence.
+
+        Like intent handlers, the decorated function can take either 0 or 2
+        arguments. If two are specified, it will be given the `request`
+        object from the body, and a :py:class:`alexandra.session.Session`
+        instance (or `None`, which is common for these request types). ::
+
+            @alexa_app.request_handler('AudioPlayer.*')
+            def audio_player_event(request, session):
+                log.info('%s at %s', request['type'],
+                         request.get('offsetInMilliseconds'))
+                return {'version': '1.0', 'response': {}}
+        """
+
+        def _decorator(func):
+            handler = _two_arg_handler(func)
+
+            self.request_handlers[request_type] = self._wrap(
+                func, lambda body, session: handler(body['request'], session))
 
-            self.intent_map[intent_name] = func
             return func
 
         return _decorator
@@ -130,13 +694,92 @@ class Application:
         are malformed.
         """
 
-        self.unknown_intent_fn = func
+        self._unknown_intent_fn = func
+        self._unknown_intent_handler = \
+            self._wrap(func, _two_arg_handler(func))
+
         return func
 
     def session_end(self, func):
         """ Decorator to register a function to be called when a
         SessionEndedRequest is received.
+
+        The function takes no arguments, or, like :py:meth:`request_handler`
+        functions, the `request` object (which says why the session ended)
+        and the session.
         """
 
-        self.session_end_fn = func
+        if _accepts(func, 0):
+            handler = self._wrap(func, lambda body, session: func())
+        else:
+            two_arg = _two_arg_handler(func)
+            handler = self._wrap(func, lambda body, session:
+                                 two_arg(body['request'], session))
+
+        self.request_handlers['SessionEndedRequest'] = handler
+
+        self._session_end_fn = func
         return func
+
+
+def _is_coroutine_function(func):
+    """Like :py:func:`inspect.iscoroutinefunction`, without importing
+    inspect for plain functions.
+    """
+
+    if type(func) is _FunctionType and not hasattr(func, '__wrapped__'):
+        return bool(func.__code__.co_flags & _CO_COROUTINE)
+
+    import inspect
+    return inspect.iscoroutinefunction(func)
+
+
+def _two_arg_handler(func):
+    """Wrap a handler taking either 0 or 2 arguments so it can always be
+    called with two. Done once, at registration time.
+    """
+
+    if _accepts(func, 2):
+        return func
+    elif _accepts(func, 0):
+        return lambda _a, _b: func()
+
+    raise ValueError("expected 0 or 2 argument function")
+
+
+def _accepts(func, count):
+    """Whether `func` can be called with `count` positional arguments.
+
+    Plain functions are checked directly; anything else (decorated
+    functions, partials, methods, callable objects) goes through
+    :py:func:`inspect.signature`, which isn't imported unless needed.
+    """
+
+    if type(func) is _FunctionType and not hasattr(func, '__wrapped__'):
+        code = func.__code__
+        kwdefaults = func.__kwdefaults__ or {}
+
+        if code.co_kwonlyargcount > len(kwdefaults):
+            return False
+
+        required = code.co_argcount - len(func.__defaults__ or ())
+
+        if code.co_flags & _CO_VARARGS:
+            return count >= required
+
+        return required <= count <= code.co_argcount
+
+    import inspect
+
+    try:
+        signature = inspect.signature(func)
+    except (TypeError, ValueError):
+        # Some builtins don't have a signature; assume they're fine.
+        return True
+
+    try:
+        signature.bind(*range(count))
+    except TypeError:
+        return False
+
+    return True
@@ -0,0 +1,256 @@
+import asyncio
+import logging
+
+import alexandra.instrument as instrument
+import alexandra.util as util
+from alexandra.codec import default_codec
+from alexandra.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+
+
+log = logging.getLogger(__name__)
+
+
+class HttpError(Exception):
+    """Raised internally to bail out of a request with the given status."""
+
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+class AsgiApp:
+    """ASGI counterpart of :py:class:`alexandra.wsgi.WsgiApp`.
+
+    Request parsing, validation and dispatch all happen on the event loop.
+    Certificate downloads are pushed to the loop's default executor so a slow
+    fetch never blocks other in-flight requests, and handlers registered with
+    ``async def`` are awaited.
+
+    An instance can be passed to any ASGI server (uvicorn, hypercorn, ...)
+    """
+
+    def __init__(self, alexa, validate_requests=True, codec=None,
+                 max_content_length=None):
+        """
+        :param alexa: :py:class:`alexandra.app.Application` (or
+            :py:class:`alexandra.router.SkillRouter`) to wrap
+        :param validate_requests: Whether or not to do timestamp and
+            certificate validation.
+        :param codec: JSON codec (see :py:mod:`alexandra.codec`) used for
+            request and response bodies. Defaults to the fastest available.
+        :param max_content_length: Largest request body (in bytes) that will
+            be read. Anything bigger is rejected with a 413. Defaults to
+            :py:data:`alexandra.util.MAX_CONTENT_LENGTH`.
+        """
+
+        self.alexa = alexa
+        self.validate = validate_requests
+        self.codec = codec or default_codec()
+        self.max_content_length = \
+            max_content_length or util.MAX_CONTENT_LENGTH
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+
+        if scope['type'] != 'http':
+            raise ValueError('unsupported ASGI scope type: %s' % scope['type'])
+
+        metrics = self.alexa.metrics
+
+        if scope['method'] == 'GET' and metrics is not None and \
+           scope['path'] == metrics.path:
+            body = metrics.render().encode('utf-8')
+            return await self._send(send, 200, body, METRICS_CONTENT_TYPE)
+
+        try:
+            body = await self.asgi_app(scope, receive)
+        except HttpError as exc:
+            log.exception('Failed to handle request')
+            return await self._send(send, exc.status, b'', 'text/plain')
+
+        await self._send(send, 200, body, 'application/json')
+
+    async def asgi_app(self, scope, receive):
+        """Incoming request handler. Returns the encoded response body, or
+        raises :py:class:`HttpError` on failure.
+
+        :param scope: ASGI connection scope
+        :param receive: ASGI receive callable
+        """
+
+        # Only non-None when someone subscribed to the app's instrumentation
+        timing = self.alexa.instrumentation.start()
+        outcome = instrument.ERROR
+
+        try:
+            if scope['method'] != 'POST':
+                raise HttpError(400)
+
+            headers = _request_headers(scope)
+            data = await _read_body(receive, headers, self.max_content_length)
+            if timing:
+                timing.mark('read')
+
+            # As in WsgiApp, check the signature before parsing anything.
+            if self.validate:
+                valid_cert = await self._validate_certificate(headers, data)
+                if timing:
+                    timing.mark('certificate')
+
+                if not valid_cert:
+                    log.error('failed to validate request certificate')
+                    raise HttpError(403)
+
+            try:
+                body = self.codec.loads(data)
+            except ValueError:
+                raise HttpError(400)
+
+            if timing:
+                timing.mark('parse')
+                timing.describe(body)
+
+            if self.validate:
+                valid_ts = util.validate_request_timestamp(body)
+                if timing:
+                    timing.mark('timestamp')
+
+                if not valid_ts:
+                    log.error('failed to validate request timestamp')
+                    raise HttpError(403)
+
+            if not self.alexa.accepts(body):
+                log.error('request for unknown application: %s',
+                          util.application_id(body))
+                raise HttpError(403)
+
+            cache = self.alexa.response_cache
+            request_id = None
+
+            if cache is not None:
+                request_id = (body.get('request') or {}).get('requestId')
+
+            if request_id:
+                data = await cache.get_or_build_async(
+                    request_id, lambda: self._respond(body, timing))
+            else:
+                data = await self._respond(body, timing)
+
+            outcome = instrument.OK
+            return data
+
+        except HttpError as exc:
+            outcome = instrument.INVALID if exc.status == 403 \
+                else instrument.BAD_REQUEST
+            raise
+
+        finally:
+            if timing:
+                self.alexa.instrumentation.emit(timing, outcome)
+
+    async def _respond(self, body, timing):
+        """Dispatch a validated request and return the encoded response."""
+
+        resp_obj = await self.alexa.dispatch_request_async(body)
+
+        if timing:
+            timing.mark('dispatch')
+
+        if type(resp_obj) is util.StaticResponse:
+            data = resp_obj.data
+        else:
+            data = self.codec.dumps(resp_obj)
+
+        if timing:
+            timing.mark('encode')
+
+        return data
+
+    async def _validate_certificate(self, headers, data):
+        signature = util._signature_headers(headers)
+
+        if not signature:
+            return False
+
+        cert_url, sig, algorithm = signature
+
+        cert = util._cached_certificate(cert_url)
+        if cert is None:
+            loop = asyncio.get_event_loop()
+            cert = await loop.run_in_executor(
+                None, util._get_certificate, cert_url)
+
+        return util._verify_signature(cert, sig, data, algorithm)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _send(self, send, status, body, content_type):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', content_type.encode('latin-1')),
+                (b'content-length', str(len(body)).encode('latin-1')),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+async def _read_body(receive, headers, limit):
+    """Collect the full request body from an ASGI receive callable into a
+    single buffer, giving up with a 413 as soon as it's over `limit` bytes.
+    """
+
+    length = headers.get('Content-Length')
+
+    if length is not None and length.isdigit() and int(length) > limit:
+        raise HttpError(413)
+
+    data = bytearray()
+
+    while True:
+        message = await receive()
+
+        if message['type'] == 'http.disconnect':
+            raise HttpError(400)
+
+        data += message.get('body', b'')
+
+        if len(data) > limit:
+            raise HttpError(413)
+
+        if not message.get('more_body', False):
+            return data
+
+
+# The headers we care about, keyed by their lowercase ASGI name.
+_HEADERS = {
+    b'content-length': 'Content-Length',
+    b'signaturecertchainurl': 'SignatureCertChainUrl',
+    b'signature': 'Signature',
+    b'signature-256': 'Signature-256',
+}
+
+
+def _request_headers(scope):
+    """Map the (lowercased, bytes) ASGI headers onto the names expected by
+    :py:func:`alexandra.util.validate_request_certificate`.
+    """
+
+    headers = {}
+
+    for name, value in scope.get('headers', []):
+        key = _HEADERS.get(name.lower())
+        if key:
+            headers[key] = value.decode('latin-1')
+
+    return headers
@@ -0,0 +1,254 @@
+"""Small thread-safe caching primitives used throughout alexandra."""
+
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class _Flight:
+    """A load in progress that other threads can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class LRUCache:
+    """Bounded least-recently-used cache where every entry carries its own
+    expiration time.
+
+    All operations are guarded by a single lock, and
+    :py:meth:`get_or_load` makes sure concurrent misses for the same key
+    share one call to the loader instead of each running their own.
+
+    :param maxsize: Maximum number of entries to hold before evicting the
+        least recently used one.
+    :param clock: Function returning the current time in seconds since the
+        epoch. Only useful for testing.
+    """
+
+    def __init__(self, maxsize=128, clock=time.time):
+        self.maxsize = maxsize
+        self.clock = clock
+
+        self.hits = 0
+        self.misses = 0
+
+        self._data = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None, count_miss=True):
+        """Return the cached value for `key`, or `default` if it's missing or
+        has expired.
+
+        :param count_miss: Pass False when a miss is followed by a call to
+            :py:meth:`get_or_load`, which counts it instead.
+        """
+
+        with self._lock:
+            value = self._get(key, count_miss)
+
+        return default if value is None else value
+
+    def set(self, key, value, expires=None):
+        """Store `value` under `key`.
+
+        :param expires: Time (seconds since the epoch) after which the entry
+            is no longer valid. `None` means it never expires.
+        """
+
+        with self._lock:
+            self._set(key, value, expires)
+
+    def items(self):
+        """Snapshot of the `(key, value)` pairs that haven't expired. Doesn't
+        affect recency or the hit/miss counters.
+        """
+
+        now = self.clock()
+
+        with self._lock:
+            return [
+                (key, value)
+                for key, (value, expires) in self._data.items()
+                if expires is None or expires > now
+            ]
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for `key`, calling `loader` to produce it
+        on a miss.
+
+        `loader` takes no arguments and returns a `(value, expires)` tuple.
+        A value of `None` is handed back to the caller but not cached.
+
+        If another thread is already loading `key`, this waits for that load
+        to finish and returns its result rather than starting a second one.
+        Exceptions raised by the loader are re-raised in every waiting thread.
+        """
+
+        with self._lock:
+            value = self._get(key)
+            if value is not None:
+                return value
+
+            flight = self._flights.get(key)
+            leader = flight is None
+
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value, expires = loader()
+            flight.value = value
+        except Exception as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                if flight.value is not None:
+                    self._set(key, flight.value, expires)
+                del self._flights[key]
+
+            flight.done.set()
+
+        return value
+
+    def _get(self, key, count_miss=True):
+        entry = self._data.get(key)
+
+        if entry is None:
+            self.misses += count_miss
+            return None
+
+        value, expires = entry
+        if expires is not None and expires <= self.clock():
+            del self._data[key]
+            self.misses += count_miss
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def _set(self, key, value, expires):
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+class ResponseCache:
+    """Encoded responses, keyed by the `requestId` of the request that
+    produced them, so a request Alexa retries (or that is replayed) within
+    `window` seconds gets exactly the same response without running its
+    handler again.
+
+    :py:func:`alexandra.util.validate_request_timestamp` accepts timestamps
+    up to 150 seconds either side of the current time, so a request stamped
+    150 seconds in the future can be replayed for 300 seconds after it first
+    arrives. The default window covers all of that, after which duplicates
+    are rejected anyway.
+
+    :param maxsize: Maximum number of responses to hold.
+    :param window: Seconds to remember each response for.
+    """
+
+    def __init__(self, maxsize=4096, window=300, clock=time.time):
+        self.window = window
+        self.clock = clock
+        self._cache = LRUCache(maxsize, clock)
+
+        # requestId -> asyncio.Future, for get_or_build_async
+        self._futures = {}
+
+    def __repr__(self):
+        return '<ResponseCache %d responses>' % len(self._cache)
+
+    def __len__(self):
+        return len(self._cache)
+
+    @property
+    def hits(self):
+        """Number of duplicate requests answered from the cache."""
+        return self._cache.hits
+
+    def get(self, request_id):
+        """Return the stored response for `request_id`, or None."""
+        return self._cache.get(request_id)
+
+    def store(self, request_id, data):
+        self._cache.set(request_id, data, self.clock() + self.window)
+
+    def get_or_build(self, request_id, build):
+        """Return the stored response for `request_id`, or call `build` to
+        produce (and store) it. A duplicate arriving while the original is
+        still being handled waits for it instead of running the handler a
+        second time.
+        """
+
+        return self._cache.get_or_load(
+            request_id, lambda: (build(), self.clock() + self.window))
+
+    async def get_or_build_async(self, request_id, build):
+        """:py:meth:`get_or_build` for the event loop, where `build` is a
+        coroutine function. A duplicate arriving while the original is still
+        being handled awaits the same result.
+        """
+
+        import asyncio
+
+        data = self.get(request_id)
+        if data is not None:
+            return data
+
+        future = self._futures.get(request_id)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = self._futures[request_id] = \
+            asyncio.get_event_loop().create_future()
+
+        try:
+            data = await build()
+            self.store(request_id, data)
+            future.set_result(data)
+        except Exception as exc:
+            future.set_exception(exc)
+            # Nobody may be waiting; don't warn about it going unretrieved.
+            future.exception()
+            raise
+        finally:
+            del self._futures[request_id]
+
+            if not future.done():
+                future.cancel()
+
+        return data
@@ -0,0 +1,447 @@
+"""Parsing and verification of the certificate chains Amazon signs requests
+with.
+
+The expensive work (parsing the PEM, checking the chain of trust and the
+subject alternative names, extracting the public key) happens once per
+certificate URL. Each request afterwards only costs a single signature check
+against the cached public key.
+"""
+
+import calendar
+import hashlib
+import logging
+import os
+import posixpath
+import re
+import ssl
+import tempfile
+import threading
+import time
+
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, padding
+
+from urllib.parse import urlparse
+
+
+log = logging.getLogger(__name__)
+
+# Domain that must be present in the signing certificate.
+SIGNING_DOMAIN = 'echo-api.amazon.com'
+
+_PEM_RE = re.compile(
+    b'-----BEGIN CERTIFICATE-----.+?-----END CERTIFICATE-----', re.DOTALL)
+
+# Fraction of a certificate's lifetime after which we start trying to
+# download a fresh copy in the background.
+REFRESH_FRACTION = 0.9
+
+_HASHES = {
+    'sha1': hashes.SHA1,
+    'sha256': hashes.SHA256,
+}
+
+_roots = None
+_roots_lock = threading.Lock()
+
+
+class SigningCertificate:
+    """An Amazon certificate chain that has already been checked for trust.
+
+    Instances are only handed out by :py:func:`load_certificate`, so simply
+    holding one means the chain validated.
+
+    :param chain: List of `cryptography` certificates, leaf first.
+    """
+
+    def __init__(self, chain):
+        self.chain = chain
+        self.leaf = chain[0]
+        self.public_key = self.leaf.public_key()
+
+        #: Seconds since the epoch after which some part of the chain is no
+        #: longer valid.
+        self.not_after = min(_not_after(cert) for cert in chain)
+
+        not_before = max(_not_before(cert) for cert in chain)
+
+        #: Seconds since the epoch after which this certificate should be
+        #: replaced by a fresh download, while still being served.
+        self.refresh_at = not_before + \
+            REFRESH_FRACTION * (self.not_after - not_before)
+
+    def __repr__(self):
+        return '<SigningCertificate %s>' % self.leaf.subject
+
+    def has_expired(self, now=None):
+        return (now or time.time()) >= self.not_after
+
+    def needs_refresh(self, now=None):
+        return (now or time.time()) >= self.refresh_at
+
+    def verify(self, sig, data, algorithm='sha1'):
+        """Return True if `sig` is a valid signature of `data` by this
+        certificate's key.
+
+        :param algorithm: Either `'sha1'` (the `Signature` header) or
+            `'sha256'` (the `Signature-256` header).
+        """
+
+        try:
+            self.public_key.verify(
+                sig, data, padding.PKCS1v15(), _HASHES[algorithm]())
+            return True
+        except InvalidSignature:
+            return False
+
+
+class CertificateStore:
+    """Directory of verified certificate chains, shared by every process on
+    a host.
+
+    Pre-forked workers each have their own in-memory certificate cache, so
+    without this every worker would download the same PEM after a restart.
+    Entries are written atomically (write to a temporary file, then rename),
+    so readers never see a partially written chain.
+
+    Only chains that passed :py:func:`load_certificate` are saved, and they
+    are validated again whenever they're read back.
+
+    :param directory: Where to keep the certificates. Created if missing.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+
+    def __repr__(self):
+        return '<CertificateStore %s>' % self.directory
+
+    def path(self, cert_url):
+        digest = hashlib.sha256(cert_url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest + '.pem')
+
+    def load(self, cert_url):
+        """Return the raw PEM data stored for `cert_url`, or None."""
+
+        try:
+            with open(self.path(cert_url), 'rb') as fp:
+                return fp.read()
+        except IOError:
+            return None
+
+    def save(self, cert_url, pem):
+        """Atomically store the raw PEM data for `cert_url`."""
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(pem)
+            os.replace(tmp_path, self.path(cert_url))
+        except OSError:
+            log.exception('failed to store certificate %s', cert_url)
+
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def discard(self, cert_url):
+        try:
+            os.unlink(self.path(cert_url))
+        except OSError:
+            pass
+
+
+class CertificateRefresher(threading.Thread):
+    """Background thread that re-downloads cached certificates before they
+    expire.
+
+    Requests keep being served with the old certificate until the new one
+    has been downloaded and verified, so no request ever waits on S3 for a
+    certificate that was merely getting old.
+
+    :param cache: :py:class:`alexandra.cache.LRUCache` of certificates.
+    :param refresh: Function taking a certificate URL that downloads,
+        verifies and caches a fresh copy.
+    :param interval: Seconds between checks of the cache.
+    """
+
+    def __init__(self, cache, refresh, interval=60):
+        super().__init__(name='alexandra-cert-refresher')
+        self.daemon = True
+
+        self.cache = cache
+        self.refresh = refresh
+        self.interval = interval
+
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.refresh_due()
+
+    def refresh_due(self):
+        """Refresh every cached certificate that is past its refresh time."""
+
+        now = time.time()
+
+        for cert_url, cert in self.cache.items():
+            if not cert.needs_refresh(now):
+                continue
+
+            try:
+                self.refresh(cert_url)
+            except Exception:
+                log.exception('failed to refresh certificate %s', cert_url)
+
+    def stop(self):
+        self._stopped.set()
+
+
+class TrustPolicy:
+    """Where signing certificates may be downloaded from, and which ones are
+    trusted once they have been.
+
+    The default policy is Amazon's: certificates must come from
+    `https://s3.amazonaws.com/echo.api/`, be issued for
+    `echo-api.amazon.com`, and chain up to a root in the system CA bundle.
+    Anything else is only useful for testing, see
+    :py:mod:`alexandra.testing`.
+
+    :param scheme: Required URL scheme.
+    :param hosts: Allowed URL hosts (with an optional port).
+    :param path_prefix: Required prefix of the (normalized) URL path.
+    :param domain: Domain the leaf certificate must be issued for.
+    :param roots: Trusted roots, as returned by :py:func:`load_roots`.
+        Defaults to the system CA bundle.
+    """
+
+    def __init__(self, scheme='https',
+                 hosts=('s3.amazonaws.com', 's3.amazonaws.com:443'),
+                 path_prefix='/echo.api/', domain=SIGNING_DOMAIN, roots=None):
+        self.scheme = scheme
+        self.hosts = frozenset(host.lower() for host in hosts)
+        self.path_prefix = path_prefix
+        self.domain = domain
+        self.roots = roots
+
+    def __repr__(self):
+        return '<TrustPolicy %s://%s%s>' % (
+            self.scheme, ','.join(sorted(self.hosts)), self.path_prefix)
+
+    def allows_url(self, cert_url):
+        """Sanity check the location of a certificate before downloading it,
+        so we don't get some random person's cert.
+        """
+
+        url = urlparse(cert_url)
+        path = posixpath.normpath(url.path)
+
+        return url.scheme == self.scheme and \
+            url.netloc.lower() in self.hosts and \
+            path.startswith(self.path_prefix)
+
+    def load_certificate(self, pem):
+        """:py:func:`load_certificate`, with this policy's domain and
+        roots.
+        """
+
+        return load_certificate(pem, self.domain, self.roots)
+
+
+#: The policy requests from Amazon are checked against.
+AMAZON = TrustPolicy()
+
+
+def load_certificate(pem, domain=SIGNING_DOMAIN, roots=None, now=None):
+    """Parse and validate a PEM certificate chain as described by Amazon's
+    request verification docs.
+
+    Returns a :py:class:`SigningCertificate`, or None if the chain is
+    expired, isn't valid for `domain`, or doesn't lead to a trusted root.
+
+    :param pem: Raw PEM data, leaf certificate first.
+    :param roots: Trusted root certificates. Defaults to the system CA
+        bundle.
+    """
+
+    now = now or time.time()
+
+    try:
+        chain = [
+            x509.load_pem_x509_certificate(block, default_backend())
+            for block in _PEM_RE.findall(pem)
+        ]
+    except ValueError:
+        log.error('malformed certificate')
+        return None
+
+    if not chain:
+        log.error('no certificates found')
+        return None
+
+    expired = any(
+        _not_before(cert) > now or _not_after(cert) <= now
+        for cert in chain
+    )
+
+    if expired or domain not in _domains(chain[0]):
+        log.error('certificate expired or invalid')
+        return None
+
+    if roots is None:
+        roots = _system_roots()
+
+    if not _chain_is_trusted(chain, roots):
+        log.error('certificate chain invalid')
+        return None
+
+    return SigningCertificate(chain)
+
+
+def _chain_is_trusted(chain, roots):
+    """Each certificate must be signed by the next, which must be a CA, and
+    the last one must be (or be signed by) a trusted root.
+    """
+
+    for depth, (cert, issuer) in enumerate(zip(chain, chain[1:])):
+        if cert.issuer != issuer.subject or \
+                not _may_issue(issuer, depth) or \
+                not _signed_by(cert, issuer):
+            return False
+
+    last = chain[-1]
+    depth = len(chain) - 1
+
+    return any(
+        root == last or (_may_issue(root, depth) and _signed_by(last, root))
+        for root in roots.get(last.issuer, ())
+    )
+
+
+def _may_issue(cert, depth):
+    """Can `cert` sign certificates, with `depth` intermediate CAs between
+    it and the leaf?
+
+    Without this, anyone holding any certificate from a trusted root could
+    use its key to issue themselves one for the signing domain.
+    """
+
+    try:
+        constraints = cert.extensions.get_extension_for_class(
+            x509.BasicConstraints).value
+    except x509.ExtensionNotFound:
+        return False
+
+    if not constraints.ca:
+        return False
+
+    if constraints.path_length is not None and \
+            constraints.path_length < depth:
+        return False
+
+    try:
+        usage = cert.extensions.get_extension_for_class(x509.KeyUsage).value
+    except x509.ExtensionNotFound:
+        return True
+
+    return usage.key_cert_sign
+
+
+def _signed_by(cert, issuer):
+    key = issuer.public_key()
+
+    try:
+        if isinstance(key, ec.EllipticCurvePublicKey):
+            key.verify(cert.signature, cert.tbs_certificate_bytes,
+                       ec.ECDSA(cert.signature_hash_algorithm))
+        else:
+            key.verify(cert.signature, cert.tbs_certificate_bytes,
+                       padding.PKCS1v15(), cert.signature_hash_algorithm)
+        return True
+    except (InvalidSignature, ValueError):
+        return False
+
+
+def _domains(cert):
+    """DNS names a certificate is valid for, falling back to the subject CN
+    when there is no subjectAltName extension.
+    """
+
+    try:
+        ext = cert.extensions.get_extension_for_class(
+            x509.SubjectAlternativeName)
+        return ext.value.get_values_for_type(x509.DNSName)
+    except x509.ExtensionNotFound:
+        return [
+            attr.value for attr in
+            cert.subject.get_attributes_for_oid(x509.NameOID.COMMON_NAME)
+        ]
+
+
+def _not_before(cert):
+    when = getattr(cert, 'not_valid_before_utc', None) or cert.not_valid_before
+    return calendar.timegm(when.utctimetuple())
+
+
+def _not_after(cert):
+    when = getattr(cert, 'not_valid_after_utc', None) or cert.not_valid_after
+    return calendar.timegm(when.utctimetuple())
+
+
+def _system_roots():
+    """Load (once) the system CA bundle as a map of subject -> [cert]."""
+
+    global _roots
+
+    with _roots_lock:
+        if _roots is None:
+            _roots = load_roots(_read_system_bundle())
+
+    return _roots
+
+
+def load_roots(pem):
+    """Build a root store suitable for :py:func:`load_certificate` out of a
+    PEM bundle.
+    """
+
+    roots = {}
+
+    for block in _PEM_RE.findall(pem):
+        try:
+            cert = x509.load_pem_x509_certificate(block, default_backend())
+        except ValueError:
+            continue
+
+        roots.setdefault(cert.subject, []).append(cert)
+
+    return roots
+
+
+def _read_system_bundle():
+    paths = ssl.get_default_verify_paths()
+
+    for path in [paths.cafile, paths.openssl_cafile]:
+        if not path:
+            continue
+
+        try:
+            with open(path, 'rb') as fp:
+                return fp.read()
+        except IOError:
+            continue
+
+    log.warning('no system CA bundle found, certificate chains will not '
+                'be trusted')
+    return b''
@@ -0,0 +1,67 @@
+"""JSON encoding and decoding of request and response bodies.
+
+A codec is any object with two methods:
+
+- `loads(data)`, parsing raw request bytes into a Python object
+- `dumps(obj)`, encoding a response object into compact JSON bytes
+
+:py:func:`default_codec` picks the fastest one available.
+"""
+
+import json
+
+
+class JsonCodec:
+    """Codec using the standard library's :py:mod:`json` module."""
+
+    def __init__(self):
+        self._encoder = json.JSONEncoder(separators=(',', ':'))
+
+    def __repr__(self):
+        return '<JsonCodec>'
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def dumps(self, obj):
+        return self._encoder.encode(obj).encode('utf-8')
+
+
+class OrjsonCodec:
+    """Codec using `orjson <https://github.com/ijl/orjson>`_, which is
+    considerably faster than the standard library for both directions.
+
+    Responses are encoded the same way :py:class:`JsonCodec` would: keys
+    that aren't strings (like the ints in `{1: 'a'}`) are converted rather
+    than rejected, and anything else orjson refuses, such as integers too
+    big for 64 bits, is handed to the standard library.
+    """
+
+    def __init__(self):
+        import orjson
+
+        self.loads = orjson.loads
+
+        self._dumps = orjson.dumps
+        self._option = orjson.OPT_NON_STR_KEYS
+        self._fallback = JsonCodec()
+
+    def __repr__(self):
+        return '<OrjsonCodec>'
+
+    def dumps(self, obj):
+        try:
+            return self._dumps(obj, option=self._option)
+        except TypeError:
+            return self._fallback.dumps(obj)
+
+
+def default_codec():
+    """Return an :py:class:`OrjsonCodec` if orjson is installed, otherwise a
+    :py:class:`JsonCodec`.
+    """
+
+    try:
+        return OrjsonCodec()
+    except ImportError:
+        return JsonCodec()
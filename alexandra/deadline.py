@@ -0,0 +1,271 @@
+"""Running handlers within Alexa's response deadline.
+
+Alexa gives up on a request after about 8 seconds. When enabled with
+:py:meth:`alexandra.app.Application.set_deadline`, handlers run on a
+bounded thread pool, and if one doesn't finish in time the request gets a
+fallback response instead of an error. Handlers can check how much of
+their budget is left with :py:func:`remaining`::
+
+    @app.intent('Recommend')
+    def recommend(slots, session):
+        picks = catalog.search(slots['Genre'], timeout=deadline.remaining())
+        ...
+
+Handlers that need several backends can call them all at once, rather than
+one after another, with :py:func:`gather` (from ``async def`` handlers) or
+:py:func:`fan_out` (from plain ones). Both only wait for whatever is left
+of the deadline, so one slow backend costs its part of the response
+instead of the whole request::
+
+    @app.intent('Home')
+    async def home(slots, session):
+        profile, picks = await deadline.gather(
+            profiles.get(session.user_id), catalog.recommend(session.user_id))
+        ...
+"""
+
+import concurrent.futures
+import logging
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+try:
+    from contextvars import ContextVar
+except ImportError:  # Python 3.6
+    ContextVar = None
+
+
+log = logging.getLogger(__name__)
+
+#: Returned by :py:meth:`DeadlineExecutor.call` when the handler took too
+#: long.
+TIMED_OUT = object()
+
+_local = threading.local()
+
+# Deadline of the async handler running in the current task. Without
+# contextvars (Python 3.6), async handlers are still held to their deadline,
+# but `remaining()` can't tell them how much of it is left.
+_task_deadline = ContextVar('alexandra_deadline', default=None) \
+    if ContextVar else None
+
+#: Seconds of the deadline :py:func:`gather` and :py:func:`fan_out` leave
+#: the handler by default, to build its response from what came back.
+MARGIN = 0.1
+
+# Thread pool used by `fan_out`, created on first use.
+_fan_out_pool = None
+_fan_out_lock = threading.Lock()
+
+
+def remaining():
+    """Seconds left before the current request's deadline, or None when not
+    running under one.
+    """
+
+    deadline = _current_deadline()
+
+    if deadline is None:
+        return None
+
+    return max(0.0, deadline - time.monotonic())
+
+
+def _current_deadline():
+    """`time.monotonic()` value of the current request's deadline, whether
+    it's a plain handler on the pool or an async one on the event loop.
+    """
+
+    deadline = getattr(_local, 'deadline', None)
+
+    if deadline is None and _task_deadline is not None:
+        deadline = _task_deadline.get()
+
+    return deadline
+
+
+class DeadlineExecutor:
+    """Calls handlers on a thread pool, waiting at most `seconds` for each.
+
+    A handler that misses its deadline keeps running on its pool thread
+    (Python threads can't be killed), but the request that called it moves
+    on. If every pool thread is stuck, new requests time out while queued.
+
+    :param seconds: Time budget for each handler call.
+    :param max_workers: Size of the thread pool.
+    """
+
+    def __init__(self, seconds, max_workers=16):
+        self.seconds = seconds
+        self.pool = ThreadPoolExecutor(
+            max_workers, thread_name_prefix='alexandra-handler')
+
+    def call(self, fn, *args):
+        """Return `fn(*args)`, or :py:data:`TIMED_OUT` if it didn't finish
+        within the deadline. Exceptions raised by `fn` are re-raised.
+        """
+
+        deadline = time.monotonic() + self.seconds
+        future = self.pool.submit(_call_with_deadline, deadline, fn, args)
+
+        try:
+            return future.result(timeout=self.seconds)
+        except TimeoutError:
+            future.cancel()
+            log.error('handler %r missed its %.1fs deadline', fn, self.seconds)
+            return TIMED_OUT
+
+    async def call_async(self, fn, *args):
+        """Like :py:meth:`call`, but awaits the pool from an event loop
+        instead of blocking it.
+        """
+
+        import asyncio
+
+        deadline = time.monotonic() + self.seconds
+        future = self.pool.submit(_call_with_deadline, deadline, fn, args)
+
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(future), self.seconds)
+        except asyncio.TimeoutError:
+            log.error('handler %r missed its %.1fs deadline', fn, self.seconds)
+            return TIMED_OUT
+
+    def shutdown(self, wait=False):
+        self.pool.shutdown(wait=wait)
+
+
+async def wait_for(awaitable, seconds):
+    """Await `awaitable` for at most `seconds`, returning
+    :py:data:`TIMED_OUT` if it takes longer. :py:func:`remaining` works
+    inside it (on Python 3.7 and up).
+    """
+
+    import asyncio
+
+    token = None
+    if _task_deadline is not None:
+        token = _task_deadline.set(time.monotonic() + seconds)
+
+    try:
+        # The task wait_for wraps the coroutine in copies the context now,
+        # deadline included.
+        return await asyncio.wait_for(awaitable, seconds)
+    except asyncio.TimeoutError:
+        return TIMED_OUT
+    finally:
+        if token is not None:
+            _task_deadline.reset(token)
+
+
+async def gather(*awaitables, timeout=None, default=None):
+    """Run `awaitables` concurrently, and return their results in order.
+
+    Any that haven't finished after `timeout` seconds (by default, whatever
+    is left of the request's deadline less :py:data:`MARGIN`, or forever
+    without one) are cancelled, and `default` is returned in their place.
+    If any raise, the first of their exceptions is raised once the rest are
+    done.
+    """
+
+    import asyncio
+
+    if timeout is None:
+        timeout = _default_timeout()
+
+    tasks = [asyncio.ensure_future(aw) for aw in awaitables]
+    if not tasks:
+        return []
+
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+
+    for task in pending:
+        task.cancel()
+
+    return _results(tasks, pending, default, lambda task: task.exception())
+
+
+def fan_out(*calls, timeout=None, default=None):
+    """Call each of `calls` (functions taking no arguments) concurrently on
+    a shared thread pool, and return their results in order.
+
+    For plain handlers, this is what :py:func:`gather` is for ``async def``
+    ones: calls still running after `timeout` seconds (by default, whatever
+    is left of the request's deadline less :py:data:`MARGIN`) give
+    `default` instead, and are left to finish in the background.
+    :py:func:`remaining` works inside the calls.
+    """
+
+    if timeout is None:
+        timeout = _default_timeout()
+
+    deadline = _current_deadline()
+    pool = _get_fan_out_pool()
+
+    futures = [pool.submit(_call_with_deadline, deadline, fn, ())
+               for fn in calls]
+
+    _, pending = concurrent.futures.wait(futures, timeout)
+
+    for future in pending:
+        future.cancel()
+
+    return _results(futures, pending, default,
+                    lambda future: future.exception(0))
+
+
+def _default_timeout():
+    left = remaining()
+
+    if left is None:
+        return None
+
+    return max(0.0, left - MARGIN)
+
+
+def _results(futures, pending, default, exception):
+    results = []
+    error = None
+
+    for future in futures:
+        if future in pending:
+            results.append(default)
+            continue
+
+        # Look at every exception, not just the first, so none of them are
+        # reported as never retrieved.
+        exc = exception(future)
+
+        if exc is not None:
+            error = error or exc
+            results.append(None)
+        else:
+            results.append(future.result())
+
+    if error is not None:
+        raise error
+
+    return results
+
+
+def _get_fan_out_pool():
+    global _fan_out_pool
+
+    with _fan_out_lock:
+        if _fan_out_pool is None:
+            _fan_out_pool = ThreadPoolExecutor(
+                32, thread_name_prefix='alexandra-fan-out')
+
+    return _fan_out_pool
+
+
+def _call_with_deadline(deadline, fn, args):
+    _local.deadline = deadline
+
+    try:
+        return fn(*args)
+    finally:
+        _local.deadline = None
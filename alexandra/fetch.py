@@ -0,0 +1,240 @@
+"""Outbound HTTP used to download Amazon's signing certificates.
+
+Validation sits on the request path, so a slow or unavailable S3 must make
+requests fail quickly instead of tying up every worker. The fetcher here
+uses bounded timeouts and retries under an overall time limit, keeps
+connections alive between fetches, and stops trying altogether for a while
+once a host keeps failing.
+"""
+
+import http.client
+import logging
+import socket
+import ssl
+import threading
+import time
+
+from urllib.parse import urlparse
+
+
+log = logging.getLogger(__name__)
+
+
+class FetchError(Exception):
+    """Raised when a certificate couldn't be downloaded."""
+
+
+class CircuitBreaker:
+    """Tracks consecutive failures to a host and refuses further attempts
+    for `reset_timeout` seconds once `failure_threshold` is reached. After
+    that a single trial request is let through; if it succeeds the breaker
+    closes again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30,
+                 clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+
+        self.failures = 0
+        self.opened_at = None
+
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        """Should we try to contact the host right now?"""
+
+        with self._lock:
+            if self.opened_at is None:
+                return True
+
+            if self.clock() - self.opened_at >= self.reset_timeout:
+                # Half open: let this attempt through, but push the next
+                # trial out in case this one fails too.
+                self.opened_at = self.clock()
+                return True
+
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    log.error('circuit opened after %d failures',
+                              self.failures)
+                self.opened_at = self.clock()
+
+
+class CertificateFetcher:
+    """Downloads certificates over pooled keep-alive connections.
+
+    :param connect_timeout: Seconds to wait for a connection to be set up.
+    :param read_timeout: Seconds to wait on each read from the server.
+    :param retries: How many extra attempts to make after a failure.
+    :param backoff: Seconds to sleep before the first retry, doubled for
+        each subsequent one.
+    :param total_timeout: Seconds a fetch may take in all, including
+        retries and backoff. Retries that wouldn't start in time are
+        skipped, and each attempt's timeouts are cut to the time left. The
+        default leaves room to answer within Alexa's ~8 second deadline.
+    :param pool_size: Number of idle connections to keep per host.
+    :param failure_threshold, reset_timeout: Passed to the
+        :py:class:`CircuitBreaker` created for each host.
+    """
+
+    def __init__(self, connect_timeout=1.0, read_timeout=1.0, retries=2,
+                 backoff=0.1, total_timeout=3.0, pool_size=4,
+                 failure_threshold=5, reset_timeout=30):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.total_timeout = total_timeout
+        self.pool_size = pool_size
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._pools = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self._ssl_context = ssl.create_default_context()
+
+    def fetch(self, url):
+        """Return the body of `url`, or raise :py:class:`FetchError`."""
+
+        parsed = urlparse(url)
+        host = (parsed.scheme, parsed.hostname, parsed.port)
+        path = parsed.path + ('?' + parsed.query if parsed.query else '')
+
+        breaker = self.breaker(host)
+
+        if not breaker.allow():
+            raise FetchError('too many failures contacting %s' % parsed.netloc)
+
+        deadline = time.monotonic() + self.total_timeout
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                delay = self.backoff * 2 ** (attempt - 1)
+
+                if time.monotonic() + delay >= deadline:
+                    log.warning('no time left to retry certificate fetch')
+                    break
+
+                time.sleep(delay)
+
+            try:
+                body = self._fetch_once(host, path,
+                                        deadline - time.monotonic())
+                breaker.record_success()
+                return body
+            except _Retryable as exc:
+                log.warning('certificate fetch failed (attempt %d): %s',
+                            attempt + 1, exc)
+            except FetchError:
+                breaker.record_success()
+                raise
+
+        breaker.record_failure()
+        raise FetchError('giving up on %s' % url)
+
+    def breaker(self, host):
+        with self._lock:
+            breaker = self._breakers.get(host)
+
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(
+                    self.failure_threshold, self.reset_timeout)
+
+            return breaker
+
+    def close(self):
+        """Close all idle pooled connections."""
+
+        with self._lock:
+            pools, self._pools = self._pools, {}
+
+        for pool in pools.values():
+            for conn in pool:
+                conn.close()
+
+    def _fetch_once(self, host, path, remaining):
+        conn = self._checkout(host, remaining)
+
+        try:
+            conn.request('GET', path, headers={'Connection': 'keep-alive'})
+            resp = conn.getresponse()
+            body = resp.read()
+        except (socket.timeout, OSError, http.client.HTTPException) as exc:
+            conn.close()
+            raise _Retryable(exc)
+
+        if resp.will_close:
+            conn.close()
+        else:
+            self._checkin(host, conn)
+
+        if resp.status >= 500:
+            raise _Retryable('server error %d' % resp.status)
+
+        if resp.status != 200:
+            raise FetchError('unexpected status %d' % resp.status)
+
+        return body
+
+    def _checkout(self, host, remaining):
+        read_timeout = max(0.001, min(self.read_timeout, remaining))
+
+        with self._lock:
+            pool = self._pools.get(host)
+            conn = pool.pop() if pool else None
+
+        if conn is not None:
+            conn.sock.settimeout(read_timeout)
+            return conn
+
+        scheme, hostname, port = host
+        connect_timeout = max(0.001, min(self.connect_timeout, remaining))
+
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(
+                hostname, port, timeout=connect_timeout,
+                context=self._ssl_context)
+        else:
+            conn = http.client.HTTPConnection(
+                hostname, port, timeout=connect_timeout)
+
+        try:
+            conn.connect()
+        except (socket.timeout, OSError) as exc:
+            conn.close()
+            raise _Retryable(exc)
+
+        conn.sock.settimeout(read_timeout)
+        return conn
+
+    def _checkin(self, host, conn):
+        with self._lock:
+            pool = self._pools.setdefault(host, [])
+
+            if len(pool) < self.pool_size:
+                pool.append(conn)
+                return
+
+        conn.close()
+
+
+class _Retryable(Exception):
+    """A failure worth trying again."""
@@ -0,0 +1,117 @@
+"""Per-request timing hooks.
+
+Subscribe a listener to an application's :py:attr:`instrumentation` to
+find out where time goes for each request. ::
+
+    @app.instrumentation.subscribe
+    def record(timing):
+        for phase, seconds in timing.phases.items():
+            statsd.timing('alexa.%s' % phase, seconds * 1000)
+
+Listeners are called once per request, after the response has been built,
+with a :py:class:`RequestTiming`. When nothing is subscribed, no timing
+information is collected at all.
+"""
+
+import logging
+import time
+
+
+log = logging.getLogger(__name__)
+
+#: Phases a request goes through, in order. Not every request reaches
+#: every phase.
+PHASES = ('read', 'certificate', 'parse', 'timestamp', 'dispatch', 'encode')
+
+# Outcomes of a request
+OK = 'ok'
+BAD_REQUEST = 'bad_request'
+INVALID = 'invalid'
+ERROR = 'error'
+
+
+class RequestTiming:
+    """Timing information about a single request.
+
+    :ivar phases: Map of phase name -> seconds spent in it.
+    :ivar total: Seconds from the start of the request until it finished.
+    :ivar request_type: Alexa request type, if the body could be parsed.
+    :ivar intent: Intent name, for IntentRequests.
+    :ivar outcome: One of `ok`, `bad_request`, `invalid` (failed
+        validation) or `error` (handler raised an exception).
+    """
+
+    __slots__ = ('phases', 'total', 'request_type', 'intent', 'outcome',
+                 '_start', '_last')
+
+    def __init__(self):
+        self.phases = {}
+        self.total = None
+        self.request_type = None
+        self.intent = None
+        self.outcome = ERROR
+
+        self._start = self._last = time.perf_counter()
+
+    def __repr__(self):
+        return '<RequestTiming %s %s %s>' % (
+            self.request_type, self.intent or '', self.outcome)
+
+    def mark(self, phase):
+        """Record that `phase` just finished."""
+
+        now = time.perf_counter()
+        self.phases[phase] = now - self._last
+        self._last = now
+
+    def describe(self, body):
+        """Pull the request type and intent name out of a parsed body."""
+
+        request = body.get('request') or {}
+
+        self.request_type = request.get('type')
+        self.intent = (request.get('intent') or {}).get('name')
+
+    def finish(self, outcome):
+        self.outcome = outcome
+        self.total = time.perf_counter() - self._start
+
+
+class Instrumentation:
+    """Set of listeners to notify with a :py:class:`RequestTiming` after
+    each request.
+
+    Evaluates as false when there are no listeners, so that callers can skip
+    all timing work with a single check.
+    """
+
+    def __init__(self):
+        self.listeners = []
+
+    def __bool__(self):
+        return bool(self.listeners)
+
+    def subscribe(self, listener):
+        """Add a listener. Can be used as a decorator."""
+
+        self.listeners.append(listener)
+        return listener
+
+    def unsubscribe(self, listener):
+        self.listeners.remove(listener)
+
+    def start(self):
+        """Return a new :py:class:`RequestTiming` if anyone is listening,
+        otherwise None.
+        """
+
+        return RequestTiming() if self.listeners else None
+
+    def emit(self, timing, outcome):
+        timing.finish(outcome)
+
+        for listener in self.listeners:
+            try:
+                listener(timing)
+            except Exception:
+                log.exception('instrumentation listener failed')
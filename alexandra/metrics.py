@@ -0,0 +1,348 @@
+"""In-process request metrics, served in the Prometheus text format.
+
+Enable with :py:meth:`alexandra.app.Application.enable_metrics`. The WSGI
+and ASGI apps then answer `GET /metrics` with:
+
+- `alexandra_requests_total`, by request type, intent and outcome
+- `alexandra_request_duration_seconds`, a histogram by request type and
+  intent
+- `alexandra_phase_duration_seconds`, a histogram by request phase
+- `alexandra_validation_failures_total`
+- `alexandra_unknown_intents_total`, by intent name
+- `alexandra_deadline_exceeded_total`, handlers that missed their deadline
+- `alexandra_certificate_cache_hits_total` and `..._misses_total`
+
+With a pre-forking server each worker has its own counters, and a scrape
+only reaches one of them. Pass a `directory` shared by the workers and each
+one will periodically write its counters there; scrapes then report the
+sum over all of them. Files left behind by workers that have since exited
+are removed when a scrape comes across them.
+"""
+
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
+from alexandra.instrument import INVALID
+
+
+#: Content type of :py:meth:`MetricsRegistry.render` output.
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+PHASE_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05,
+                 .1, .25, .5, 1)
+
+_HELP = {
+    'alexandra_requests_total':
+        ('counter', 'Requests handled, by type, intent and outcome.'),
+    'alexandra_validation_failures_total':
+        ('counter', 'Requests rejected by certificate or timestamp checks.'),
+    'alexandra_unknown_intents_total':
+        ('counter', 'IntentRequests for intents without a handler.'),
+    'alexandra_deadline_exceeded_total':
+        ('counter', 'Handlers that missed their deadline.'),
+    'alexandra_certificate_cache_hits_total':
+        ('counter', 'Signing certificate lookups served from memory.'),
+    'alexandra_certificate_cache_misses_total':
+        ('counter', 'Signing certificate lookups that had to load it.'),
+    'alexandra_request_duration_seconds':
+        ('histogram', 'Total time spent handling a request.'),
+    'alexandra_phase_duration_seconds':
+        ('histogram', 'Time spent in each phase of handling a request.'),
+}
+
+
+class Counter:
+    """Monotonic counter, keyed by a tuple of label values."""
+
+    def __init__(self, label_names):
+        self.label_names = label_names
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.values)
+
+
+class Histogram:
+    """Cumulative histogram, keyed by a tuple of label values. Each value is
+    a list of per-bucket counts followed by the sum and the total count.
+    """
+
+    def __init__(self, label_names, buckets=DEFAULT_BUCKETS):
+        self.label_names = label_names
+        self.buckets = buckets
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [0] * (len(self.buckets) + 2)
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+
+            entry[-2] += value
+            entry[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict((k, list(v)) for k, v in self.values.items())
+
+
+class MetricsRegistry:
+    """Collects request metrics from an application's instrumentation.
+
+    :param path: URL path the metrics are served from.
+    :param directory: Directory shared by all worker processes, for
+        aggregating metrics under a pre-forking server.
+    :param flush_interval: How often (in seconds) each process writes its
+        metrics to `directory`.
+    """
+
+    def __init__(self, path='/metrics', directory=None, flush_interval=5):
+        self.path = path
+        self.directory = directory
+        self.flush_interval = flush_interval
+
+        self.requests = Counter(('request_type', 'intent', 'outcome'))
+        self.validation_failures = Counter(())
+        self.unknown_intents = Counter(('intent',))
+        self.deadlines_exceeded = Counter(())
+        self.request_duration = Histogram(('request_type', 'intent'))
+        self.phase_duration = Histogram(('phase',), PHASE_BUCKETS)
+
+        self._last_flush = 0
+
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def observe(self, timing):
+        """Instrumentation listener, see :py:mod:`alexandra.instrument`."""
+
+        request_type = timing.request_type or ''
+        intent = timing.intent or ''
+
+        self.requests.inc((request_type, intent, timing.outcome))
+        self.request_duration.observe((request_type, intent), timing.total)
+
+        for phase, seconds in timing.phases.items():
+            self.phase_duration.observe((phase,), seconds)
+
+        if timing.outcome == INVALID:
+            self.validation_failures.inc()
+
+        if self.directory and \
+           time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def unknown_intent(self, intent):
+        self.unknown_intents.inc((intent or '',))
+
+    def deadline_exceeded(self):
+        self.deadlines_exceeded.inc()
+
+    def snapshot(self):
+        """This process's metrics as a JSON-serializable dict."""
+
+        from alexandra import util
+
+        cache = util._cache
+
+        return {
+            'counters': {
+                'alexandra_requests_total':
+                    _encode(self.requests),
+                'alexandra_validation_failures_total':
+                    _encode(self.validation_failures),
+                'alexandra_unknown_intents_total':
+                    _encode(self.unknown_intents),
+                'alexandra_deadline_exceeded_total':
+                    _encode(self.deadlines_exceeded),
+                'alexandra_certificate_cache_hits_total':
+                    {'[]': cache.hits},
+                'alexandra_certificate_cache_misses_total':
+                    {'[]': cache.misses},
+            },
+            'histograms': {
+                'alexandra_request_duration_seconds':
+                    _encode(self.request_duration),
+                'alexandra_phase_duration_seconds':
+                    _encode(self.phase_duration),
+            },
+        }
+
+    def flush(self):
+        """Write this process's metrics to the shared directory."""
+
+        self._last_flush = time.time()
+
+        path = os.path.join(self.directory, 'metrics-%d.json' % os.getpid())
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(self.snapshot(), fp)
+
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        """Metrics from this process, plus every other process that wrote to
+        the shared directory if there is one.
+        """
+
+        if not self.directory:
+            return self.snapshot()
+
+        self.flush()
+        merged = {'counters': {}, 'histograms': {}}
+
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            if not _writer_alive(path):
+                _discard(path)
+                continue
+
+            try:
+                with open(path) as fp:
+                    snapshot = json.load(fp)
+            except (IOError, ValueError):
+                continue
+
+            for kind in merged:
+                for name, values in snapshot.get(kind, {}).items():
+                    target = merged[kind].setdefault(name, {})
+
+                    for key, value in values.items():
+                        if key not in target:
+                            target[key] = value
+                        elif kind == 'counters':
+                            target[key] += value
+                        else:
+                            target[key] = [
+                                a + b for a, b in zip(target[key], value)]
+
+        return merged
+
+    def render(self):
+        """Metrics in the Prometheus text exposition format."""
+
+        snapshot = self.collect()
+        lines = []
+
+        label_names = {
+            'alexandra_requests_total': self.requests.label_names,
+            'alexandra_unknown_intents_total':
+                self.unknown_intents.label_names,
+            'alexandra_request_duration_seconds':
+                self.request_duration.label_names,
+            'alexandra_phase_duration_seconds':
+                self.phase_duration.label_names,
+        }
+
+        buckets = {
+            'alexandra_request_duration_seconds':
+                self.request_duration.buckets,
+            'alexandra_phase_duration_seconds': self.phase_duration.buckets,
+        }
+
+        for name, values in sorted(snapshot['counters'].items()):
+            _header(lines, name)
+            names = label_names.get(name, ())
+
+            for key, value in sorted(values.items()):
+                labels = _labels(names, json.loads(key))
+                lines.append('%s%s %s' % (name, labels, _number(value)))
+
+        for name, values in sorted(snapshot['histograms'].items()):
+            _header(lines, name)
+            names = label_names[name]
+
+            for key, entry in sorted(values.items()):
+                label_values = json.loads(key)
+                cumulative = 0
+
+                for bound, count in zip(buckets[name], entry):
+                    cumulative += count
+                    lines.append('%s_bucket%s %d' % (name, _labels(
+                        names + ('le',), label_values + [_number(bound)]),
+                        cumulative))
+
+                labels = _labels(names, label_values)
+                lines.append('%s_bucket%s %d' % (name, _labels(
+                    names + ('le',), label_values + ['+Inf']), entry[-1]))
+                lines.append('%s_sum%s %s' % (name, labels,
+                                              _number(entry[-2])))
+                lines.append('%s_count%s %d' % (name, labels, entry[-1]))
+
+        return '\n'.join(lines) + '\n'
+
+
+def _writer_alive(path):
+    """Is the process that wrote the metrics file at `path` still running?
+    """
+
+    pid = os.path.basename(path)[len('metrics-'):-len('.json')]
+
+    if not pid.isdigit() or int(pid) == 0:
+        return False
+
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
+
+
+def _discard(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _encode(metric):
+    """Metric snapshot with label tuples turned into JSON strings."""
+
+    return dict((json.dumps(list(k)), v)
+                for k, v in metric.snapshot().items())
+
+
+def _header(lines, name):
+    kind, text = _HELP[name]
+    lines.append('# HELP %s %s' % (name, text))
+    lines.append('# TYPE %s %s' % (name, kind))
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, _escape(value))
+        for name, value in zip(names, values))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
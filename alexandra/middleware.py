@@ -0,0 +1,155 @@
+"""Hooks run around every request handler.
+
+Registered on an :py:class:`alexandra.app.Application` with its
+:py:meth:`~alexandra.app.Application.before_request`,
+:py:meth:`~alexandra.app.Application.after_request` and
+:py:meth:`~alexandra.app.Application.error_handler` decorators::
+
+    @app.before_request
+    def require_linked_account(body, session):
+        if session and not session.user_access_token:
+            return alexandra.respond('Please link your account first.')
+
+    @app.after_request
+    def add_card(body, session, response):
+        # Static responses are read-only; copy() gives a plain dict
+        # (a deep one, for those).
+        response = response.copy()
+        response['response'] = dict(response['response'], card=CARD)
+        return response
+
+    @app.error_handler
+    def apologize(body, session, error):
+        log.exception('handler failed')
+        return alexandra.respond('Sorry, something went wrong.')
+
+- Before hooks run in the order they were registered. Returning anything
+  but None skips the rest, and the handler, and uses that as the response.
+- After hooks see every response, including ones from before hooks, and
+  return the (possibly modified or replaced) response. They run in the
+  reverse order they were registered. Responses built with
+  ``respond(..., static=True)`` can't be modified in place; see
+  :py:class:`alexandra.util.StaticResponse`.
+- Error handlers are called with any exception raised by a handler or
+  hook, and return a response to send instead. Returning None passes the
+  exception on to the next error handler, and eventually the caller.
+
+Any hook may be a coroutine function, as long as the skill is served by
+something that awaits responses, like the ASGI app.
+
+Hooks are composed into one chain of nested calls whenever one is
+registered, so a request never loops over lists of them, and a skill
+without any doesn't run any of this code at all.
+"""
+
+
+def chain(call, before=(), after=(), errors=()):
+    """Compose hooks around `call(handler, body, session)`, returning a
+    function with the same signature.
+
+    Error handlers wrap after hooks, which wrap before hooks, which wrap
+    `call`.
+    """
+
+    for fn in reversed(before):
+        call = _before(fn, call)
+
+    for fn in reversed(after):
+        call = _after(fn, call)
+
+    for fn in errors:
+        call = _error(fn, call)
+
+    return call
+
+
+def _before(fn, call):
+    def before(handler, body, session):
+        resp = fn(body, session)
+
+        if resp is None:
+            return call(handler, body, session)
+        elif hasattr(resp, '__await__'):
+            return _before_async(resp, call, handler, body, session)
+
+        return resp
+
+    return before
+
+
+async def _before_async(resp, call, handler, body, session):
+    resp = await resp
+
+    if resp is None:
+        resp = call(handler, body, session)
+
+        if hasattr(resp, '__await__'):
+            resp = await resp
+
+    return resp
+
+
+def _after(fn, call):
+    def after(handler, body, session):
+        resp = call(handler, body, session)
+
+        if hasattr(resp, '__await__'):
+            return _after_async(fn, resp, body, session)
+
+        return fn(body, session, resp)
+
+    return after
+
+
+async def _after_async(fn, resp, body, session):
+    resp = fn(body, session, await resp)
+
+    if hasattr(resp, '__await__'):
+        resp = await resp
+
+    return resp
+
+
+def _error(fn, call):
+    def error(handler, body, session):
+        try:
+            resp = call(handler, body, session)
+        except Exception as e:
+            resp = fn(body, session, e)
+
+            if resp is None:
+                raise
+            elif hasattr(resp, '__await__'):
+                return _reraise_unless(resp, e)
+
+            return resp
+
+        if hasattr(resp, '__await__'):
+            return _error_async(fn, resp, body, session)
+
+        return resp
+
+    return error
+
+
+async def _error_async(fn, resp, body, session):
+    try:
+        return await resp
+    except Exception as e:
+        resp = fn(body, session, e)
+
+        if hasattr(resp, '__await__'):
+            resp = await resp
+        if resp is None:
+            raise
+
+        return resp
+
+
+async def _reraise_unless(resp, error):
+    resp = await resp
+
+    if resp is None:
+        raise error
+
+    return resp
@@ -0,0 +1,151 @@
+"""Serving several skills from one process.
+
+A :py:class:`SkillRouter` stands in for an
+:py:class:`~alexandra.app.Application` anywhere one is expected, and hands
+each request to the skill it was sent to. ::
+
+    router = SkillRouter()
+    router.register(weather.app)
+    router.register(trivia.app)
+
+    wsgi_app = router.create_wsgi_app()
+
+Every skill behind a router shares its WSGI or ASGI app, and with it the
+JSON codec, request instrumentation and metrics registry. Signing
+certificates are cached process wide already.
+"""
+
+import logging
+
+from alexandra.instrument import Instrumentation
+from alexandra.util import application_id
+
+
+log = logging.getLogger(__name__)
+
+
+class SkillRouter:
+    """Dispatches requests to one of many applications by applicationId.
+
+    Requests for an applicationId that hasn't been registered are rejected
+    before reaching any handler.
+    """
+
+    def __init__(self):
+        #: Map of applicationId -> :py:class:`alexandra.app.Application`
+        self.skills = {}
+
+        #: Shared by every skill, see :py:mod:`alexandra.instrument`.
+        self.instrumentation = Instrumentation()
+
+        #: Shared :py:class:`alexandra.metrics.MetricsRegistry`, if enabled.
+        self.metrics = None
+
+        #: Shared :py:class:`alexandra.cache.ResponseCache`, if enabled.
+        self.response_cache = None
+
+    def __repr__(self):
+        return '<SkillRouter %d skills>' % len(self.skills)
+
+    def register(self, app, application_id=None):
+        """Route requests for `application_id` to `app`.
+
+        :param app: An :py:class:`alexandra.app.Application`.
+        :param application_id: Defaults to the application's own
+            `application_id`.
+        """
+
+        application_id = application_id or app.application_id
+
+        if not application_id:
+            raise ValueError('an application_id is required')
+
+        if application_id in self.skills:
+            raise ValueError('%s is already registered' % application_id)
+
+        if self.metrics is not None:
+            app.metrics = self.metrics
+
+        self.skills[application_id] = app
+        return app
+
+    def create_wsgi_app(self, validate_requests=True, codec=None,
+                        max_content_length=None):
+        """Return a WSGI app serving every registered skill. See
+        :py:meth:`alexandra.app.Application.create_wsgi_app`.
+        """
+
+        from alexandra.wsgi import WsgiApp
+
+        return WsgiApp(self, validate_requests, codec, max_content_length)
+
+    def create_asgi_app(self, validate_requests=True, codec=None,
+                        max_content_length=None):
+        """Return an ASGI app serving every registered skill. See
+        :py:meth:`alexandra.app.Application.create_asgi_app`.
+        """
+
+        from alexandra.asgi import AsgiApp
+
+        return AsgiApp(self, validate_requests, codec, max_content_length)
+
+    def enable_metrics(self, path='/metrics', directory=None):
+        """Collect metrics for every skill in one registry. See
+        :py:meth:`alexandra.app.Application.enable_metrics`.
+        """
+
+        from alexandra.metrics import MetricsRegistry
+
+        if self.metrics is None:
+            self.metrics = MetricsRegistry(path, directory)
+            self.instrumentation.subscribe(self.metrics.observe)
+
+            for app in self.skills.values():
+                app.metrics = self.metrics
+
+        return self.metrics
+
+    def enable_response_cache(self, maxsize=4096, window=300):
+        """Cache responses for every skill in one place. See
+        :py:meth:`alexandra.app.Application.enable_response_cache`.
+        """
+
+        from alexandra.cache import ResponseCache
+
+        if self.response_cache is None:
+            self.response_cache = ResponseCache(maxsize, window)
+
+        return self.response_cache
+
+    def lambda_handler(self, event, context=None):
+        """Entry point for an AWS Lambda function serving several skills."""
+
+        return self._skill(event).lambda_handler(event, context)
+
+    def accepts(self, body):
+        return application_id(body) in self.skills
+
+    def dispatch_request(self, body):
+        """Pass `body` to the registered skill it was sent to, raising a
+        `ValueError` if there isn't one.
+        """
+
+        return self._skill(body).dispatch_request(body)
+
+    def dispatch_request_async(self, body):
+        """Coroutine version of :py:meth:`dispatch_request`, see
+        :py:meth:`alexandra.app.Application.dispatch_request_async`.
+        """
+
+        return self._skill(body).dispatch_request_async(body)
+
+    def _skill(self, body):
+        app = self.skills.get(application_id(body))
+
+        if app is None:
+            log.error('request for unknown application: %s',
+                      application_id(body))
+            raise ValueError('unknown application: %s' %
+                             application_id(body))
+
+        return app
@@ -0,0 +1,588 @@
+"""Pre-forking, multi-threaded HTTP server for running a skill in
+production without an external WSGI server.
+
+Most easily used through :py:meth:`alexandra.app.Application.serve`::
+
+    app.serve('0.0.0.0', 8080, workers=4, threads=8)
+
+The master process does any expensive setup once (loading the system CA
+bundle, downloading signing certificates, whatever `warmup` does), then
+forks `workers` processes that share the result. Each worker answers
+requests on a pool of `threads` threads, with HTTP/1.1 keep-alive.
+
+Where the platform supports it, every worker accepts connections from its
+own `SO_REUSEPORT` socket so that the kernel balances them between workers.
+Otherwise they share a single listening socket. Either way, the sockets
+belong to the master and outlive any one worker, so connections waiting to
+be accepted aren't dropped when a worker is replaced.
+
+Signals sent to the master:
+
+- `SIGHUP` runs the warm-up again, starts a new set of workers, and then
+  gracefully stops the old ones. Code is not reloaded.
+- `SIGTERM` or `SIGINT` stops accepting connections, lets in-flight requests
+  finish (for up to `graceful_timeout` seconds), and exits.
+"""
+
+import errno
+import http.server
+import logging
+import os
+import select
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote_to_bytes
+
+
+log = logging.getLogger(__name__)
+
+# Workers exiting sooner than this after starting are assumed to be failing
+# on startup, and aren't replaced straight away.
+_MIN_WORKER_LIFETIME = 1.0
+
+
+class PreforkServer:
+    """Serves a WSGI app from several pre-forked worker processes.
+
+    :param wsgi_app: The app to serve, e.g. from
+        :py:meth:`alexandra.app.Application.create_wsgi_app`.
+    :param workers: Number of worker processes. Defaults to the number of
+        CPUs.
+    :param threads: Requests handled concurrently by each worker. Each
+        open connection occupies a thread while it is kept alive.
+    :param keepalive: Seconds to keep an idle connection open.
+    :param graceful_timeout: Seconds a stopping worker is given to finish
+        its in-flight requests.
+    :param reuse_port: Give every worker its own `SO_REUSEPORT` socket.
+        Ignored where unsupported.
+    :param certificates: Signing certificate URLs to download (see
+        :py:func:`alexandra.util.prefetch_certificates`) before forking.
+    :param warmup: Function (taking no arguments) to call in the master
+        before forking, and again on every reload.
+    :param access_log: Log every request.
+    """
+
+    def __init__(self, wsgi_app, host='0.0.0.0', port=8080, workers=None,
+                 threads=8, keepalive=5, graceful_timeout=30,
+                 reuse_port=True, certificates=(), warmup=None,
+                 access_log=False):
+        self.wsgi_app = wsgi_app
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.threads = threads
+        self.keepalive = keepalive
+        self.graceful_timeout = graceful_timeout
+        self.reuse_port = reuse_port and hasattr(socket, 'SO_REUSEPORT')
+        self.certificates = certificates
+        self.warmup = warmup
+        self.access_log = access_log
+
+        # pid -> (slot, time it was started), for the current workers.
+        self.pids = {}
+
+        # Listening sockets, one per worker slot with SO_REUSEPORT.
+        self._sockets = []
+        self._signals = []
+        self._wakeup = None
+
+    def __repr__(self):
+        return '<PreforkServer %s:%s %d workers>' % (
+            self.host, self.port, self.workers)
+
+    def serve_forever(self):
+        """Start the workers and supervise them until told to stop."""
+
+        self.warm_up()
+
+        for _ in range(self.workers if self.reuse_port else 1):
+            sock = _bind(self.host, self.port, self.reuse_port)
+            self.port = sock.getsockname()[1]
+            self._sockets.append(sock)
+
+        self._install_signals()
+
+        log.info('listening on %s:%d with %d workers of %d threads',
+                 self.host, self.port, self.workers, self.threads)
+
+        try:
+            self._spawn_workers()
+            self._supervise()
+        finally:
+            signal.set_wakeup_fd(-1)
+            os.close(self._wakeup)
+
+            for sock in self._sockets:
+                sock.close()
+
+    def warm_up(self):
+        """Do the expensive, shareable setup before any worker is forked."""
+
+        from alexandra import certs, util
+
+        # Parsing the CA bundle is the slowest part of checking a chain.
+        certs._system_roots()
+
+        if self.certificates:
+            util.prefetch_certificates(*self.certificates)
+
+        if self.warmup is not None:
+            self.warmup()
+
+        # Pooled connections must not end up shared between processes.
+        if util._fetcher is not None:
+            util._fetcher.close()
+
+    def _install_signals(self):
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(read_fd, False)
+        os.set_blocking(write_fd, False)
+
+        self._wakeup = read_fd
+        signal.set_wakeup_fd(write_fd)
+
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT,
+                       signal.SIGCHLD):
+            signal.signal(signum, self._on_signal)
+
+    def _on_signal(self, signum, frame):
+        self._signals.append(signum)
+
+    def _supervise(self):
+        while True:
+            try:
+                select.select([self._wakeup], [], [], 1.0)
+            except InterruptedError:
+                pass
+
+            try:
+                os.read(self._wakeup, 4096)
+            except BlockingIOError:
+                pass
+
+            signals, self._signals = self._signals, []
+
+            if signal.SIGTERM in signals or signal.SIGINT in signals:
+                log.info('shutting down')
+                self._stop_workers(list(self.pids))
+                return
+
+            if signal.SIGHUP in signals:
+                log.info('reloading workers')
+                self.warm_up()
+
+                old = list(self.pids)
+                self.pids = {}
+                self._spawn_workers()
+                self._stop_workers(old, wait=False)
+
+            self._reap()
+            self._spawn_workers()
+
+    def _reap(self):
+        """Collect exited workers, forgetting the ones that were current."""
+
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+
+            if pid == 0:
+                return
+
+            slot, started = self.pids.pop(pid, (None, None))
+
+            if started is not None:
+                code = os.WEXITSTATUS(status) if os.WIFEXITED(status) \
+                    else -os.WTERMSIG(status)
+                log.error('worker %d exited with status %d', pid, code)
+
+                if time.time() - started < _MIN_WORKER_LIFETIME:
+                    time.sleep(_MIN_WORKER_LIFETIME)
+
+    def _spawn_workers(self):
+        taken = set(slot for slot, _ in self.pids.values())
+
+        for slot in range(self.workers):
+            if slot in taken:
+                continue
+
+            pid = os.fork()
+
+            if pid == 0:
+                code = 1
+
+                try:
+                    self._run_worker(slot)
+                    code = 0
+                except Exception:
+                    log.exception('worker failed')
+                finally:
+                    os._exit(code)
+
+            self.pids[pid] = (slot, time.time())
+
+    def _stop_workers(self, pids, wait=True):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        if not wait:
+            return
+
+        deadline = time.time() + self.graceful_timeout + 1
+
+        while pids and time.time() < deadline:
+            for pid in list(pids):
+                try:
+                    if os.waitpid(pid, os.WNOHANG)[0]:
+                        pids.remove(pid)
+                except ChildProcessError:
+                    pids.remove(pid)
+
+            time.sleep(0.05)
+
+        for pid in pids:
+            log.error('killing worker %d', pid)
+
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+
+    def _run_worker(self, slot):
+        signal.set_wakeup_fd(-1)
+        os.close(self._wakeup)
+
+        for signum in (signal.SIGHUP, signal.SIGCHLD):
+            signal.signal(signum, signal.SIG_DFL)
+
+        # ^C reaches the whole process group; let the master decide.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+        sock = self._sockets[slot % len(self._sockets)]
+
+        server = _PooledServer(sock, self.wsgi_app, self.threads,
+                               self.keepalive, self.access_log, os.getppid())
+
+        def _stop(signum, frame):
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, _stop)
+
+        server.serve_forever()
+        server.server_close()
+        server.drain(self.graceful_timeout)
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    """Runs WSGI requests, keeping the connection open between them."""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'alexandra'
+
+    # Headers and body are written separately; don't let the body wait on
+    # the client's delayed ACK of the headers.
+    disable_nagle_algorithm = True
+
+    # Unread request bodies up to this size are skipped over so the
+    # connection can be reused; bigger ones close it instead.
+    max_drain = 64 * 1024
+
+    def setup(self):
+        # Closes connections that sit idle between requests.
+        self.timeout = self.server.keepalive
+        super().setup()
+
+    def handle(self):
+        try:
+            super().handle()
+        except (ConnectionError, socket.timeout):
+            pass
+
+    def do_request(self):
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            self.close_connection = True
+            self.send_error(411)
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+
+        if length < 0:
+            self.close_connection = True
+            self.send_error(400)
+            return
+
+        body = self._body = _Body(self.rfile, length)
+        self._response = None
+        self._headers_sent = False
+
+        try:
+            result = self.server.app(self._environ(body), self._start_response)
+
+            try:
+                # Once the app has called write(), the rest of its output
+                # follows what it wrote; otherwise it's sent in one go.
+                if self._headers_sent:
+                    for chunk in result:
+                        self._write(chunk)
+                else:
+                    data = b''.join(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+
+            if not self._headers_sent:
+                if body.remaining > self.max_drain:
+                    self.close_connection = True
+
+                self._send(data)
+        except Exception:
+            log.exception('error handling %s %s', self.command, self.path)
+            self.close_connection = True
+
+            if not self._headers_sent:
+                self._response = ('500 Internal Server Error',
+                                  [('Content-Type', 'text/plain')])
+                self._send(b'')
+
+        if not self.close_connection:
+            body.read()
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = do_OPTIONS = \
+        do_PATCH = do_request
+
+    def _environ(self, body):
+        path, _, query = self.path.partition('?')
+        host, port = self.server.server_address[:2]
+
+        environ = {
+            'REQUEST_METHOD': self.command,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': unquote_to_bytes(path).decode('latin-1'),
+            'QUERY_STRING': query,
+            'CONTENT_TYPE': self.headers.get('Content-Type', ''),
+            'CONTENT_LENGTH': str(body.remaining),
+            'SERVER_NAME': host,
+            'SERVER_PORT': str(port),
+            'SERVER_PROTOCOL': self.request_version,
+            'REMOTE_ADDR': self.client_address[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': body,
+            'wsgi.input_terminated': True,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+
+        for name, value in self.headers.items():
+            key = 'HTTP_' + name.upper().replace('-', '_')
+
+            if key in ('HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH'):
+                continue
+
+            if key in environ:
+                value = environ[key] + ',' + value
+
+            environ[key] = value
+
+        return environ
+
+    def _start_response(self, status, headers, exc_info=None):
+        if exc_info and self._headers_sent:
+            raise exc_info[1].with_traceback(exc_info[2])
+
+        self._response = (status, headers)
+        return self._write
+
+    def _write(self, data):
+        """The `write()` callable returned by `start_response`: sends the
+        headers the first time, then writes straight through.
+        """
+
+        if self._response is None:
+            raise AssertionError('write() called before start_response()')
+
+        if not self._headers_sent:
+            if self._body.remaining > self.max_drain:
+                self.close_connection = True
+
+            self._send_headers(None)
+
+        if data and self.command != 'HEAD':
+            self.wfile.write(data)
+
+    def _send(self, data):
+        self._send_headers(len(data))
+
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    def _send_headers(self, length):
+        """Send the status and headers. `length` is the size of the whole
+        body, or None when it's written as it comes, in which case the
+        app's own Content-Length is used if it gave one, and otherwise the
+        connection is closed to mark the end of the body.
+        """
+
+        status, headers = self._response
+        code, _, reason = status.partition(' ')
+
+        self.send_response(int(code), reason)
+
+        for name, value in headers:
+            name_lower = name.lower()
+
+            if name_lower == 'content-length':
+                if length is None:
+                    length = value
+            elif name_lower != 'connection':
+                self.send_header(name, value)
+
+        if length is None:
+            self.close_connection = True
+        else:
+            self.send_header('Content-Length', str(length))
+
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+
+        self.end_headers()
+        self._headers_sent = True
+
+    def log_request(self, code='-', size='-'):
+        if self.server.access_log:
+            super().log_request(code, size)
+
+    def log_message(self, format, *args):
+        log.info('%s %s', self.address_string(), format % args)
+
+
+class _Body:
+    """`wsgi.input`, limited to the request's Content-Length."""
+
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+
+        data = self.rfile.read(size) if size else b''
+        self.remaining -= len(data)
+
+        return data
+
+    def readline(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+
+        data = self.rfile.readline(size) if size else b''
+        self.remaining -= len(data)
+
+        return data
+
+    def readlines(self, hint=-1):
+        return list(iter(self.readline, b''))
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+
+class _PooledServer(socketserver.TCPServer):
+    """TCP server handling connections on a bounded thread pool rather than
+    a thread each.
+    """
+
+    def __init__(self, sock, app, threads, keepalive, access_log,
+                 master_pid):
+        super().__init__(sock.getsockname(), _RequestHandler,
+                         bind_and_activate=False)
+
+        # Use the already listening socket instead of the one TCPServer
+        # made.
+        self.socket.close()
+        self.socket = sock
+        self.server_address = sock.getsockname()
+
+        self.app = app
+        self.keepalive = keepalive
+        self.access_log = access_log
+        self.master_pid = master_pid
+
+        self.pool = ThreadPoolExecutor(
+            threads, thread_name_prefix='alexandra-worker')
+        self._stopping = False
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def handle_error(self, request, client_address):
+        log.exception('error handling connection from %s', client_address)
+
+    def service_actions(self):
+        # Don't outlive a master that was killed without warning.
+        if os.getppid() != self.master_pid and not self._stopping:
+            log.error('master process went away, stopping')
+            self._stopping = True
+            threading.Thread(target=self.shutdown, daemon=True).start()
+
+    def drain(self, timeout):
+        """Wait up to `timeout` seconds for in-flight requests to finish."""
+
+        done = threading.Thread(target=self.pool.shutdown, daemon=True)
+        done.start()
+        done.join(timeout)
+
+
+def _bind(host, port, reuse_port):
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+        if reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+        sock.bind((host, port))
+
+        sock.listen(socket.SOMAXCONN)
+
+        # A socket may briefly be shared by a stopping worker and its
+        # replacement; whichever loses the race to accept a connection
+        # mustn't block waiting for the next one.
+        sock.setblocking(False)
+    except OSError as exc:
+        sock.close()
+
+        if exc.errno == errno.EADDRINUSE:
+            log.error('%s:%d is already in use', host, port)
+
+        raise
+
+    return sock
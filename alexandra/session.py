@@ -1,4 +1,8 @@
 import json
+import threading
+import time
+
+from alexandra.cache import LRUCache
 
 
 class Session:
@@ -6,13 +10,37 @@ class Session:
 
     The object parsed from the request can be accessed directly
     through the :py:attr:`body` member.
+
+    One of these is created for every request, so it does as little work as
+    possible up front: nested objects are only looked up when a handler
+    actually asks for them, and then remembered.
+
+    :param session_body: The `session` object from the request.
+    :param store: If given, a :py:class:`SessionStore` to read attributes
+        from instead of the request.
+    :param store_key: Key of this session's attributes in `store`.
     """
 
-    def __init__(self, session_body):
+    __slots__ = ('body', 'store', 'store_key', '_attributes', '_user')
+
+    # Longest session ID shown by repr(), so log lines stay short.
+    _REPR_ID_LENGTH = 48
+
+    def __init__(self, session_body, store=None, store_key=None):
         self.body = session_body
+        self.store = store
+        self.store_key = store_key
+        self._attributes = None
+        self._user = None
 
     def __repr__(self):
-        return '<Session %s>' % json.dumps(self.body)
+        session_id = str(self.body.get('sessionId'))
+
+        if len(session_id) > self._REPR_ID_LENGTH:
+            session_id = session_id[:self._REPR_ID_LENGTH] + '...'
+
+        return '<Session %s%s>' % (
+            session_id, ' new' if self.body.get('new') else '')
 
     @property
     def is_new(self):
@@ -29,14 +57,151 @@ class Session:
 
     @property
     def user_id(self):
-        return self.body['user'].get('userId')
+        return self.user.get('userId')
 
     @property
     def user_access_token(self):
-        return self.body['user'].get('accessToken')
+        return self.user.get('accessToken')
+
+    @property
+    def user(self):
+        """The `user` object of the session, as sent by Amazon."""
+
+        if self._user is None:
+            self._user = self.body['user']
+
+        return self._user
+
+    @property
+    def attributes(self):
+        """Attributes stored in this session. This is the dict from the
+        request (or session store) itself, not a copy.
+        """
+
+        if self._attributes is None:
+            if self.store is not None:
+                self._attributes = self.store.load(self.store_key) or {}
+            else:
+                self._attributes = self.body.get('attributes') or {}
+
+        return self._attributes
 
     def get(self, attr, default=None):
         """Get an attribute defined by this session"""
 
-        attrs = self.body.get('attributes') or {}
-        return attrs.get(attr, default)
+        return self.attributes.get(attr, default)
+
+
+class SessionStore:
+    """Interface for keeping session attributes on the server instead of
+    sending them back and forth with Alexa on every turn.
+
+    See :py:meth:`alexandra.app.Application.use_session_store`. Subclass
+    this to use an external store such as Redis or DynamoDB. Attributes are
+    dicts that can be encoded as JSON.
+    """
+
+    def load(self, key):
+        """Return the attributes stored under `key`, or None."""
+        raise NotImplementedError
+
+    def save(self, key, attributes):
+        """Store `attributes` under `key`, replacing anything already
+        there.
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Forget whatever is stored under `key`."""
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """In-process store holding at most `maxsize` sessions, each of which
+    is forgotten `ttl` seconds after it was last saved.
+
+    Every process has its own copy, so this is only suitable for a single
+    process server (or Lambda, as a best-effort cache).
+    """
+
+    def __init__(self, maxsize=10000, ttl=3600):
+        self.ttl = ttl
+        self._cache = LRUCache(maxsize)
+
+    def __repr__(self):
+        return '<MemorySessionStore %d sessions>' % len(self._cache)
+
+    def load(self, key):
+        return self._cache.get(key)
+
+    def save(self, key, attributes):
+        self._cache.set(key, attributes, time.time() + self.ttl)
+
+    def delete(self, key):
+        self._cache.pop(key)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Store backed by an SQLite database file, which can be shared by every
+    process on a host. Sessions are forgotten `ttl` seconds after they were
+    last saved.
+
+    :param path: Database file, created if it doesn't exist.
+    :param ttl: Seconds to keep a session for.
+    """
+
+    def __init__(self, path, ttl=3600):
+        self.path = path
+        self.ttl = ttl
+
+        self._local = threading.local()
+
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS alexandra_sessions ('
+                '  key TEXT PRIMARY KEY,'
+                '  attributes TEXT NOT NULL,'
+                '  expires REAL NOT NULL'
+                ')')
+
+    def __repr__(self):
+        return '<SQLiteSessionStore %s>' % self.path
+
+    def _connection(self):
+        # SQLite connections can't be shared between threads.
+        conn = getattr(self._local, 'conn', None)
+
+        if conn is None:
+            import sqlite3
+
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+
+        return conn
+
+    def load(self, key):
+        row = self._connection().execute(
+            'SELECT attributes FROM alexandra_sessions '
+            'WHERE key = ? AND expires > ?', (key, time.time())).fetchone()
+
+        return json.loads(row[0]) if row else None
+
+    def save(self, key, attributes):
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO alexandra_sessions '
+                '(key, attributes, expires) VALUES (?, ?, ?)',
+                (key, json.dumps(attributes), time.time() + self.ttl))
+
+    def delete(self, key):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM alexandra_sessions WHERE key = ?',
+                         (key,))
+
+    def purge(self):
+        """Delete every expired session. Returns how many were removed."""
+
+        with self._connection() as conn:
+            return conn.execute(
+                'DELETE FROM alexandra_sessions WHERE expires <= ?',
+                (time.time(),)).rowcount
@@ -0,0 +1,261 @@
+"""Typed access to the slots of an intent.
+
+Intent handlers are given a dict of `{slot_name: value}`, where each value
+is a :py:class:`Slot`: still the string Alexa heard, so existing code
+comparing or formatting it keeps working, but with properties that convert
+it on demand. Nothing is parsed until a handler asks for it::
+
+    @app.intent('SetTimer')
+    def set_timer(slots, session):
+        minutes = slots['Minutes'].number
+        length = slots['Length'].duration
+
+    @app.intent('OrderDrink')
+    def order_drink(slots, session):
+        # 'a cuppa' and 'tea' both resolve to the same catalog entry
+        drink = slots['Drink'].id
+
+Slots Alexa didn't fill are `None`, as before. The converters are plain
+functions as well, with small memoization caches shared by every request,
+since skills see the same handful of values over and over.
+"""
+
+import datetime as dt
+import re
+
+from functools import lru_cache
+
+
+ER_SUCCESS_MATCH = 'ER_SUCCESS_MATCH'
+
+_DAY = dt.timedelta(days=1)
+
+_DURATION = re.compile(
+    r'^P(?:(\d+)Y)?(?:(\d+)M)?(?:(\d+)W)?(?:(\d+)D)?'
+    r'(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+(?:\.\d+)?)S)?)?$')
+
+# AMAZON.DATE seasons, as `(first month, last month)`. Winter runs into
+# the next year.
+_SEASONS = {'SP': (3, 5), 'SU': (6, 8), 'FA': (9, 11), 'WI': (12, 2)}
+
+
+class Slot(str):
+    """The value of a filled slot, as a string.
+
+    :py:attr:`body` is the slot object from the request, including any
+    entity resolutions.
+    """
+
+    __slots__ = ('body',)
+
+    def __new__(cls, body):
+        slot = str.__new__(cls, body['value'])
+        slot.body = body
+
+        return slot
+
+    def __reduce__(self):
+        return (Slot, (self.body,))
+
+    @property
+    def name(self):
+        return self.body.get('name')
+
+    @property
+    def resolution(self):
+        """The `{'name': ..., 'id': ...}` value the slot was resolved to
+        by the first authority that found a match, or None.
+        """
+
+        resolutions = self.body.get('resolutions')
+
+        if not resolutions:
+            return None
+
+        for authority in resolutions.get('resolutionsPerAuthority', ()):
+            if authority.get('status', {}).get('code') != ER_SUCCESS_MATCH:
+                continue
+
+            values = authority.get('values')
+            if values:
+                return values[0]['value']
+
+        return None
+
+    @property
+    def id(self):
+        """ID of the custom slot value this resolved to, or None."""
+
+        resolution = self.resolution
+        return resolution.get('id') if resolution else None
+
+    @property
+    def resolved(self):
+        """Canonical name of the slot value this resolved to (e.g. a
+        synonym's main value), falling back to what was heard.
+        """
+
+        resolution = self.resolution
+        return resolution['name'] if resolution else str(self)
+
+    @property
+    def number(self):
+        """See :py:func:`to_number`."""
+        return to_number(str(self))
+
+    @property
+    def date(self):
+        """See :py:func:`to_date`."""
+        return to_date(str(self))
+
+    @property
+    def date_range(self):
+        """See :py:func:`to_date_range`."""
+        return to_date_range(str(self))
+
+    @property
+    def duration(self):
+        """See :py:func:`to_duration`."""
+        return to_duration(str(self))
+
+
+def parse_slots(intent_slots):
+    """Build the `{slot_name: Slot}` dict given to intent handlers from the
+    `slots` object of an intent.
+    """
+
+    make = str.__new__
+    slots = {}
+
+    for body in intent_slots.values():
+        value = body.get('value')
+
+        # Inlined Slot(body), since this runs for every slot of every
+        # intent whether or not the handler looks at it.
+        if value is not None:
+            value = make(Slot, value)
+            value.body = body
+
+        slots[body['name']] = value
+
+    return slots
+
+
+@lru_cache(maxsize=256)
+def to_number(value):
+    """Convert an AMAZON.NUMBER value to an int (or float), or None when
+    Alexa couldn't make out a number (it sends `'?'`).
+    """
+
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        pass
+
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@lru_cache(maxsize=256)
+def to_date(value):
+    """Convert an AMAZON.DATE value naming a single day (`2017-11-25`) to a
+    :py:class:`datetime.date`. Anything else, like a week or a month, is
+    None; see :py:func:`to_date_range` for those.
+    """
+
+    try:
+        return dt.datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+@lru_cache(maxsize=256)
+def to_date_range(value):
+    """Convert any AMAZON.DATE value to the `(first, last)` days it covers,
+    inclusive. Handles days, weeks (`2017-W48`), weekends (`2017-W48-WE`),
+    months, years, decades (`201X`) and seasons (`2017-WI`, with
+    meteorological seasons in the northern hemisphere).
+
+    Returns None for `PRESENT_REF` ("now") and anything unrecognized.
+    """
+
+    if not isinstance(value, str):
+        return None
+
+    day = to_date(value)
+    if day is not None:
+        return day, day
+
+    parts = value.split('-')
+
+    try:
+        if len(parts) == 1 and len(value) == 4:
+            if value.endswith('X'):
+                start = int(value[:3]) * 10
+                return dt.date(start, 1, 1), dt.date(start + 9, 12, 31)
+
+            year = int(value)
+            return dt.date(year, 1, 1), dt.date(year, 12, 31)
+
+        year = int(parts[0])
+
+        if parts[1].startswith('W') and parts[1][1:].isdigit():
+            # ISO weeks start on Monday, and week 1 contains January 4th.
+            jan4 = dt.date(year, 1, 4)
+            monday = jan4 - jan4.weekday() * _DAY + \
+                (int(parts[1][1:]) - 1) * 7 * _DAY
+
+            if len(parts) == 3 and parts[2] == 'WE':
+                return monday + 5 * _DAY, monday + 6 * _DAY
+            elif len(parts) == 2:
+                return monday, monday + 6 * _DAY
+
+            return None
+
+        if len(parts) != 2:
+            return None
+
+        if parts[1] in _SEASONS:
+            first, last = _SEASONS[parts[1]]
+            end_year = year + 1 if last < first else year
+
+            return dt.date(year, first, 1), \
+                _month_end(end_year, last)
+
+        month = int(parts[1])
+        return dt.date(year, month, 1), _month_end(year, month)
+    except (IndexError, ValueError):
+        return None
+
+
+def _month_end(year, month):
+    if month == 12:
+        return dt.date(year, 12, 31)
+
+    return dt.date(year, month + 1, 1) - _DAY
+
+
+@lru_cache(maxsize=256)
+def to_duration(value):
+    """Convert an AMAZON.DURATION value (ISO 8601, e.g. `PT10M` or
+    `P2DT3H`) to a :py:class:`datetime.timedelta`, or None.
+
+    Years and months don't have a fixed length, so they're taken as 365
+    and 30 days respectively.
+    """
+
+    if not isinstance(value, str) or value in ('P', 'PT'):
+        return None
+
+    match = _DURATION.match(value)
+    if match is None or value.endswith('T'):
+        return None
+
+    years, months, weeks, days, hours, minutes, seconds = (
+        float(part) if part else 0 for part in match.groups())
+
+    return dt.timedelta(days=years * 365 + months * 30 + days,
+                        weeks=weeks, hours=hours, minutes=minutes,
+                        seconds=seconds)
@@ -0,0 +1,244 @@
+"""Signing Alexa requests locally, for tests and offline load testing.
+
+A :py:class:`SigningAuthority` plays the part of Amazon: it has its own root
+CA and signing certificate, and signs request bodies the same way Alexa
+does. Serve its certificate chain with a :py:class:`CertificateServer`, and
+point alexandra's trust policy at it, and requests it signs go through
+exactly the same validation as real ones::
+
+    authority = SigningAuthority()
+    server = authority.serve()
+    util.set_trust_policy(authority.policy(server.url))
+
+    data = json.dumps(body).encode('utf-8')
+    client.post('/', data=data, headers=authority.sign(data, server.url))
+
+Only ever do this in tests: the authority's keys are not secret.
+"""
+
+import base64
+import datetime as dt
+import http.server
+import os
+import posixpath
+import socketserver
+import threading
+
+from urllib.parse import urlparse
+
+from cryptography import x509
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.x509.oid import NameOID
+
+from alexandra import certs
+
+
+#: Path the certificate chain is served from by default.
+CERT_PATH = '/echo.api/alexandra-test.pem'
+
+
+class SigningAuthority:
+    """A root CA and a signing certificate issued by it, standing in for
+    Amazon's.
+
+    :param domain: Domain the signing certificate is issued for.
+    :param days: How long both certificates are valid for.
+    :param root_key: Private key of the root CA. Generated if not given.
+    :param key: Private key requests are signed with. Generated if not
+        given.
+    """
+
+    def __init__(self, domain=certs.SIGNING_DOMAIN, days=30, root_key=None,
+                 key=None):
+        backend = default_backend()
+
+        self.root_key = root_key or \
+            rsa.generate_private_key(65537, 2048, backend)
+        self.key = key or rsa.generate_private_key(65537, 2048, backend)
+
+        now = dt.datetime.utcnow()
+        not_before = now - dt.timedelta(days=1)
+        not_after = now + dt.timedelta(days=days)
+
+        root_name = x509.Name([
+            x509.NameAttribute(NameOID.COMMON_NAME, u'alexandra test root')])
+        leaf_name = x509.Name([
+            x509.NameAttribute(NameOID.COMMON_NAME, domain)])
+
+        self.root = x509.CertificateBuilder() \
+            .subject_name(root_name).issuer_name(root_name) \
+            .public_key(self.root_key.public_key()) \
+            .serial_number(x509.random_serial_number()) \
+            .not_valid_before(not_before).not_valid_after(not_after) \
+            .add_extension(x509.BasicConstraints(ca=True, path_length=None),
+                           critical=True) \
+            .sign(self.root_key, hashes.SHA256(), backend)
+
+        self.leaf = x509.CertificateBuilder() \
+            .subject_name(leaf_name).issuer_name(root_name) \
+            .public_key(self.key.public_key()) \
+            .serial_number(x509.random_serial_number()) \
+            .not_valid_before(not_before).not_valid_after(not_after) \
+            .add_extension(x509.SubjectAlternativeName(
+                [x509.DNSName(domain)]), critical=False) \
+            .sign(self.root_key, hashes.SHA256(), backend)
+
+        self.domain = domain
+
+    def __repr__(self):
+        return '<SigningAuthority %s>' % self.domain
+
+    @classmethod
+    def load(cls, directory, **kwargs):
+        """Use the keys saved in `directory` by :py:meth:`save`, creating
+        and saving new ones if there aren't any, so that separate processes
+        (e.g. a server and a load generator) can share an authority.
+        """
+
+        paths = [os.path.join(directory, name)
+                 for name in ('root-key.pem', 'key.pem')]
+
+        if not all(os.path.exists(path) for path in paths):
+            authority = cls(**kwargs)
+            authority.save(directory)
+            return authority
+
+        keys = []
+
+        for path in paths:
+            with open(path, 'rb') as fp:
+                keys.append(serialization.load_pem_private_key(
+                    fp.read(), None, default_backend()))
+
+        return cls(root_key=keys[0], key=keys[1], **kwargs)
+
+    def save(self, directory):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        for name, key in (('root-key.pem', self.root_key),
+                          ('key.pem', self.key)):
+            with open(os.path.join(directory, name), 'wb') as fp:
+                fp.write(key.private_bytes(
+                    serialization.Encoding.PEM,
+                    serialization.PrivateFormat.PKCS8,
+                    serialization.NoEncryption()))
+
+    @property
+    def chain_pem(self):
+        """The signing certificate followed by the root, as Amazon serves
+        them.
+        """
+
+        return b''.join(cert.public_bytes(serialization.Encoding.PEM)
+                        for cert in [self.leaf, self.root])
+
+    @property
+    def root_pem(self):
+        return self.root.public_bytes(serialization.Encoding.PEM)
+
+    def policy(self, cert_url):
+        """A :py:class:`alexandra.certs.TrustPolicy` trusting only this
+        authority, with its chain served from `cert_url`.
+        """
+
+        url = urlparse(cert_url)
+
+        return certs.TrustPolicy(
+            scheme=url.scheme,
+            hosts=(url.netloc,),
+            path_prefix=posixpath.dirname(url.path).rstrip('/') + '/',
+            domain=self.domain,
+            roots=certs.load_roots(self.root_pem))
+
+    def sign(self, data, cert_url):
+        """Return the headers Alexa would send along with `data`, signed
+        with both SHA-1 and SHA-256.
+        """
+
+        sha1 = self.key.sign(data, padding.PKCS1v15(), hashes.SHA1())
+        sha256 = self.key.sign(data, padding.PKCS1v15(), hashes.SHA256())
+
+        return {
+            'SignatureCertChainUrl': cert_url,
+            'Signature': base64.b64encode(sha1).decode('ascii'),
+            'Signature-256': base64.b64encode(sha256).decode('ascii'),
+        }
+
+    def serve(self, host='127.0.0.1', port=0, path=CERT_PATH):
+        """Start and return a :py:class:`CertificateServer` for this
+        authority's chain.
+        """
+
+        server = CertificateServer(self.chain_pem, host, port, path)
+        server.start()
+
+        return server
+
+
+class CertificateServer:
+    """Serves a certificate chain over plain HTTP from a background thread,
+    in place of `s3.amazonaws.com`.
+
+    :param pem: Certificate chain to serve.
+    :param port: Port to listen on, or 0 to pick a free one.
+    :param path: URL path to serve it from. Anything else is a 404.
+    """
+
+    def __init__(self, pem, host='127.0.0.1', port=0, path=CERT_PATH):
+        self.pem = pem
+        self.path = path
+
+        self._server = _HTTPServer((host, port), _CertificateHandler)
+        self._server.certificate = self
+        self._thread = None
+
+    def __repr__(self):
+        return '<CertificateServer %s>' % self.url
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://%s:%d%s' % (host, port, self.path)
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _HTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class _CertificateHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        certificate = self.server.certificate
+
+        if self.path != certificate.path:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-pem-file')
+        self.send_header('Content-Length', str(len(certificate.pem)))
+        self.end_headers()
+        self.wfile.write(certificate.pem)
+
+    def log_message(self, format, *args):
+        pass
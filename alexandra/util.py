@@ -1,29 +1,139 @@
 """Utility functionality for Alexandra"""
 
 import base64
+import calendar
 import logging
-import posixpath
+import threading
+import time
 
-try:
-    from urlparse import urlparse
-    from urllib2 import urlopen
-except:
-    from urllib.parse import urlparse
-    from urllib.request import urlopen
+from alexandra.cache import LRUCache
+from alexandra.codec import JsonCodec
 
-from datetime import datetime
+# NB: alexandra.certs and alexandra.fetch (and through them, cryptography and
+# ssl) are imported on first use, so that importing alexandra stays cheap for
+# Lambda functions that never validate a certificate.
 
-from OpenSSL import crypto
 
+# We don't want to check the certificate every single time. Store each one
+# for as long as it is valid.
+_cache = LRUCache(maxsize=32)
+
+# Optional on-disk store, shared by all processes on this host.
+_store = None
+
+# Created on first use, see above.
+_fetcher = None
+
+# alexandra.certs.TrustPolicy for certificate URLs and chains. None means
+# alexandra.certs.AMAZON, which can't be referenced until certs is imported.
+_policy = None
+
+# Certificate URLs currently being refreshed in the background, and when
+# each was last attempted, so an unchanged certificate isn't re-downloaded
+# on every request once it's due.
+_refreshing = set()
+_last_refresh = {}
+_refreshing_lock = threading.Lock()
+_REFRESH_RETRY = 300
+
+# Largest request body the WSGI and ASGI apps will read by default. Real
+# Alexa requests are a few kilobytes.
+MAX_CONTENT_LENGTH = 128 * 1024
 
-# We don't want to check the certificate every single time. Store for
-# as long as they are valid.
-_cache = {}
 log = logging.getLogger(__name__)
 
 
+class StaticResponse(dict):
+    """A response that is encoded to JSON once, when it's created, instead
+    of on every request. Build these with `respond(..., static=True)` at
+    import time for replies that never change (help, stop, cancel...) and
+    return the same object from the handler each time.
+
+    It is still a dict, so it can be returned from a Lambda handler as well,
+    but neither it nor any dict or list inside it can be modified: the
+    pre-encoded :py:attr:`data` would no longer match, and the change would
+    leak into every later request. Use :py:meth:`copy` to get a plain dict
+    that can be changed.
+    """
+
+    __slots__ = ('data',)
+
+    _codec = JsonCodec()
+
+    def __init__(self, obj):
+        dict.__init__(self, ((k, _freeze(v)) for k, v in obj.items()))
+
+        #: The JSON encoded response body, as bytes.
+        self.data = self._codec.dumps(obj)
+
+    def __reduce__(self):
+        return (StaticResponse, (_thaw(self),))
+
+    def copy(self):
+        """Return a deep copy of this response made of plain, modifiable
+        dicts and lists.
+        """
+
+        return _thaw(self)
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('StaticResponse objects are read-only')
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+
+class _FrozenDict(dict):
+    """A dict nested in a :py:class:`StaticResponse`."""
+
+    __slots__ = ()
+
+    def __reduce__(self):
+        return (_FrozenDict, (dict(self),))
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('StaticResponse objects are read-only')
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+
+class _FrozenList(list):
+    """A list nested in a :py:class:`StaticResponse`."""
+
+    __slots__ = ()
+
+    def __reduce__(self):
+        return (_FrozenList, (list(self),))
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('StaticResponse objects are read-only')
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = clear = extend = insert = pop = remove = reverse = sort = \
+        _read_only
+
+
+def _freeze(obj):
+    if isinstance(obj, dict):
+        return _FrozenDict((k, _freeze(v)) for k, v in obj.items())
+    elif isinstance(obj, list):
+        return _FrozenList(_freeze(v) for v in obj)
+
+    return obj
+
+
+def _thaw(obj):
+    if isinstance(obj, dict):
+        return dict((k, _thaw(v)) for k, v in obj.items())
+    elif isinstance(obj, list):
+        return [_thaw(v) for v in obj]
+
+    return obj
+
+
 def respond(text=None, ssml=None, attributes=None, reprompt_text=None,
-            reprompt_ssml=None, end_session=True):
+            reprompt_ssml=None, end_session=True, static=False):
     """ Build a dict containing a valid response to an Alexa request.
 
     If speech output is desired, either of `text` or `ssml` should
@@ -35,6 +145,7 @@ def respond(text=None, ssml=None, attributes=None, reprompt_text=None,
     :param end_session: Should the session be terminated after this response?
     :param reprompt_text, reprompt_ssml: Works the same as
         `text`/`ssml`, but instead sets the reprompting speech output.
+    :param static: Return a pre-encoded :py:class:`StaticResponse`.
     """
 
     obj = {
@@ -60,10 +171,13 @@ def respond(text=None, ssml=None, attributes=None, reprompt_text=None,
     if reprompt_output:
         obj['response']['reprompt'] = {'outputSpeech': reprompt_output}
 
+    if static:
+        return StaticResponse(obj)
+
     return obj
 
 
-def reprompt(text=None, ssml=None, attributes=None):
+def reprompt(text=None, ssml=None, attributes=None, static=False):
     """Convenience method to save a little bit of typing for the common case of
     reprompting the user. Simply calls :py:func:`alexandra.util.respond` with
     the given arguments and holds the session open.
@@ -74,16 +188,34 @@ def reprompt(text=None, ssml=None, attributes=None):
     :param text: Plain text speech output
     :param ssml: Speech output in SSML format
     :param attributes: Dictionary of attributes to store in the current session
+    :param static: Return a pre-encoded :py:class:`StaticResponse`.
     """
 
     return respond(
         reprompt_text=text,
         reprompt_ssml=ssml,
         attributes=attributes,
-        end_session=False
+        end_session=False,
+        static=static
     )
 
 
+def application_id(req_body):
+    """Return the ID of the skill a request was sent to, or None.
+
+    This is in the `session` object for most requests, and otherwise (e.g.
+    AudioPlayer events, which have no session) in `context.System`.
+    """
+
+    session = req_body.get('session')
+
+    if session and 'application' in session:
+        return session['application'].get('applicationId')
+
+    system = (req_body.get('context') or {}).get('System') or {}
+    return (system.get('application') or {}).get('applicationId')
+
+
 def validate_request_timestamp(req_body, max_diff=150):
     """Ensure the request's timestamp doesn't fall outside of the
     app's specified tolerance.
@@ -102,8 +234,13 @@ def validate_request_timestamp(req_body, max_diff=150):
         log.error('timestamp not present %s', req_body)
         return False
 
-    req_ts = datetime.strptime(time_str, "%Y-%m-%dT%H:%M:%SZ")
-    diff = (datetime.utcnow() - req_ts).total_seconds()
+    try:
+        req_ts = parse_timestamp(time_str)
+    except ValueError:
+        log.error('invalid timestamp %s', time_str)
+        return False
+
+    diff = _clock() - req_ts
 
     if abs(diff) > max_diff:
         log.error('timestamp difference too high: %d sec', diff)
@@ -112,6 +249,112 @@ def validate_request_timestamp(req_body, max_diff=150):
     return True
 
 
+def parse_timestamp(time_str):
+    """Parse an ISO-8601 timestamp of the form Amazon uses,
+    `YYYY-MM-DDTHH:MM:SS`, optionally followed by fractional seconds, and
+    ending in either `Z` or a `+HH:MM`/`-HH:MM` offset.
+
+    Returns seconds since the epoch as a float, or raises `ValueError`.
+    This is a fixed-layout parser, many times faster than `strptime`.
+    """
+
+    if len(time_str) < 20 or time_str[4] != '-' or time_str[7] != '-' or \
+       time_str[10] not in 'Tt' or time_str[13] != ':' or \
+       time_str[16] != ':':
+        raise ValueError('bad timestamp: %r' % time_str)
+
+    digits = time_str[0:4] + time_str[5:7] + time_str[8:10] + \
+        time_str[11:13] + time_str[14:16] + time_str[17:19]
+
+    if not digits.isdigit():
+        raise ValueError('bad timestamp: %r' % time_str)
+
+    year, month, day = int(digits[0:4]), int(digits[4:6]), int(digits[6:8])
+    hour, minute, second = \
+        int(digits[8:10]), int(digits[10:12]), int(digits[12:14])
+
+    if not (1 <= month <= 12 and hour < 24 and minute < 60 and
+            second < 61) or \
+            not 1 <= day <= calendar.monthrange(year, month)[1]:
+        raise ValueError('bad timestamp: %r' % time_str)
+
+    pos = 19
+    fraction = 0.0
+
+    if time_str[pos] == '.':
+        end = pos + 1
+        while end < len(time_str) and time_str[end].isdigit():
+            end += 1
+
+        if end == pos + 1:
+            raise ValueError('bad timestamp: %r' % time_str)
+
+        fraction = float(time_str[pos:end])
+        pos = end
+
+    tz = time_str[pos:]
+
+    if tz in ('Z', 'z'):
+        offset = 0
+    elif len(tz) in (5, 6) and tz[0] in '+-' and \
+            (len(tz) == 5 or tz[3] == ':'):
+        hh, mm = tz[1:3], tz[-2:]
+        if not (hh + mm).isdigit() or int(hh) >= 24 or int(mm) >= 60:
+            raise ValueError('bad timestamp: %r' % time_str)
+
+        offset = (int(hh) * 60 + int(mm)) * 60
+        if tz[0] == '-':
+            offset = -offset
+    else:
+        raise ValueError('bad timestamp: %r' % time_str)
+
+    return _days_from_civil(year, month, day) * 86400 + \
+        hour * 3600 + minute * 60 + second + fraction - offset
+
+
+def _days_from_civil(year, month, day):
+    """Days since 1970-01-01 for a proleptic Gregorian date (Howard
+    Hinnant's algorithm), avoiding any datetime object allocation.
+    """
+
+    year -= month <= 2
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+
+    return era * 146097 + doe - 719468
+
+
+class _Clock:
+    """Wall clock (seconds since the epoch) derived from the monotonic
+    clock, so that system time adjustments between re-syncs can't make
+    valid requests look stale. Re-anchors itself every `resync` seconds.
+    """
+
+    def __init__(self, resync=60):
+        self.resync = resync
+        self._anchor(time.monotonic())
+
+    def _anchor(self, mono):
+        # One tuple, replaced in a single assignment, so a concurrent
+        # reader never pairs a new wall time with an old monotonic one.
+        self._base = (time.time(), mono)
+
+    def __call__(self):
+        mono = time.monotonic()
+        wall, base = self._base
+
+        if mono - base >= self.resync:
+            self._anchor(mono)
+            wall, base = self._base
+
+        return wall + (mono - base)
+
+
+_clock = _Clock()
+
+
 def validate_request_certificate(headers, data):
     """Ensure that the certificate and signature specified in the
     request headers are truely from Amazon and correctly verify.
@@ -123,61 +366,250 @@ def validate_request_certificate(headers, data):
     :param data: Raw POST data attached to this request.
     """
 
-    # Make sure we have the appropriate headers.
-    if 'SignatureCertChainUrl' not in headers or \
-       'Signature' not in headers:
-        log.error('invalid request headers')
+    signature = _signature_headers(headers)
+
+    if not signature:
         return False
 
+    cert_url, sig, algorithm = signature
+    return _verify_signature(_get_certificate(cert_url), sig, data, algorithm)
+
+
+def _signature_headers(headers):
+    """Pull the certificate URL, decoded signature and its hash algorithm out
+    of the request headers, or return None if they are missing.
+
+    The SHA-256 `Signature-256` header is preferred when present.
+    """
+
+    if 'SignatureCertChainUrl' not in headers:
+        log.error('invalid request headers')
+        return None
+
+    if 'Signature-256' in headers:
+        header, algorithm = 'Signature-256', 'sha256'
+    elif 'Signature' in headers:
+        header, algorithm = 'Signature', 'sha1'
+    else:
+        log.error('invalid request headers')
+        return None
+
     cert_url = headers['SignatureCertChainUrl']
-    sig = base64.b64decode(headers['Signature'])
+    sig = base64.b64decode(headers[header])
+
+    return cert_url, sig, algorithm
 
-    cert = _get_certificate(cert_url)
+
+def _verify_signature(cert, sig, data, algorithm='sha1'):
+    """Check `sig` against `data` using a
+    :py:class:`alexandra.certs.SigningCertificate` returned by
+    :py:func:`_get_certificate`.
+    """
 
     if not cert:
         return False
 
-    try:
-        # ... wtf kind of API decision is this
-        crypto.verify(cert, sig, data, 'sha1')
-        return True
-    except:
+    if not cert.verify(sig, data, algorithm):
         log.error('invalid request signature')
         return False
 
+    return True
+
+
+def set_certificate_store(directory):
+    """Keep verified Amazon certificates in `directory` so that every process
+    on this host (e.g. pre-forked uWSGI or gunicorn workers) can share them
+    instead of each downloading its own copy.
+
+    Call this before forking. Pass `None` to go back to memory-only caching.
+    """
+
+    global _store
+
+    from alexandra import certs
+
+    _store = certs.CertificateStore(directory) if directory else None
+
+
+def set_certificate_fetcher(fetcher):
+    """Replace the :py:class:`alexandra.fetch.CertificateFetcher` used to
+    download certificates, e.g. to change its timeouts or retry policy.
+    """
+
+    global _fetcher
+
+    _fetcher = fetcher
+
+
+def set_trust_policy(policy):
+    """Replace the :py:class:`alexandra.certs.TrustPolicy` deciding which
+    certificate URLs and chains are accepted, e.g. to validate requests
+    signed by a local :py:class:`alexandra.testing.SigningAuthority`.
+
+    Certificates accepted under the previous policy are forgotten. Pass
+    `None` to go back to trusting only Amazon.
+    """
+
+    global _policy
+
+    _policy = policy
+    _cache.clear()
+
+
+def prefetch_certificates(*cert_urls):
+    """Download and verify the given certificates ahead of time, e.g. in a
+    master process before it forks its workers.
+
+    Returns True if every certificate was loaded successfully.
+    """
+
+    return all([_get_certificate(url) is not None for url in cert_urls])
+
+
+def start_certificate_refresher(interval=60):
+    """Start a background thread that downloads fresh copies of cached
+    certificates once they're past 90% of their lifetime, so requests never
+    have to wait for a certificate to be re-fetched.
+
+    Returns the :py:class:`alexandra.certs.CertificateRefresher`; call its
+    `stop` method to shut it down. When using a pre-forking server, start
+    this in each worker rather than in the master.
+
+    :param interval: Seconds between checks of the certificate cache.
+    """
+
+    from alexandra import certs
+
+    refresher = certs.CertificateRefresher(
+        _cache, _refresh_certificate, interval)
+    refresher.start()
+
+    return refresher
+
+
+def _cached_certificate(cert_url):
+    """Return the certificate for `cert_url` if we already have a valid copy
+    of it, without touching the network (other than starting a background
+    refresh, as :py:func:`_get_certificate` does).
+    """
+
+    # A miss here is followed by _get_certificate, which counts it.
+    cert = _cache.get(cert_url, count_miss=False)
+
+    return _refresh_if_due(cert_url, cert)
+
 
 def _get_certificate(cert_url):
-    """Download and validate a specified Amazon PEM file."""
-    global _cache
-
-    if cert_url in _cache:
-        cert = _cache[cert_url]
-        if cert.has_expired():
-            _cache = {}
-        else:
-            return cert
-
-    url = urlparse(cert_url)
-    host = url.netloc.lower()
-    path = posixpath.normpath(url.path)
-
-    # Sanity check location so we don't get some random person's cert.
-    if url.scheme != 'https' or \
-       host not in ['s3.amazonaws.com', 's3.amazonaws.com:443'] or \
-       not path.startswith('/echo.api/'):
-        log.error('invalid cert location %s', cert_url)
-        return
+    """Download and validate a specified Amazon PEM file.
 
-    resp = urlopen(cert_url)
-    if resp.getcode() != 200:
-        log.error('failed to download certificate')
-        return
+    The chain of trust is checked and the public key extracted once per URL.
+    The result is cached until the chain's notAfter date, and concurrent
+    requests for the same uncached URL share a single download.
+
+    Once a cached certificate is getting close to expiry it keeps being
+    returned while a fresh copy is fetched on a background thread.
+    """
 
-    cert = crypto.load_certificate(crypto.FILETYPE_PEM, resp.read())
+    cert = _cache.get_or_load(cert_url, lambda: _load_certificate(cert_url))
+
+    return _refresh_if_due(cert_url, cert)
 
-    if cert.has_expired() or cert.get_subject().CN != 'echo-api.amazon.com':
-        log.error('certificate expired or invalid')
-        return
 
-    _cache[cert_url] = cert
+def _refresh_if_due(cert_url, cert):
+    if cert is not None and cert.needs_refresh():
+        _refresh_in_background(cert_url)
+
     return cert
+
+
+def _refresh_in_background(cert_url):
+    if not _refresh_allowed(cert_url, time.time()):
+        return
+
+    def _refresh():
+        try:
+            _refresh_certificate(cert_url)
+        except Exception:
+            log.exception('failed to refresh certificate %s', cert_url)
+
+    threading.Thread(target=_refresh, daemon=True).start()
+
+
+def _refresh_allowed(cert_url, now):
+    return cert_url not in _refreshing and \
+        now - _last_refresh.get(cert_url, 0) >= _REFRESH_RETRY
+
+
+def _refresh_certificate(cert_url):
+    """Download a fresh copy of `cert_url` and swap it into the cache once
+    it has been verified. The old copy stays in place if this fails.
+    """
+
+    now = time.time()
+
+    with _refreshing_lock:
+        if not _refresh_allowed(cert_url, now):
+            return
+
+        _refreshing.add(cert_url)
+        _last_refresh[cert_url] = now
+
+    try:
+        cert, expires = _load_certificate(cert_url, refresh=True)
+
+        if cert is not None:
+            _cache.set(cert_url, cert, expires)
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(cert_url)
+
+
+def _load_certificate(cert_url, refresh=False):
+    """Fetch and check a certificate, returning a `(cert, expires)` pair
+    suitable for :py:meth:`alexandra.cache.LRUCache.get_or_load`.
+
+    :param refresh: Skip the on-disk store unless it holds a copy that
+        doesn't need refreshing yet (i.e. another process already got one).
+    """
+
+    global _fetcher
+
+    from alexandra import certs
+    from alexandra.fetch import CertificateFetcher, FetchError
+
+    policy = _policy or certs.AMAZON
+
+    if not policy.allows_url(cert_url):
+        log.error('invalid cert location %s', cert_url)
+        return None, None
+
+    store = _store
+
+    if store is not None:
+        pem = store.load(cert_url)
+        cert = pem and policy.load_certificate(pem)
+
+        if cert and not (refresh and cert.needs_refresh()):
+            return cert, cert.not_after
+
+        if pem and not cert:
+            store.discard(cert_url)
+
+    if _fetcher is None:
+        _fetcher = CertificateFetcher()
+
+    try:
+        pem = _fetcher.fetch(cert_url)
+    except FetchError as exc:
+        log.error('failed to download certificate: %s', exc)
+        return None, None
+
+    cert = policy.load_certificate(pem)
+
+    if not cert:
+        return None, None
+
+    if store is not None:
+        store.save(cert_url, pem)
+
+    return cert, cert.not_after
@@ -1,14 +1,20 @@
-import json
 import logging
+import threading
 
 from werkzeug.wrappers import Request, Response
 from werkzeug.exceptions import HTTPException, abort
 
+import alexandra.instrument as instrument
 import alexandra.util as util
+from alexandra.codec import default_codec
+from alexandra.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 
 log = logging.getLogger(__name__)
 
+# Event loop of each server thread, for running ``async def`` handlers.
+_local = threading.local()
+
 
 class WsgiApp:
     """This class is wraps :py:obj:`alexandra.app.Application` object and
@@ -17,17 +23,30 @@ class WsgiApp:
 
     This class implements the WSGI interface, so an instance of can be passed
     to standard WSGI servers (uWSGI, gunicorn, ...)
+
+    ``async def`` handlers are run to completion on an event loop kept by
+    each server thread.
     """
 
-    def __init__(self, alexa, validate_requests=True):
+    def __init__(self, alexa, validate_requests=True, codec=None,
+                 max_content_length=None):
         """
-        :param alexa: alexandra.app.App to wrap
+        :param alexa: :py:class:`alexandra.app.Application` (or
+            :py:class:`alexandra.router.SkillRouter`) to wrap
         :param validate_requests: Whether or not to do timestamp and
             certificate validation.
+        :param codec: JSON codec (see :py:mod:`alexandra.codec`) used for
+            request and response bodies. Defaults to the fastest available.
+        :param max_content_length: Largest request body (in bytes) that will
+            be read. Anything bigger is rejected with a 413. Defaults to
+            :py:data:`alexandra.util.MAX_CONTENT_LENGTH`.
         """
 
         self.alexa = alexa
         self.validate = validate_requests
+        self.codec = codec or default_codec()
+        self.max_content_length = \
+            max_content_length or util.MAX_CONTENT_LENGTH
 
     # The Request.application decorator handles some boring parts of making
     # this work with WSGI
@@ -41,35 +60,133 @@ class WsgiApp:
         :param request: Werkzeug request object
         """
 
+        metrics = self.alexa.metrics
+
+        if request.method == 'GET' and metrics is not None and \
+           request.path == metrics.path:
+            return Response(response=metrics.render(),
+                            status=200,
+                            content_type=METRICS_CONTENT_TYPE)
+
+        # Only non-None when someone subscribed to the app's instrumentation
+        timing = self.alexa.instrumentation.start()
+        outcome = instrument.ERROR
+
         try:
             if request.method != 'POST':
                 abort(400)
 
+            data = self._read_body(request)
+            if timing:
+                timing.mark('read')
+
+            # The signature covers the raw bytes, so unsigned or forged
+            # requests are turned away before paying to parse them.
+            if self.validate:
+                valid_cert = util.validate_request_certificate(
+                    request.headers, data)
+                if timing:
+                    timing.mark('certificate')
+
+                if not valid_cert:
+                    log.error('failed to validate request certificate')
+                    abort(403)
+
             try:
-                # Python 2.7 compatibility
-                data = request.data
-                if isinstance(data, str):
-                    body = json.loads(data)
-                else:
-                    body = json.loads(data.decode('utf-8'))
+                body = self.codec.loads(data)
             except ValueError:
                 abort(400)
 
-            if self.validate:
-                valid_cert = util.validate_request_certificate(
-                    request.headers, request.data)
+            if timing:
+                timing.mark('parse')
+                timing.describe(body)
 
+            if self.validate:
                 valid_ts = util.validate_request_timestamp(body)
+                if timing:
+                    timing.mark('timestamp')
 
-                if not valid_cert or not valid_ts:
-                    log.error('failed to validate request')
+                if not valid_ts:
+                    log.error('failed to validate request timestamp')
                     abort(403)
 
-            resp_obj = self.alexa.dispatch_request(body)
-            return Response(response=json.dumps(resp_obj, indent=4),
+            if not self.alexa.accepts(body):
+                log.error('request for unknown application: %s',
+                          util.application_id(body))
+                abort(403)
+
+            cache = self.alexa.response_cache
+            request_id = None
+
+            if cache is not None:
+                request_id = (body.get('request') or {}).get('requestId')
+
+            if request_id:
+                data = cache.get_or_build(
+                    request_id, lambda: self._respond(body, timing))
+            else:
+                data = self._respond(body, timing)
+
+            outcome = instrument.OK
+            return Response(response=data,
                             status=200,
                             mimetype='application/json')
 
         except HTTPException as exc:
+            outcome = instrument.INVALID if exc.code == 403 \
+                else instrument.BAD_REQUEST
+
             log.exception('Failed to handle request')
             return exc
+
+        finally:
+            if timing:
+                self.alexa.instrumentation.emit(timing, outcome)
+
+    def _respond(self, body, timing):
+        """Dispatch a validated request and return the encoded response."""
+
+        resp_obj = self.alexa.dispatch_request(body)
+        if hasattr(resp_obj, '__await__'):
+            resp_obj = _run(resp_obj)
+
+        if timing:
+            timing.mark('dispatch')
+
+        if type(resp_obj) is util.StaticResponse:
+            data = resp_obj.data
+        else:
+            data = self.codec.dumps(resp_obj)
+
+        if timing:
+            timing.mark('encode')
+
+        return data
+
+    def _read_body(self, request):
+        """Read the whole request body in one go, refusing (with a 413) to
+        buffer more than :py:attr:`max_content_length` bytes of it.
+        """
+
+        limit = self.max_content_length
+        length = request.content_length
+
+        if length is not None and length > limit:
+            abort(413)
+
+        data = request.stream.read(limit + 1)
+
+        if len(data) > limit:
+            abort(413)
+
+        return data
+
+
+def _run(awaitable):
+    loop = getattr(_local, 'loop', None)
+
+    if loop is None:
+        import asyncio
+        loop = _local.loop = asyncio.new_event_loop()
+
+    return loop.run_until_complete(awaitable)
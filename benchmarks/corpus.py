@@ -0,0 +1,118 @@
+"""Synthetic Alexa requests for benchmarking.
+
+Everything is generated from a seeded random number generator so that runs
+against different versions of alexandra see exactly the same input.
+"""
+
+import datetime as dt
+import random
+import string
+import uuid
+
+
+APPLICATION_ID = 'amzn1.ask.skill.00000000-0000-0000-0000-000000000000'
+
+
+class Corpus:
+    """Generates request bodies of the different shapes a skill sees.
+
+    :param seed: Seed for the random number generator.
+    """
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+
+    def _id(self, prefix):
+        return '%s.%s' % (prefix, uuid.UUID(int=self.random.getrandbits(128)))
+
+    def _word(self, length=8):
+        return ''.join(self.random.choice(string.ascii_lowercase)
+                       for _ in range(length))
+
+    def _envelope(self, request, new=False, attributes=None):
+        user_id = 'amzn1.ask.account.' + self._word(200).upper()
+
+        return {
+            'version': '1.0',
+            'session': {
+                'new': new,
+                'sessionId': self._id('SessionId'),
+                'application': {'applicationId': APPLICATION_ID},
+                'attributes': attributes or {},
+                'user': {'userId': user_id},
+            },
+            'context': {
+                'System': {
+                    'application': {'applicationId': APPLICATION_ID},
+                    'user': {'userId': user_id},
+                    'device': {'deviceId': self._id('amzn1.ask.device')},
+                }
+            },
+            'request': dict(request, **{
+                'requestId': self._id('EdwRequestId'),
+                'timestamp': dt.datetime.utcnow().strftime(
+                    '%Y-%m-%dT%H:%M:%SZ'),
+                'locale': 'en-US',
+            }),
+        }
+
+    def launch(self):
+        return self._envelope({'type': 'LaunchRequest'}, new=True)
+
+    def intent(self, name='BenchIntent', num_slots=10):
+        slots = {}
+
+        for i in range(num_slots):
+            slot_name = 'Slot%d' % i
+            value = self._word()
+
+            slots[slot_name] = {
+                'name': slot_name,
+                'value': value,
+                'resolutions': {
+                    'resolutionsPerAuthority': [{
+                        'authority': 'amzn1.er-authority.echo-sdk.' +
+                                     APPLICATION_ID + '.' + slot_name,
+                        'status': {'code': 'ER_SUCCESS_MATCH'},
+                        'values': [{
+                            'value': {'name': value, 'id': self._word(16)}
+                        }]
+                    }]
+                }
+            }
+
+        return self._envelope({
+            'type': 'IntentRequest',
+            'intent': {'name': name, 'slots': slots},
+        })
+
+    def large_session(self, num_attributes=200):
+        attributes = {
+            self._word(): {
+                'history': [self._word(20) for _ in range(5)],
+                'count': self.random.randint(0, 1000),
+            }
+            for _ in range(num_attributes)
+        }
+
+        return self._envelope({
+            'type': 'IntentRequest',
+            'intent': {'name': 'BenchIntent', 'slots': {}},
+        }, attributes=attributes)
+
+    def session_ended(self):
+        return self._envelope({
+            'type': 'SessionEndedRequest',
+            'reason': 'USER_INITIATED',
+        })
+
+    def all(self):
+        """Map of corpus name -> request body."""
+
+        return {
+            'launch': self.launch(),
+            'intent_10_slots': self.intent(num_slots=10),
+            'intent_50_slots': self.intent(num_slots=50),
+            'large_session': self.large_session(),
+            'session_ended': self.session_ended(),
+        }
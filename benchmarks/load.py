@@ -0,0 +1,248 @@
+"""Concurrent load generator for a running alexandra server, using requests
+signed by a local stand-in for Amazon.
+
+Start the benchmark skill, trusting a test signing authority kept in
+`/tmp/alexandra-ca`, and serving its certificate itself::
+
+    python -m benchmarks.load --ca /tmp/alexandra-ca serve --port 8080
+
+Then, from another shell (or machine), hit it with signed requests::
+
+    python -m benchmarks.load --ca /tmp/alexandra-ca run \\
+        --url http://127.0.0.1:8080/ --concurrency 16 --duration 30
+
+Every request goes through full certificate and timestamp validation, so
+this measures the real production code path without touching the internet.
+To load test your own skill instead, do what `serve` does in its process:
+load the authority, start its :py:class:`alexandra.testing.CertificateServer`
+and point :py:func:`alexandra.util.set_trust_policy` at it.
+
+Requests are signed ahead of time, with timestamps from when the run
+starts, so keep `--duration` under Amazon's 150 second tolerance.
+
+Releases without :py:mod:`alexandra.testing` can't trust a local authority;
+serve those with `--no-validate` to compare their throughput all the same.
+"""
+
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+
+from urllib.parse import urlparse
+
+from alexandra import util
+
+try:
+    from alexandra.testing import SigningAuthority
+except ImportError:  # Releases before alexandra.testing
+    SigningAuthority = None
+
+from benchmarks.corpus import Corpus
+from benchmarks.skill import create_app
+
+
+DEFAULT_CERT_URL = 'http://127.0.0.1:8081/echo.api/alexandra-test.pem'
+
+
+def serve(args):
+    from werkzeug.serving import run_simple
+
+    validate = not args.no_validate
+
+    if validate:
+        authority = _authority(args)
+        cert_url = urlparse(args.cert_url)
+
+        authority.serve(cert_url.hostname, cert_url.port, cert_url.path)
+        util.set_trust_policy(authority.policy(args.cert_url))
+
+    app = create_app()
+
+    if not args.workers:
+        run_simple(args.host, args.port, app.create_wsgi_app(validate),
+                   threaded=True)
+    elif hasattr(app, 'serve'):
+        app.serve(args.host, args.port, args.workers, args.threads,
+                  validate_requests=validate)
+    else:
+        sys.exit('this version of alexandra has no pre-forking server')
+
+
+def _authority(args):
+    if SigningAuthority is None:
+        sys.exit('this version of alexandra has no alexandra.testing; '
+                 'serve with --no-validate')
+
+    if not args.ca:
+        sys.exit('--ca is required')
+
+    return SigningAuthority.load(args.ca)
+
+
+def _requests(authority, cert_url, count, seed):
+    """Pre-sign `count` distinct requests of mixed shapes."""
+
+    corpus = Corpus(seed)
+    shapes = [corpus.launch, corpus.intent, corpus.session_ended]
+    requests = []
+
+    for i in range(count):
+        data = json.dumps(shapes[i % len(shapes)]()).encode('utf-8')
+        headers = authority.sign(data, cert_url)
+        headers['Content-Type'] = 'application/json'
+
+        requests.append((data, headers))
+
+    return requests
+
+
+class _Worker(threading.Thread):
+    """Sends requests over one keep-alive connection until `stop_at`."""
+
+    def __init__(self, url, requests, offset, stop_at):
+        super().__init__(daemon=True)
+
+        self.url = url
+        self.requests = requests
+        self.offset = offset
+        self.stop_at = stop_at
+
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+
+    def run(self):
+        conn = None
+        path = self.url.path or '/'
+        i = self.offset
+        timer = time.perf_counter
+
+        while timer() < self.stop_at:
+            data, headers = self.requests[i % len(self.requests)]
+            i += 1
+
+            if conn is None:
+                conn = http.client.HTTPConnection(
+                    self.url.hostname, self.url.port, timeout=10)
+
+            t0 = timer()
+
+            try:
+                conn.request('POST', path, data, headers)
+                resp = conn.getresponse()
+                resp.read()
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                conn.close()
+                conn = None
+                continue
+
+            self.latencies.append(timer() - t0)
+            self.statuses[resp.status] = self.statuses.get(resp.status, 0) + 1
+
+            if resp.will_close:
+                conn.close()
+                conn = None
+
+
+def run(args):
+    authority = _authority(args)
+    requests = _requests(authority, args.cert_url, args.requests, args.seed)
+
+    url = urlparse(args.url)
+    start = time.perf_counter()
+    stop_at = start + args.duration
+
+    workers = [
+        _Worker(url, requests, i * len(requests) // args.concurrency, stop_at)
+        for i in range(args.concurrency)
+    ]
+
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    elapsed = time.perf_counter() - start
+    results = summarize(workers, elapsed)
+
+    sys.stderr.write(
+        '%d requests in %.1fs: %.0f rps, p50 %.2fms, p99 %.2fms, '
+        'p99.9 %.2fms, max %.2fms, statuses %s, errors %d\n' % (
+            results['requests'], elapsed, results['rps'],
+            results['p50_ms'], results['p99_ms'], results['p999_ms'],
+            results['max_ms'], results['statuses'], results['errors']))
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+
+
+def summarize(workers, elapsed):
+    """Combine the latencies and status counts of every worker."""
+
+    samples = sorted(s for worker in workers for s in worker.latencies)
+    statuses = {}
+
+    for worker in workers:
+        for status, count in worker.statuses.items():
+            statuses[str(status)] = statuses.get(str(status), 0) + count
+
+    def pct(p):
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(p / 100.0 * len(samples)))] \
+            * 1e3
+
+    return {
+        'requests': len(samples),
+        'errors': sum(worker.errors for worker in workers),
+        'statuses': statuses,
+        'rps': len(samples) / elapsed,
+        'p50_ms': pct(50),
+        'p90_ms': pct(90),
+        'p99_ms': pct(99),
+        'p999_ms': pct(99.9),
+        'max_ms': samples[-1] * 1e3 if samples else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--ca',
+                        help='directory holding the test signing authority')
+    parser.add_argument('--cert-url', default=DEFAULT_CERT_URL,
+                        help='where the certificate chain is served from')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    serve_parser = commands.add_parser('serve', help='run the benchmark skill')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8080)
+    serve_parser.add_argument('-w', '--workers', type=int, default=0,
+                              help='use the pre-forking server with this '
+                                   'many workers (default: werkzeug)')
+    serve_parser.add_argument('-t', '--threads', type=int, default=8)
+    serve_parser.add_argument('--no-validate', action='store_true',
+                              help="don't check signatures or timestamps")
+    serve_parser.set_defaults(func=serve)
+
+    run_parser = commands.add_parser('run', help='send load at a server')
+    run_parser.add_argument('--url', default='http://127.0.0.1:8080/')
+    run_parser.add_argument('-c', '--concurrency', type=int, default=16)
+    run_parser.add_argument('-d', '--duration', type=float, default=30)
+    run_parser.add_argument('-n', '--requests', type=int, default=1000,
+                            help='number of distinct signed requests to send')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('-o', '--output', help='write JSON results here')
+    run_parser.set_defaults(func=run)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
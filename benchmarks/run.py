@@ -0,0 +1,227 @@
+"""Throughput and latency benchmarks for alexandra's request path.
+
+Run from the repository root::
+
+    python -m benchmarks.run --output before.json
+    python -m benchmarks.run --output after.json --compare before.json
+
+Results are written as JSON: one entry per benchmark, with requests per
+second and latency percentiles in microseconds.
+
+Everything is driven through the public `Application` and WSGI API, so
+the suite runs against older releases too. Benchmarks of features a
+release doesn't have (middleware hooks, or the local signing authority from
+:py:mod:`alexandra.testing` that the validated benchmarks need) are
+skipped, and only the ones both runs have are compared.
+
+Request timestamps are generated at startup, so keep a full run under
+Amazon's 150 second tolerance or the validated WSGI benchmarks will only be
+measuring rejections.
+"""
+
+import argparse
+import io
+import json
+import platform
+import sys
+import time
+
+from werkzeug.test import EnvironBuilder
+
+import alexandra
+
+from alexandra import util
+
+try:
+    from alexandra.testing import SigningAuthority
+except ImportError:  # Releases before alexandra.testing
+    SigningAuthority = None
+
+from benchmarks.corpus import Corpus
+from benchmarks.skill import create_app
+
+
+def _version():
+    try:
+        from importlib.metadata import version
+        return version('alexandra')
+    except Exception:
+        return None
+
+
+def measure(fn, iterations, warmup):
+    """Call `fn` repeatedly and return a dict of throughput and latency
+    percentiles (in microseconds).
+    """
+
+    for _ in range(warmup):
+        fn()
+
+    timer = time.perf_counter
+    samples = []
+
+    start = timer()
+    for _ in range(iterations):
+        t0 = timer()
+        fn()
+        samples.append(timer() - t0)
+    total = timer() - start
+
+    samples.sort()
+
+    def pct(p):
+        index = min(len(samples) - 1, int(p / 100.0 * len(samples)))
+        return samples[index] * 1e6
+
+    return {
+        'iterations': iterations,
+        'rps': iterations / total,
+        'mean_us': sum(samples) / len(samples) * 1e6,
+        'p50_us': pct(50),
+        'p90_us': pct(90),
+        'p99_us': pct(99),
+        'max_us': samples[-1] * 1e6,
+    }
+
+
+def _serve_certificate(authority):
+    """Serve the authority's certificate locally and trust it in place of
+    Amazon's, so the validation path can be measured without touching the
+    internet. Returns the certificate URL to sign requests with.
+    """
+
+    server = authority.serve()
+    util.set_trust_policy(authority.policy(server.url))
+
+    return server.url
+
+
+def _wsgi_call(wsgi_app, data, headers):
+    environ = EnvironBuilder(method='POST', data=data, headers=headers,
+                             content_type='application/json').get_environ()
+
+    def start_response(status, headers, exc_info=None):
+        pass
+
+    def call():
+        env = dict(environ)
+        env['wsgi.input'] = io.BytesIO(data)
+
+        for _ in wsgi_app(env, start_response):
+            pass
+
+    return call
+
+
+def benchmarks(corpus):
+    """Yield `(name, fn)` pairs for every benchmark."""
+
+    app = create_app()
+
+    bodies = corpus.all()
+    raw = dict((name, json.dumps(body).encode('utf-8'))
+               for name, body in bodies.items())
+
+    for name, body in sorted(bodies.items()):
+        yield 'dispatch_request/%s' % name, \
+            lambda body=body: app.dispatch_request(body)
+
+    # Same as above with a pass-through hook of every kind, to measure
+    # what middleware costs per request.
+    if hasattr(app, 'before_request'):
+        hooked = create_app()
+        hooked.before_request(lambda body, session: None)
+        hooked.after_request(lambda body, session, resp: resp)
+        hooked.error_handler(lambda body, session, error: None)
+
+        intent = bodies['intent_10_slots']
+        yield 'dispatch_request_hooks/intent_10_slots', \
+            lambda: hooked.dispatch_request(intent)
+
+    yield 'respond/text', lambda: alexandra.respond(text='Hello there')
+    yield 'respond/reprompt', lambda: alexandra.respond(
+        text='Hello', reprompt_text='Still there?', attributes={'a': 1},
+        end_session=False)
+
+    launch = bodies['launch']
+    yield 'validate_request_timestamp', \
+        lambda: util.validate_request_timestamp(launch)
+
+    unvalidated = app.create_wsgi_app(validate_requests=False)
+
+    for name, data in sorted(raw.items()):
+        yield 'wsgi/%s' % name, _wsgi_call(unvalidated, data, {})
+
+    if SigningAuthority is None:
+        return
+
+    authority = SigningAuthority()
+    cert_url = _serve_certificate(authority)
+
+    data = raw['launch']
+    headers = authority.sign(data, cert_url)
+    yield 'validate_request_certificate', \
+        lambda: util.validate_request_certificate(headers, data)
+
+    validated = app.create_wsgi_app(validate_requests=True)
+
+    for name, data in sorted(raw.items()):
+        yield 'wsgi_validated/%s' % name, \
+            _wsgi_call(validated, data, authority.sign(data, cert_url))
+
+
+def compare(results, baseline):
+    """Print how each benchmark's throughput changed against `baseline`."""
+
+    old = baseline['benchmarks']
+
+    for name, result in sorted(results['benchmarks'].items()):
+        if name not in old:
+            continue
+
+        change = (result['rps'] / old[name]['rps'] - 1) * 100
+        print('%-45s %12.0f rps  %+7.1f%%' % (name, result['rps'], change))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--iterations', type=int, default=5000)
+    parser.add_argument('--warmup', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-k', '--filter', default='',
+                        help='only run benchmarks whose name contains this')
+    parser.add_argument('-o', '--output', help='write JSON results here')
+    parser.add_argument('--compare', help='JSON results to compare against')
+    args = parser.parse_args(argv)
+
+    results = {
+        'alexandra': _version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'benchmarks': {},
+    }
+
+    for name, fn in benchmarks(Corpus(args.seed)):
+        if args.filter not in name:
+            continue
+
+        result = measure(fn, args.iterations, args.warmup)
+        results['benchmarks'][name] = result
+
+        sys.stderr.write('%-45s %12.0f rps  p50 %8.1fus  p99 %8.1fus\n' % (
+            name, result['rps'], result['p50_us'], result['p99_us']))
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+    if args.compare:
+        with open(args.compare) as fp:
+            compare(results, json.load(fp))
+
+
+if __name__ == '__main__':
+    main()
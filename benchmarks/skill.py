@@ -0,0 +1,26 @@
+"""The skill every benchmark runs.
+
+It only uses the API alexandra has always had, so the same benchmarks can
+be run against old releases to compare them with new ones.
+"""
+
+import alexandra
+
+
+def create_app():
+    app = alexandra.Application()
+
+    @app.launch
+    def launch(session):
+        return alexandra.reprompt('What would you like to do?')
+
+    @app.intent('BenchIntent')
+    def bench_intent(slots, session):
+        return alexandra.respond(text='You said %s' % slots.get('Slot0'),
+                                 attributes={'count': 1})
+
+    @app.session_end
+    def session_end():
+        return alexandra.respond()
+
+    return app
@@ -10,17 +10,20 @@ setup(
         'Development Status :: 5 - Production/Stable',
         'Intended Audience :: Developers',
         'License :: OSI Approved :: ISC License (ISCL)',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3.6',
         'Topic :: Home Automation',
         'Topic :: Internet :: WWW/HTTP :: WSGI :: Application',
         'Topic :: Software Development :: Libraries :: Application Frameworks',
     ],
     packages=['alexandra'],
+    python_requires='>=3.6',
     license='ISC',
     test_requires=['tox'],
     install_requires=[
         'Werkzeug==0.15.3',
-        'pyOpenssl==17.5.0'
-    ]
+        'cryptography>=2.3'
+    ],
+    extras_require={
+        'orjson': ['orjson'],
+    }
 )
@@ -1,7 +1,13 @@
+import asyncio
+import functools
+import subprocess
+import sys
+
 import pytest
 
-from alexandra import util
+from alexandra import respond, util
 from alexandra.app import Application
+from alexandra.session import MemorySessionStore
 
 
 def _request(req_type, session=None):
@@ -99,6 +105,126 @@ def test_intent_badargs():
             pass
 
 
+def test_assigned_handlers():
+    app = Application()
+
+    @app.intent('Foo')
+    def foo():
+        return 'foo'
+
+    assert dict(app.intent_map) == {'Foo': foo}
+
+    with pytest.raises(TypeError):
+        app.intent_map['Bar'] = foo
+
+    app.intent_map = {'Bar': lambda slots, session: slots['fizz']}
+    app.launch_fn = lambda: 'launch'
+    app.unknown_intent_fn = lambda: 'unknown'
+    app.session_end_fn = lambda request, session: request['type']
+
+    assert app.dispatch_request(_intent('Bar', {'fizz': 'buzz'})) == 'buzz'
+    assert app.dispatch_request(_intent('Foo')) == 'unknown'
+    assert app.dispatch_request(_request('LaunchRequest')) == 'launch'
+    assert app.dispatch_request(_request('SessionEndedRequest')) == \
+        'SessionEndedRequest'
+
+    with pytest.raises(ValueError):
+        app.launch_fn = lambda a, b, c: None
+
+
+def test_wrapped_handlers():
+    app = Application()
+
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return 'wrapped ' + func(*args, **kwargs)
+        return wrapper
+
+    class Handler:
+        def __call__(self, slots, session):
+            return 'object'
+
+        def method(self):
+            return 'method'
+
+    @app.intent('Wrapped')
+    @decorate
+    def wrapped(slots, session):
+        return 'two'
+
+    @app.intent('WrappedNoArgs')
+    @decorate
+    def wrapped_no_args():
+        return 'none'
+
+    app.intent('Partial')(functools.partial(lambda greeting, s, t: greeting,
+                                            'partial'))
+    app.intent('Object')(Handler())
+    app.intent('Method')(Handler().method)
+    app.intent('Defaults')(lambda name='defaults': name)
+
+    for name, expected in [('Wrapped', 'wrapped two'),
+                           ('WrappedNoArgs', 'wrapped none'),
+                           ('Partial', 'partial'), ('Object', 'object'),
+                           ('Method', 'method'), ('Defaults', 'defaults')]:
+        assert app.dispatch_request(_intent(name)) == expected
+
+    with pytest.raises(ValueError):
+        app.intent('KeywordOnly')(lambda slots, session, *, user: None)
+
+    with pytest.raises(ValueError):
+        app.intent('WrappedBad')(decorate(lambda a, b, c: None))
+
+
+def test_launch_and_session_end_args():
+    app = Application()
+
+    @app.launch
+    def launch():
+        return 'launched'
+
+    @app.session_end
+    def session_end(request, session):
+        return request['reason']
+
+    body = _request('SessionEndedRequest')
+    body['request']['reason'] = 'USER_INITIATED'
+
+    assert app.dispatch_request(_request('LaunchRequest')) == 'launched'
+    assert app.dispatch_request(body) == 'USER_INITIATED'
+
+    with pytest.raises(ValueError):
+        app.launch(lambda a, b: None)
+
+
+def test_dispatch_request_async():
+    app = Application()
+    app.use_session_store(MemorySessionStore())
+
+    @app.launch
+    async def launch(session):
+        await asyncio.sleep(0)
+        return respond('launched', attributes={'a': 1}, end_session=False)
+
+    @app.intent('Sync')
+    def sync_intent():
+        return 'sync'
+
+    session = {'sessionId': 'id', 'new': True}
+
+    loop = asyncio.new_event_loop()
+    resp = loop.run_until_complete(
+        app.dispatch_request_async(_request('LaunchRequest', session)))
+    sync = loop.run_until_complete(app.dispatch_request_async(_intent('Sync')))
+    loop.close()
+
+    assert resp['response']['outputSpeech']['text'] == 'launched'
+    assert resp['sessionAttributes'] == {}
+    assert app.session_store.load('id') == {'a': 1}
+    assert sync == 'sync'
+
+
 def test_unknown_request_type():
     with pytest.raises(ValueError):
         Application().dispatch_request(_request(req_type='something bad'))
@@ -124,3 +250,98 @@ def test_unknown_intent_handler():
     session = {'attributes': {'foo': 'bar'}}
 
     assert app.dispatch_request(_intent('What?', slots, session)) == 'bar'
+
+
+def test_request_handler():
+    app = Application()
+
+    @app.request_handler('CanFulfillIntentRequest')
+    def can_fulfill(request, session):
+        assert session is None
+        return request['intent']['name']
+
+    @app.request_handler('System.ExceptionEncountered')
+    def exception_encountered():
+        return 'error'
+
+    req = _request('CanFulfillIntentRequest')
+    req['request']['intent'] = {'name': 'Foo'}
+
+    assert app.dispatch_request(req) == 'Foo'
+    assert app.dispatch_request(_request('System.ExceptionEncountered')) == 'error'
+
+    with pytest.raises(ValueError):
+        @app.request_handler('Display.ElementSelected')
+        def bad_handler(a):
+            pass
+
+
+def test_request_handler_namespace():
+    app = Application()
+
+    @app.request_handler('AudioPlayer.*')
+    def audio_player(request, session):
+        return request['type']
+
+    @app.request_handler('AudioPlayer.PlaybackFailed')
+    def playback_failed():
+        return 'failed'
+
+    assert app.dispatch_request(_request('AudioPlayer.PlaybackStarted')) == 'AudioPlayer.PlaybackStarted'
+    assert app.dispatch_request(_request('AudioPlayer.PlaybackFailed')) == 'failed'
+
+    with pytest.raises(ValueError):
+        app.dispatch_request(_request('PlaybackController.PlayCommandIssued'))
+
+
+def test_lambda_handler():
+    app = Application()
+
+    @app.intent('Sync')
+    def sync_intent():
+        return 'sync'
+
+    @app.intent('Async')
+    async def async_intent():
+        return 'async'
+
+    assert app.lambda_handler(_intent('Sync'), None) == 'sync'
+
+    # The event loop is reused across invocations
+    assert app.lambda_handler(_intent('Async'), None) == 'async'
+    loop = app._lambda_loop
+    assert app.lambda_handler(_intent('Async'), None) == 'async'
+    assert app._lambda_loop is loop
+
+
+def test_application_id():
+    app = Application('amzn1.ask.skill.mine')
+
+    mine = _request('LaunchRequest', {
+        'application': {'applicationId': 'amzn1.ask.skill.mine'}})
+    other = _request('LaunchRequest', {
+        'application': {'applicationId': 'amzn1.ask.skill.other'}})
+
+    assert app.accepts(mine)
+    assert not app.accepts(other)
+    assert Application().accepts(other)
+
+    assert app.lambda_handler(mine) == app.launch_fn(None)
+
+    with pytest.raises(ValueError):
+        app.lambda_handler(other)
+
+
+def test_lazy_imports():
+    '''Importing alexandra shouldn't load the web server or crypto stack.'''
+
+    code = (
+        'import sys, alexandra; '
+        'alexandra.Application().intent("Foo")(lambda: None); '
+        'print(",".join(m for m in ["werkzeug", "cryptography", "ssl", '
+        '"alexandra.wsgi", "alexandra.certs", "asyncio", "inspect"] '
+        'if m in sys.modules))'
+    )
+
+    out = subprocess.check_output([sys.executable, '-c', code])
+    assert out.strip() == b''
@@ -0,0 +1,187 @@
+import asyncio
+import json
+
+from alexandra import util
+from alexandra.app import Application
+from alexandra.cache import LRUCache
+from alexandra.util import respond
+
+
+def _run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def _call(asgi_app, body, method='POST', chunks=None, headers=()):
+    '''Drive an ASGI app with a single request and collect what it sends.'''
+
+    sent = []
+    messages = [{'type': 'http.request', 'body': chunk, 'more_body': True}
+                for chunk in chunks or []]
+    messages.append({'type': 'http.request', 'body': body,
+                     'more_body': False})
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': method, 'headers': list(headers)}
+    _run(asgi_app(scope, receive, send))
+
+    status = sent[0]['status']
+    return status, b''.join(m.get('body', b'') for m in sent[1:])
+
+
+def _launch():
+    return json.dumps({'request': {'type': 'LaunchRequest'}}).encode('utf-8')
+
+
+def test_sync_handler():
+    app = Application()
+
+    @app.launch
+    def launch(session):
+        return {'launched': True}
+
+    status, body = _call(app.create_asgi_app(validate_requests=False),
+                         _launch())
+
+    assert status == 200
+    assert json.loads(body.decode('utf-8')) == {'launched': True}
+
+
+def test_async_handler():
+    app = Application()
+
+    @app.intent('Foo')
+    async def foo(slots, session):
+        await asyncio.sleep(0)
+        return {'slot': slots['bar']}
+
+    req = {
+        'request': {
+            'type': 'IntentRequest',
+            'intent': {
+                'name': 'Foo',
+                'slots': {'bar': {'name': 'bar', 'value': 'baz'}}
+            }
+        }
+    }
+
+    status, body = _call(app.create_asgi_app(validate_requests=False),
+                         json.dumps(req).encode('utf-8'))
+
+    assert status == 200
+    assert json.loads(body.decode('utf-8')) == {'slot': 'baz'}
+
+
+def test_bad_requests():
+    asgi_app = Application().create_asgi_app(validate_requests=False)
+
+    assert _call(asgi_app, _launch(), method='GET')[0] == 400
+    assert _call(asgi_app, b'not json')[0] == 400
+
+
+def test_validation_failure():
+    asgi_app = Application().create_asgi_app()
+
+    # No signature headers at all
+    assert _call(asgi_app, _launch())[0] == 403
+
+
+def test_too_large():
+    asgi_app = Application().create_asgi_app(
+        validate_requests=False, max_content_length=64)
+
+    assert _call(asgi_app, _launch())[0] == 200
+    assert _call(asgi_app, b'x' * 65)[0] == 413
+
+    # Rejected on the header alone, before the body arrives
+    assert _call(asgi_app, b'', headers=[(b'content-length', b'65')])[0] == 413
+
+    # And when streamed without one, as soon as the limit is passed
+    assert _call(asgi_app, b'', chunks=[b'x' * 40, b'x' * 40])[0] == 413
+
+
+def test_response_cache():
+    app = Application()
+    app.enable_response_cache()
+    asgi_app = app.create_asgi_app(validate_requests=False)
+    calls = []
+
+    @app.intent('Foo')
+    async def foo():
+        calls.append(1)
+        return respond('call %d' % len(calls))
+
+    intent = json.dumps({'request': {
+        'type': 'IntentRequest', 'requestId': 'req-1',
+        'intent': {'name': 'Foo'}}}).encode('utf-8')
+
+    assert _call(asgi_app, intent) == _call(asgi_app, intent)
+    assert len(calls) == 1
+
+
+def test_response_cache_concurrent_duplicates():
+    app = Application()
+    app.enable_response_cache()
+    asgi_app = app.create_asgi_app(validate_requests=False)
+    calls = []
+
+    @app.intent('Foo')
+    async def foo():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return respond('call %d' % len(calls))
+
+    intent = json.dumps({'request': {
+        'type': 'IntentRequest', 'requestId': 'req-1',
+        'intent': {'name': 'Foo'}}}).encode('utf-8')
+
+    async def call():
+        sent = []
+        messages = [{'type': 'http.request', 'body': intent}]
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        await asgi_app({'type': 'http', 'method': 'POST', 'headers': []},
+                       receive, send)
+        return sent[1]['body']
+
+    async def both():
+        return await asyncio.gather(call(), call())
+
+    first, retry = _run(both())
+
+    assert first == retry
+    assert b'call 1' in first
+    assert len(calls) == 1
+
+
+def test_stale_certificate_refreshed(monkeypatch):
+    class StaleCert:
+        def needs_refresh(self, now=None):
+            return True
+
+    url = 'https://s3.amazonaws.com/echo.api/echo-api-cert.pem'
+    refreshed = []
+
+    monkeypatch.setattr(util, '_cache', LRUCache())
+    monkeypatch.setattr(util, '_refresh_in_background', refreshed.append)
+    monkeypatch.setattr(util, '_verify_signature', lambda *args: True)
+    util._cache.set(url, StaleCert())
+
+    asgi_app = Application().create_asgi_app()
+    headers = {'SignatureCertChainUrl': url, 'Signature-256': ''}
+
+    assert _run(asgi_app._validate_certificate(headers, b'{}'))
+    assert refreshed == [url]
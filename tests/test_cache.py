@@ -0,0 +1,198 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from alexandra.cache import LRUCache, ResponseCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLRUCache:
+    '''alexandra.cache.LRUCache'''
+
+    def test_eviction(self):
+        cache = LRUCache(maxsize=2)
+
+        cache.set('a', 1)
+        cache.set('b', 2)
+        assert cache.get('a') == 1
+
+        # 'b' is now the least recently used
+        cache.set('c', 3)
+
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+        assert len(cache) == 2
+
+    def test_expiry(self):
+        clock = FakeClock()
+        cache = LRUCache(clock=clock)
+
+        cache.set('short', 1, expires=clock.now + 10)
+        cache.set('long', 2, expires=clock.now + 100)
+        cache.set('forever', 3)
+
+        clock.now += 50
+
+        assert cache.get('short') is None
+        assert cache.get('long') == 2
+        assert cache.get('forever') == 3
+
+    def test_get_or_load(self):
+        cache = LRUCache()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return 'value', None
+
+        assert cache.get_or_load('key', loader) == 'value'
+        assert cache.get_or_load('key', loader) == 'value'
+        assert len(calls) == 1
+
+    def test_none_not_cached(self):
+        cache = LRUCache()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return None, None
+
+        assert cache.get_or_load('key', loader) is None
+        assert cache.get_or_load('key', loader) is None
+        assert len(calls) == 2
+
+    def test_single_flight(self):
+        cache = LRUCache()
+        calls = []
+        results = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.05)
+            return 'value', None
+
+        def worker():
+            results.append(cache.get_or_load('key', loader))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(calls) == 1
+        assert results == ['value'] * 8
+
+    def test_loader_error(self):
+        cache = LRUCache()
+
+        def loader():
+            raise IOError('nope')
+
+        with pytest.raises(IOError):
+            cache.get_or_load('key', loader)
+
+        assert cache.get_or_load('key', lambda: ('ok', None)) == 'ok'
+
+
+class TestResponseCache:
+    '''alexandra.cache.ResponseCache'''
+
+    def test_window(self):
+        clock = FakeClock()
+        cache = ResponseCache(window=150, clock=clock)
+
+        cache.store('req-1', b'{}')
+        assert cache.get('req-1') == b'{}'
+
+        clock.now += 151
+        assert cache.get('req-1') is None
+
+    def test_get_or_build(self):
+        cache = ResponseCache()
+        calls = []
+
+        def build():
+            calls.append(1)
+            return b'{"n":1}'
+
+        assert cache.get_or_build('req-1', build) == b'{"n":1}'
+        assert cache.get_or_build('req-1', build) == b'{"n":1}'
+        assert len(calls) == 1
+        assert cache.hits == 1
+
+    def test_concurrent_duplicates(self):
+        cache = ResponseCache()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def build():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return b'{}'
+
+        first = threading.Thread(
+            target=lambda: results.append(cache.get_or_build('r', build)))
+        first.start()
+        started.wait()
+
+        retry = threading.Thread(
+            target=lambda: results.append(cache.get_or_build('r', build)))
+        retry.start()
+
+        release.set()
+        first.join()
+        retry.join()
+
+        assert results == [b'{}', b'{}']
+        assert len(calls) == 1
+
+    def test_concurrent_duplicates_async(self):
+        cache = ResponseCache()
+        calls = []
+
+        async def build():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return b'{}'
+
+        async def fail():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise KeyError('boom')
+
+        async def run():
+            results = await asyncio.gather(
+                cache.get_or_build_async('r', build),
+                cache.get_or_build_async('r', build))
+            errors = await asyncio.gather(
+                cache.get_or_build_async('e', fail),
+                cache.get_or_build_async('e', fail),
+                return_exceptions=True)
+
+            return results, errors
+
+        loop = asyncio.new_event_loop()
+        try:
+            results, errors = loop.run_until_complete(run())
+        finally:
+            loop.close()
+
+        assert results == [b'{}', b'{}']
+        assert [type(e) for e in errors] == [KeyError, KeyError]
+        assert len(calls) == 2
+        assert cache.get('r') == b'{}'
+        assert cache.get('e') is None
@@ -0,0 +1,279 @@
+import datetime as dt
+import time
+
+from cryptography import x509
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.x509.oid import NameOID
+
+from alexandra import certs, util
+from alexandra.cache import LRUCache
+
+
+def _key():
+    return rsa.generate_private_key(65537, 2048, default_backend())
+
+
+def _cert(subject, issuer, key, issuer_key, domain=None, days=30, ca=False,
+          path_length=None, cert_sign=None):
+    now = dt.datetime.utcnow()
+    builder = x509.CertificateBuilder() \
+        .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, subject)])) \
+        .issuer_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, issuer)])) \
+        .public_key(key.public_key()) \
+        .serial_number(x509.random_serial_number()) \
+        .not_valid_before(now - dt.timedelta(days=1)) \
+        .not_valid_after(now + dt.timedelta(days=days)) \
+        .add_extension(x509.BasicConstraints(ca=ca, path_length=path_length),
+                       critical=True)
+
+    if cert_sign is not None:
+        builder = builder.add_extension(x509.KeyUsage(
+            digital_signature=True, content_commitment=False,
+            key_encipherment=False, data_encipherment=False,
+            key_agreement=False, key_cert_sign=cert_sign, crl_sign=False,
+            encipher_only=False, decipher_only=False), critical=True)
+
+    if domain:
+        builder = builder.add_extension(
+            x509.SubjectAlternativeName([x509.DNSName(domain)]), critical=False)
+
+    return builder.sign(issuer_key, hashes.SHA256(), default_backend())
+
+
+def _pem(*chain):
+    return b''.join(c.public_bytes(serialization.Encoding.PEM) for c in chain)
+
+
+class TestLoadCertificate:
+    '''alexandra.certs.load_certificate'''
+
+    def setup_class(self):
+        self.root_key = _key()
+        self.root = _cert('Test Root', 'Test Root', self.root_key,
+                          self.root_key, ca=True, days=365)
+        self.roots = certs.load_roots(_pem(self.root))
+
+        self.leaf_key = _key()
+        self.leaf = _cert('echo-api', 'Test Root', self.leaf_key,
+                          self.root_key, domain='echo-api.amazon.com')
+
+    def test_valid_chain(self):
+        cert = certs.load_certificate(_pem(self.leaf, self.root),
+                                      roots=self.roots)
+
+        assert cert is not None
+        assert not cert.has_expired()
+
+        data = b'{"some": "request"}'
+        for name, algo in [('sha1', hashes.SHA1), ('sha256', hashes.SHA256)]:
+            sig = self.leaf_key.sign(data, padding.PKCS1v15(), algo())
+
+            assert cert.verify(sig, data, name) is True
+            assert cert.verify(sig, data + b' ', name) is False
+
+    def test_untrusted_root(self):
+        other_key = _key()
+        other = _cert('Test Root', 'Test Root', other_key, other_key, ca=True)
+
+        assert certs.load_certificate(_pem(self.leaf, self.root),
+                                      roots=certs.load_roots(_pem(other))) is None
+
+    def test_wrong_domain(self):
+        leaf = _cert('evil', 'Test Root', self.leaf_key, self.root_key,
+                     domain='evil.example.com')
+
+        assert certs.load_certificate(_pem(leaf, self.root),
+                                      roots=self.roots) is None
+
+    def test_expired(self):
+        leaf = _cert('echo-api', 'Test Root', self.leaf_key, self.root_key,
+                     domain='echo-api.amazon.com', days=-1)
+
+        assert certs.load_certificate(_pem(leaf, self.root),
+                                      roots=self.roots) is None
+
+    def test_garbage(self):
+        assert certs.load_certificate(b'not a pem', roots=self.roots) is None
+
+    def test_malformed_pem(self):
+        pem = b'-----BEGIN CERTIFICATE-----\nnope\n-----END CERTIFICATE-----'
+
+        assert certs.load_certificate(pem, roots=self.roots) is None
+        assert certs.load_certificate(pem + _pem(self.leaf, self.root),
+                                      roots=self.roots) is None
+
+    def test_intermediate(self):
+        key = _key()
+        intermediate = _cert('Intermediate', 'Test Root', key, self.root_key,
+                             ca=True, cert_sign=True)
+        leaf = _cert('echo-api', 'Intermediate', self.leaf_key, key,
+                     domain='echo-api.amazon.com')
+
+        assert certs.load_certificate(_pem(leaf, intermediate, self.root),
+                                      roots=self.roots) is not None
+        assert certs.load_certificate(_pem(leaf, intermediate),
+                                      roots=self.roots) is not None
+
+    def test_issued_by_non_ca(self):
+        # Any certificate from a trusted root must not be able to mint
+        # signing certificates.
+        key = _key()
+
+        for intermediate in [
+            _cert('Mallory', 'Test Root', key, self.root_key),
+            _cert('Mallory', 'Test Root', key, self.root_key, ca=True,
+                  cert_sign=False),
+        ]:
+            forged = _cert('echo-api.amazon.com', 'Mallory', self.leaf_key,
+                           key, domain='echo-api.amazon.com')
+
+            for chain in [(forged, intermediate, self.root),
+                          (forged, intermediate)]:
+                assert certs.load_certificate(_pem(*chain),
+                                              roots=self.roots) is None
+
+    def test_path_length(self):
+        root_key, key = _key(), _key()
+        root = _cert('Test Root', 'Test Root', root_key, root_key, ca=True,
+                     path_length=0)
+        intermediate = _cert('Intermediate', 'Test Root', key, root_key,
+                             ca=True)
+        leaf = _cert('echo-api', 'Intermediate', self.leaf_key, key,
+                     domain='echo-api.amazon.com')
+        roots = certs.load_roots(_pem(root))
+
+        assert certs.load_certificate(_pem(leaf, intermediate, root),
+                                      roots=roots) is None
+        assert certs.load_certificate(_pem(leaf, intermediate),
+                                      roots=roots) is None
+
+        leaf = _cert('echo-api', 'Test Root', self.leaf_key, root_key,
+                     domain='echo-api.amazon.com')
+        assert certs.load_certificate(_pem(leaf, root), roots=roots)
+
+
+class TestTrustPolicy:
+    '''alexandra.certs.TrustPolicy'''
+
+    def test_amazon_urls(self):
+        policy = certs.AMAZON
+
+        for url in [
+            'https://s3.amazonaws.com/echo.api/echo-api-cert.pem',
+            'https://S3.AMAZONAWS.COM/echo.api/echo-api-cert.pem',
+            'https://s3.amazonaws.com:443/echo.api/../echo.api/cert.pem',
+        ]:
+            assert policy.allows_url(url), url
+
+        for url in [
+            'http://s3.amazonaws.com/echo.api/echo-api-cert.pem',
+            'https://notamazon.com/echo.api/echo-api-cert.pem',
+            'https://s3.amazonaws.com/EcHo.aPi/echo-api-cert.pem',
+            'https://s3.amazonaws.com/invalid.path/echo-api-cert.pem',
+            'https://s3.amazonaws.com:563/echo.api/echo-api-cert.pem',
+            'https://s3.amazonaws.com/echo.api/../cert.pem',
+        ]:
+            assert not policy.allows_url(url), url
+
+    def test_custom(self):
+        key = _key()
+        root = _cert(u'Root', u'Root', key, key, ca=True)
+        leaf = _cert(u'test.local', u'Root', key, key, domain=u'test.local')
+
+        policy = certs.TrustPolicy(
+            scheme='http', hosts=('127.0.0.1:8081',), path_prefix='/certs/',
+            domain='test.local', roots=certs.load_roots(_pem(root)))
+
+        assert policy.allows_url('http://127.0.0.1:8081/certs/a.pem')
+        assert not policy.allows_url('http://127.0.0.1:8082/certs/a.pem')
+
+        assert policy.load_certificate(_pem(leaf, root)) is not None
+        assert certs.AMAZON.load_certificate(_pem(leaf, root)) is None
+
+
+class TestCertificateStore:
+    '''alexandra.certs.CertificateStore'''
+
+    def test_roundtrip(self, tmpdir):
+        store = certs.CertificateStore(str(tmpdir.join('certs')))
+        url = 'https://s3.amazonaws.com/echo.api/echo-api-cert.pem'
+
+        assert store.load(url) is None
+
+        store.save(url, b'pem data')
+        assert store.load(url) == b'pem data'
+
+        # No temporary files left behind
+        assert len(tmpdir.join('certs').listdir()) == 1
+
+        store.discard(url)
+        assert store.load(url) is None
+
+    def test_used_before_network(self, tmpdir, monkeypatch):
+        root_key = _key()
+        root = _cert('Test Root', 'Test Root', root_key, root_key, ca=True)
+        leaf = _cert('echo-api', 'Test Root', root_key, root_key,
+                     domain='echo-api.amazon.com')
+
+        monkeypatch.setattr(certs, '_roots', certs.load_roots(_pem(root)))
+        monkeypatch.setattr(util, '_cache', LRUCache())
+
+        class NoNetwork:
+            def fetch(self, url):
+                raise AssertionError('should not hit the network')
+
+        monkeypatch.setattr(util, '_fetcher', NoNetwork())
+
+        url = 'https://s3.amazonaws.com/echo.api/echo-api-cert.pem'
+        util.set_certificate_store(str(tmpdir))
+        util._store.save(url, _pem(leaf, root))
+
+        try:
+            assert util.prefetch_certificates(url) is True
+            assert util._cached_certificate(url) is not None
+        finally:
+            util.set_certificate_store(None)
+
+
+class FakeCert:
+    def __init__(self, due):
+        self.due = due
+
+    def needs_refresh(self, now=None):
+        return self.due
+
+
+class TestCertificateRefresher:
+    '''alexandra.certs.CertificateRefresher'''
+
+    def test_refresh_due(self):
+        cache = LRUCache()
+        cache.set('old', FakeCert(due=True))
+        cache.set('fresh', FakeCert(due=False))
+
+        refreshed = []
+        certs.CertificateRefresher(cache, refreshed.append).refresh_due()
+
+        assert refreshed == ['old']
+
+    def test_stale_while_revalidate(self, monkeypatch):
+        url = 'https://s3.amazonaws.com/echo.api/echo-api-cert.pem'
+        old, new = FakeCert(due=True), FakeCert(due=False)
+
+        monkeypatch.setattr(util, '_cache', LRUCache())
+        monkeypatch.setattr(util, '_last_refresh', {})
+        monkeypatch.setattr(util, '_load_certificate',
+                            lambda url, refresh=False: (new, None))
+        util._cache.set(url, old)
+
+        # The old certificate keeps being served while the refresh happens
+        assert util._get_certificate(url) is old
+
+        for _ in range(100):
+            if util._cached_certificate(url) is new:
+                break
+            time.sleep(0.01)
+
+        assert util._cached_certificate(url) is new
@@ -0,0 +1,44 @@
+import pytest
+
+from alexandra import codec
+from alexandra.util import respond
+
+
+CODECS = [codec.JsonCodec()]
+
+try:
+    CODECS.append(codec.OrjsonCodec())
+except ImportError:
+    pass
+
+
+@pytest.mark.parametrize('c', CODECS, ids=repr)
+def test_roundtrip(c):
+    obj = {'version': '1.0', 'response': {'outputSpeech': {'text': u'caf\xe9'}}}
+    data = c.dumps(obj)
+
+    assert isinstance(data, bytes)
+    assert b'\n' not in data and b': ' not in data
+    assert c.loads(data) == obj
+
+
+@pytest.mark.parametrize('c', CODECS, ids=repr)
+def test_bad_input(c):
+    with pytest.raises(ValueError):
+        c.loads(b'{not json')
+
+
+@pytest.mark.parametrize('c', CODECS, ids=repr)
+def test_matches_json_codec(c):
+    for obj in [
+        respond('hi', attributes={1: 'a', 2.5: 'b', None: 'c'}),
+        respond('hi', attributes={'big': 2 ** 70}),
+    ]:
+        assert c.dumps(obj) == codec.JsonCodec().dumps(obj)
+
+    with pytest.raises(TypeError):
+        c.dumps({'set': {1}})
+
+
+def test_default_codec():
+    assert codec.default_codec() is not None
@@ -0,0 +1,361 @@
+import asyncio
+import functools
+import threading
+import time
+
+import pytest
+
+from alexandra import deadline
+from alexandra.app import Application
+from alexandra.util import respond
+
+
+def _intent(name):
+    return {
+        'request': {'type': 'IntentRequest', 'intent': {'name': name}},
+        'session': None,
+    }
+
+
+class TestDeadlineExecutor:
+    '''alexandra.deadline.DeadlineExecutor'''
+
+    def test_call(self):
+        executor = deadline.DeadlineExecutor(1)
+
+        assert executor.call(lambda a, b: a + b, 1, 2) == 3
+        executor.shutdown()
+
+    def test_timed_out(self):
+        executor = deadline.DeadlineExecutor(0.05)
+        release = threading.Event()
+
+        assert executor.call(release.wait) is deadline.TIMED_OUT
+
+        release.set()
+        executor.shutdown(wait=True)
+
+    def test_exception(self):
+        executor = deadline.DeadlineExecutor(1)
+
+        def fail():
+            raise KeyError('boom')
+
+        with pytest.raises(KeyError):
+            executor.call(fail)
+
+    def test_remaining(self):
+        executor = deadline.DeadlineExecutor(5)
+
+        assert deadline.remaining() is None
+
+        left = executor.call(deadline.remaining)
+        assert 4 < left <= 5
+
+        assert deadline.remaining() is None
+
+
+class TestApplicationDeadline:
+    '''alexandra.app.Application.set_deadline'''
+
+    def test_fallback(self):
+        app = Application()
+        app.set_deadline(0.05)
+        release = threading.Event()
+
+        @app.intent('Slow')
+        def slow():
+            release.wait()
+            return respond('done')
+
+        @app.intent('Fast')
+        def fast():
+            return respond('fast')
+
+        resp = app.dispatch_request(_intent('Slow'))
+        release.set()
+
+        assert resp == app.deadline_fallback_fn()
+        assert app.dispatch_request(_intent('Fast')) == respond('fast')
+
+    def test_custom_fallback(self):
+        app = Application()
+        app.set_deadline(0.05)
+        metrics = app.enable_metrics()
+
+        @app.deadline_fallback
+        def still_working():
+            return respond('still working')
+
+        @app.intent('Slow')
+        def slow():
+            time.sleep(0.2)
+
+        assert app.dispatch_request(_intent('Slow')) == \
+            respond('still working')
+        assert metrics.deadlines_exceeded.snapshot() == {(): 1}
+
+    def test_async_handler(self):
+        app = Application()
+        app.set_deadline(0.05)
+
+        @app.intent('Slow')
+        async def slow():
+            await asyncio.sleep(1)
+
+        @app.intent('Fast')
+        async def fast():
+            return respond('fast')
+
+        assert app.lambda_handler(_intent('Slow')) == app.deadline_fallback_fn()
+        assert app.lambda_handler(_intent('Fast')) == respond('fast')
+
+    def _busy_pool(self, app, seconds):
+        """Occupy every pool thread for `seconds`."""
+
+        release = threading.Event()
+        app.deadline.pool.submit(release.wait, seconds)
+        return release
+
+    def test_async_handler_skips_pool(self):
+        app = Application()
+        app.set_deadline(0.5, max_workers=1)
+
+        @app.intent('Async')
+        async def async_intent():
+            await asyncio.sleep(0)
+            return threading.current_thread().name
+
+        release = self._busy_pool(app, 5)
+        start = time.monotonic()
+
+        assert app.lambda_handler(_intent('Async')) == \
+            threading.current_thread().name
+        assert time.monotonic() - start < 0.2
+
+        release.set()
+
+    def test_queued_coroutine_gets_remaining_budget(self):
+        app = Application()
+        app.set_deadline(0.5, max_workers=1)
+
+        def passthrough(func):
+            # A plain function returning a coroutine, so it goes through
+            # the pool.
+            @functools.wraps(func)
+            def wrapper(*args):
+                return func(*args)
+            return wrapper
+
+        @app.intent('Slow')
+        @passthrough
+        async def slow():
+            await asyncio.sleep(0.3)
+            return respond('done')
+
+        release = self._busy_pool(app, 0.3)
+        start = time.monotonic()
+
+        assert app.lambda_handler(_intent('Slow')) == \
+            app.deadline_fallback_fn()
+        assert time.monotonic() - start < 0.6
+
+        release.set()
+
+        async def dispatch():
+            self._busy_pool(app, 0.3)
+            return await app.dispatch_request_async(_intent('Slow'))
+
+        loop = asyncio.new_event_loop()
+        start = time.monotonic()
+        assert loop.run_until_complete(dispatch()) == \
+            app.deadline_fallback_fn()
+        assert time.monotonic() - start < 0.6
+        loop.close()
+
+    def test_async_remaining(self):
+        app = Application()
+        app.set_deadline(1)
+
+        @app.intent('Budget')
+        async def budget():
+            return deadline.remaining()
+
+        left = app.lambda_handler(_intent('Budget'))
+
+        if deadline.ContextVar is None:
+            assert left is None
+        else:
+            assert 0.5 < left <= 1
+
+    def test_dispatch_async_doesnt_block(self):
+        app = Application()
+        app.set_deadline(0.1)
+
+        @app.intent('Slow')
+        def slow():
+            time.sleep(0.5)
+
+        @app.intent('Fast')
+        def fast():
+            return respond('fast')
+
+        async def both():
+            # The slow handler sits on the pool, not the event loop.
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            ticker = asyncio.ensure_future(tick())
+            slow = await app.dispatch_request_async(_intent('Slow'))
+            fast = await app.dispatch_request_async(_intent('Fast'))
+            ticker.cancel()
+
+            return slow, fast, ticks
+
+        loop = asyncio.new_event_loop()
+        slow, fast, ticks = loop.run_until_complete(both())
+        loop.close()
+
+        assert slow == app.deadline_fallback_fn()
+        assert fast == respond('fast')
+        assert ticks >= 5
+
+
+class TestGather:
+    '''alexandra.deadline.gather'''
+
+    def _run(self, coro):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            loop.close()
+
+    def test_concurrent(self):
+        async def backend(value, delay):
+            await asyncio.sleep(delay)
+            return value
+
+        start = time.monotonic()
+        results = self._run(deadline.gather(
+            backend('a', 0.1), backend('b', 0.1), backend('c', 0)))
+
+        assert results == ['a', 'b', 'c']
+        assert time.monotonic() - start < 0.2
+        assert self._run(deadline.gather()) == []
+
+    def test_timeout(self):
+        cancelled = []
+
+        async def slow():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def fast():
+            return 'fast'
+
+        results = self._run(deadline.gather(
+            slow(), fast(), timeout=0.05, default='late'))
+
+        assert results == ['late', 'fast']
+        assert cancelled == [True]
+
+    def test_exception(self):
+        async def fail(error):
+            raise error
+
+        async def fine():
+            return 1
+
+        with pytest.raises(KeyError):
+            self._run(deadline.gather(
+                fine(), fail(KeyError('a')), fail(ValueError('b'))))
+
+    def test_within_deadline(self):
+        app = Application()
+        app.set_deadline(0.2)
+
+        @app.intent('Home')
+        async def home():
+            return await deadline.gather(
+                asyncio.sleep(0, 'profile'), asyncio.sleep(1, 'picks'))
+
+        results = app.lambda_handler(_intent('Home'))
+
+        if deadline.ContextVar is None:
+            assert results == app.deadline_fallback_fn()
+        else:
+            assert results == ['profile', None]
+
+
+class TestFanOut:
+    '''alexandra.deadline.fan_out'''
+
+    def test_concurrent(self):
+        start = time.monotonic()
+        results = deadline.fan_out(
+            lambda: time.sleep(0.1) or 'a',
+            lambda: time.sleep(0.1) or 'b',
+            lambda: 'c')
+
+        assert results == ['a', 'b', 'c']
+        assert time.monotonic() - start < 0.2
+        assert deadline.fan_out() == []
+
+    def test_timeout(self):
+        release = threading.Event()
+
+        results = deadline.fan_out(
+            release.wait, lambda: 'fast', timeout=0.05, default='late')
+
+        assert results == ['late', 'fast']
+        release.set()
+
+    def test_exception(self):
+        def fail():
+            raise KeyError('boom')
+
+        with pytest.raises(KeyError):
+            deadline.fan_out(lambda: 1, fail)
+
+    def test_within_deadline(self):
+        app = Application()
+        app.set_deadline(0.2)
+        release = threading.Event()
+
+        @app.intent('Home')
+        def home():
+            return deadline.fan_out(
+                lambda: 'profile', release.wait, deadline.remaining)
+
+        profile, picks, left = app.dispatch_request(_intent('Home'))
+        release.set()
+
+        assert (profile, picks) == ('profile', None)
+        assert 0 < left <= 0.2
+
+    @pytest.mark.skipif(deadline.ContextVar is None,
+                        reason='async deadlines need contextvars')
+    def test_within_async_deadline(self):
+        app = Application()
+        app.set_deadline(0.2)
+        release = threading.Event()
+
+        @app.intent('Home')
+        async def home():
+            return deadline.fan_out(
+                lambda: 'profile', release.wait, deadline.remaining)
+
+        profile, picks, left = app.lambda_handler(_intent('Home'))
+        release.set()
+
+        assert (profile, picks) == ('profile', None)
+        assert 0 < left <= 0.2
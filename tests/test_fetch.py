@@ -0,0 +1,146 @@
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import pytest
+
+from alexandra.fetch import CertificateFetcher, CircuitBreaker, FetchError
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        body = b'pem for ' + self.path.encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), Handler)
+        self.requests = []
+        self.statuses = []
+        self.connections = 0
+
+    def get_request(self):
+        self.connections += 1
+        return HTTPServer.get_request(self)
+
+
+@pytest.fixture
+def server():
+    server = Server()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def _url(server, path):
+    return 'http://127.0.0.1:%d%s' % (server.server_port, path)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCertificateFetcher:
+    '''alexandra.fetch.CertificateFetcher'''
+
+    def test_keep_alive(self, server):
+        fetcher = CertificateFetcher(backoff=0)
+
+        assert fetcher.fetch(_url(server, '/a.pem')) == b'pem for /a.pem'
+        assert fetcher.fetch(_url(server, '/b.pem')) == b'pem for /b.pem'
+
+        assert server.requests == ['/a.pem', '/b.pem']
+        assert server.connections == 1
+
+        fetcher.close()
+
+    def test_retries_server_errors(self, server):
+        fetcher = CertificateFetcher(backoff=0, retries=2)
+        server.statuses = [503, 500]
+
+        assert fetcher.fetch(_url(server, '/a.pem')) == b'pem for /a.pem'
+        assert len(server.requests) == 3
+
+    def test_total_timeout(self, server):
+        fetcher = CertificateFetcher(backoff=0.2, retries=5,
+                                     total_timeout=0.5)
+        server.statuses = [500] * 6
+
+        start = time.monotonic()
+        with pytest.raises(FetchError):
+            fetcher.fetch(_url(server, '/a.pem'))
+
+        # 0.2s then 0.4s of backoff would run past the limit
+        assert len(server.requests) == 2
+        assert time.monotonic() - start < 0.5
+
+    def test_no_retry_on_client_error(self, server):
+        fetcher = CertificateFetcher(backoff=0, retries=2)
+        server.statuses = [404]
+
+        with pytest.raises(FetchError):
+            fetcher.fetch(_url(server, '/a.pem'))
+
+        assert len(server.requests) == 1
+
+    def test_circuit_opens(self, server):
+        fetcher = CertificateFetcher(backoff=0, retries=0,
+                                     failure_threshold=2)
+        server.statuses = [500, 500]
+
+        for _ in range(2):
+            with pytest.raises(FetchError):
+                fetcher.fetch(_url(server, '/a.pem'))
+
+        # Fails fast without touching the server
+        with pytest.raises(FetchError):
+            fetcher.fetch(_url(server, '/a.pem'))
+
+        assert len(server.requests) == 2
+
+
+class TestCircuitBreaker:
+    '''alexandra.fetch.CircuitBreaker'''
+
+    def test_half_open(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10,
+                                 clock=clock)
+
+        breaker.record_failure()
+        assert breaker.is_open
+        assert not breaker.allow()
+
+        clock.now = 10
+        assert breaker.allow()
+        assert not breaker.allow()
+
+        breaker.record_success()
+        assert not breaker.is_open
+        assert breaker.allow()
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+from werkzeug.test import Client
+
+from alexandra import util
+from alexandra.app import Application
+from alexandra.cache import LRUCache
+from alexandra.instrument import RequestTiming
+from alexandra.metrics import MetricsRegistry
+
+
+def _timing(request_type, intent, outcome, total=0.01):
+    timing = RequestTiming()
+    timing.request_type = request_type
+    timing.intent = intent
+    timing.phases = {'dispatch': total}
+    timing.finish(outcome)
+    timing.total = total
+
+    return timing
+
+
+def _intent(name):
+    return json.dumps({
+        'request': {'type': 'IntentRequest', 'intent': {'name': name}}
+    })
+
+
+class TestMetricsRegistry:
+    '''alexandra.metrics.MetricsRegistry'''
+
+    def test_render(self):
+        registry = MetricsRegistry()
+
+        registry.observe(_timing('IntentRequest', 'Foo', 'ok'))
+        registry.observe(_timing('IntentRequest', 'Foo', 'ok', total=0.2))
+        registry.observe(_timing('LaunchRequest', None, 'invalid'))
+        registry.unknown_intent('What')
+
+        text = registry.render()
+
+        assert 'alexandra_requests_total{request_type="IntentRequest",intent="Foo",outcome="ok"} 2\n' in text
+        assert 'alexandra_validation_failures_total 1\n' in text
+        assert 'alexandra_unknown_intents_total{intent="What"} 1\n' in text
+        assert 'alexandra_request_duration_seconds_bucket{request_type="IntentRequest",intent="Foo",le="0.01"} 1\n' in text
+        assert 'alexandra_request_duration_seconds_bucket{request_type="IntentRequest",intent="Foo",le="0.25"} 2\n' in text
+        assert 'alexandra_request_duration_seconds_bucket{request_type="IntentRequest",intent="Foo",le="+Inf"} 2\n' in text
+        assert 'alexandra_request_duration_seconds_count{request_type="IntentRequest",intent="Foo"} 2\n' in text
+        assert '# TYPE alexandra_certificate_cache_hits_total counter\n' in text
+
+    def test_shared_directory(self, tmpdir):
+        a = MetricsRegistry(directory=str(tmpdir))
+        a.observe(_timing('IntentRequest', 'Foo', 'ok'))
+        a.flush()
+
+        # Pretend two other worker processes wrote the same thing, and a
+        # third that has since exited.
+        exited = subprocess.Popen([sys.executable, '-c', ''])
+        exited.wait()
+
+        snapshot = tmpdir.listdir()[0]
+        snapshot.copy(tmpdir.join('metrics-%d.json' % os.getppid()))
+        snapshot.copy(tmpdir.join('metrics-1.json'))
+        snapshot.copy(tmpdir.join('metrics-%d.json' % exited.pid))
+
+        b = MetricsRegistry(directory=str(tmpdir))
+        text = b.render()
+
+        assert 'alexandra_requests_total{request_type="IntentRequest",intent="Foo",outcome="ok"} 2\n' in text
+        assert not tmpdir.join('metrics-%d.json' % exited.pid).exists()
+        assert len(tmpdir.listdir()) == 3
+
+    def test_certificate_cache_counted_once(self, monkeypatch):
+        class FreshCert:
+            def needs_refresh(self, now=None):
+                return False
+
+        url = 'https://s3.amazonaws.com/echo.api/echo-api-cert.pem'
+
+        monkeypatch.setattr(util, '_cache', LRUCache())
+        monkeypatch.setattr(util, '_load_certificate',
+                            lambda url: (FreshCert(), None))
+        monkeypatch.setattr(util, '_verify_signature', lambda *args: True)
+
+        asgi_app = Application().create_asgi_app()
+        headers = {'SignatureCertChainUrl': url, 'Signature-256': ''}
+
+        loop = asyncio.new_event_loop()
+        try:
+            for _ in range(2):
+                assert loop.run_until_complete(
+                    asgi_app._validate_certificate(headers, b'{}'))
+        finally:
+            loop.close()
+
+        counters = MetricsRegistry().snapshot()['counters']
+        assert counters['alexandra_certificate_cache_misses_total'] == \
+            {'[]': 1}
+        assert counters['alexandra_certificate_cache_hits_total'] == \
+            {'[]': 1}
+
+
+def test_metrics_endpoint():
+    app = Application()
+    client = Client(app.create_wsgi_app(validate_requests=False))
+
+    # Not enabled yet
+    assert client.get('/metrics').status_code == 400
+
+    app.enable_metrics()
+
+    @app.intent('Foo')
+    def foo():
+        return {}
+
+    client.post('/', data=_intent('Foo'))
+    client.post('/', data=_intent('Bar'))
+
+    resp = client.get('/metrics')
+    text = resp.get_data(as_text=True)
+
+    assert resp.status_code == 200
+    assert resp.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    assert 'alexandra_requests_total{request_type="IntentRequest",intent="Foo",outcome="ok"} 1\n' in text
+    assert 'alexandra_unknown_intents_total{intent="Bar"} 1\n' in text
@@ -0,0 +1,238 @@
+import json
+
+import pytest
+
+from werkzeug.test import Client
+
+from alexandra import respond
+from alexandra.app import Application
+
+
+def _intent(name, session=None):
+    return {
+        'request': {'type': 'IntentRequest', 'intent': {'name': name}},
+        'session': session,
+    }
+
+
+def _app():
+    app = Application()
+
+    @app.intent('Hello')
+    def hello():
+        return respond('hello')
+
+    @app.intent('Fail')
+    def fail():
+        raise RuntimeError('boom')
+
+    @app.intent('AsyncHello')
+    async def async_hello():
+        return respond('hello')
+
+    @app.intent('AsyncFail')
+    async def async_fail():
+        raise RuntimeError('boom')
+
+    return app
+
+
+def _text(resp):
+    return resp['response']['outputSpeech']['text']
+
+
+class TestMiddleware:
+    '''Application.before_request, after_request and error_handler'''
+
+    def test_none_registered(self):
+        app = _app()
+
+        assert app._middleware is None
+        assert _text(app.dispatch_request(_intent('Hello'))) == 'hello'
+
+    def test_order(self):
+        app = _app()
+        calls = []
+
+        for name in ('a', 'b'):
+            @app.before_request
+            def before(body, session, name=name):
+                calls.append('before ' + name)
+
+            @app.after_request
+            def after(body, session, resp, name=name):
+                calls.append('after ' + name)
+                return resp
+
+        assert _text(app.dispatch_request(_intent('Hello'))) == 'hello'
+        assert calls == ['before a', 'before b', 'after b', 'after a']
+
+    def test_before_short_circuits(self):
+        app = _app()
+        calls = []
+
+        @app.before_request
+        def deny(body, session):
+            return respond('denied')
+
+        @app.before_request
+        def never(body, session):
+            calls.append('never')
+
+        @app.after_request
+        def after(body, session, resp):
+            calls.append(_text(resp))
+            return resp
+
+        assert _text(app.dispatch_request(_intent('Hello'))) == 'denied'
+        assert calls == ['denied']
+
+    def test_after_replaces(self):
+        app = _app()
+
+        @app.after_request
+        def replace(body, session, resp):
+            return respond(body['request']['intent']['name'])
+
+        assert _text(app.dispatch_request(_intent('Hello'))) == 'Hello'
+
+    def test_error_handler(self):
+        app = _app()
+        errors = []
+
+        @app.error_handler
+        def passes(body, session, error):
+            errors.append(error)
+
+        @app.error_handler
+        def recovers(body, session, error):
+            return respond('sorry')
+
+        assert _text(app.dispatch_request(_intent('Fail'))) == 'sorry'
+        assert [str(e) for e in errors] == ['boom']
+
+    def test_error_handler_reraises(self):
+        app = _app()
+
+        @app.error_handler
+        def passes(body, session, error):
+            return None
+
+        with pytest.raises(RuntimeError):
+            app.dispatch_request(_intent('Fail'))
+
+    def test_error_in_hook(self):
+        app = _app()
+
+        @app.before_request
+        def broken(body, session):
+            raise KeyError('hook')
+
+        @app.error_handler
+        def recovers(body, session, error):
+            return respond(type(error).__name__)
+
+        assert _text(app.dispatch_request(_intent('Hello'))) == 'KeyError'
+
+    def test_session(self):
+        app = _app()
+
+        @app.before_request
+        def require_user(body, session):
+            if session.user_id != 'alice':
+                return respond('who are you?')
+
+        session = {'new': True, 'user': {'userId': 'bob'}}
+        assert _text(app.dispatch_request(_intent('Hello', session))) == \
+            'who are you?'
+
+    def test_async_handlers(self):
+        app = _app()
+
+        @app.after_request
+        def shout(body, session, resp):
+            return respond(_text(resp).upper())
+
+        @app.error_handler
+        def recovers(body, session, error):
+            return respond('sorry')
+
+        assert _text(app.lambda_handler(_intent('AsyncHello'))) == 'HELLO'
+        assert _text(app.lambda_handler(_intent('AsyncFail'))) == 'sorry'
+
+    def test_async_hooks(self):
+        app = _app()
+
+        @app.before_request
+        async def before(body, session):
+            if body['request']['intent']['name'] == 'Fail':
+                return respond('skipped')
+
+        @app.after_request
+        async def after(body, session, resp):
+            return respond(_text(resp) + '!')
+
+        @app.error_handler
+        async def passes(body, session, error):
+            return None
+
+        assert _text(app.lambda_handler(_intent('Hello'))) == 'hello!'
+        assert _text(app.lambda_handler(_intent('Fail'))) == 'skipped!'
+
+        with pytest.raises(RuntimeError):
+            app.lambda_handler(_intent('AsyncFail'))
+
+    def test_deadline(self):
+        app = _app()
+        app.set_deadline(0.05)
+
+        @app.intent('Slow')
+        def slow():
+            import time
+            time.sleep(0.2)
+
+        @app.after_request
+        def after(body, session, resp):
+            return respond(_text(resp) + '!')
+
+        assert _text(app.dispatch_request(_intent('Slow'))).endswith('!')
+        assert _text(app.dispatch_request(_intent('Hello'))) == 'hello!'
+
+    def test_static_response(self):
+        app = _app()
+        help_response = respond('help', static=True)
+
+        @app.intent('Help')
+        def help_intent():
+            return help_response
+
+        @app.after_request
+        def add_card(body, session, resp):
+            resp = resp.copy()
+            resp['response'] = dict(resp['response'], card={'type': 'Simple'})
+            return resp
+
+        client = Client(app.create_wsgi_app(validate_requests=False))
+        data = json.loads(client.post('/', data=json.dumps(
+            _intent('Help'))).get_data())
+
+        assert data['response']['card'] == {'type': 'Simple'}
+        assert 'card' not in help_response['response']
+
+    def test_static_response_in_place(self):
+        app = _app()
+        help_response = respond('help', static=True)
+
+        @app.intent('Help')
+        def help_intent():
+            return help_response
+
+        @app.after_request
+        def add_card(body, session, resp):
+            resp['response']['card'] = {'type': 'Simple'}
+            return resp
+
+        with pytest.raises(TypeError):
+            app.dispatch_request(_intent('Help'))
+
+        assert 'card' not in help_response['response']
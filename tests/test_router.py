@@ -0,0 +1,104 @@
+import json
+
+import pytest
+from werkzeug.test import Client
+
+from alexandra.app import Application
+from alexandra.router import SkillRouter
+from alexandra.util import respond
+
+
+def _intent(application_id, name='Hello'):
+    return {
+        'session': {
+            'sessionId': 's1',
+            'new': True,
+            'application': {'applicationId': application_id},
+            'user': {'userId': 'u1'},
+        },
+        'request': {'type': 'IntentRequest', 'intent': {'name': name}},
+    }
+
+
+def _skill(name):
+    app = Application('amzn1.ask.skill.%s' % name)
+
+    @app.intent('Hello')
+    def hello():
+        return respond(name)
+
+    return app
+
+
+def _router():
+    router = SkillRouter()
+    router.register(_skill('weather'))
+    router.register(_skill('trivia'))
+
+    return router
+
+
+class TestSkillRouter:
+    '''alexandra.router.SkillRouter'''
+
+    def test_dispatch(self):
+        router = _router()
+
+        assert router.dispatch_request(_intent('amzn1.ask.skill.weather')) \
+            == respond('weather')
+        assert router.dispatch_request(_intent('amzn1.ask.skill.trivia')) \
+            == respond('trivia')
+
+        with pytest.raises(ValueError):
+            router.dispatch_request(_intent('amzn1.ask.skill.other'))
+
+    def test_context_application(self):
+        router = _router()
+        body = {
+            'context': {'System': {
+                'application': {'applicationId': 'amzn1.ask.skill.trivia'}}},
+            'request': {'type': 'IntentRequest', 'intent': {'name': 'Hello'}},
+        }
+
+        assert router.dispatch_request(body) == respond('trivia')
+
+    def test_register(self):
+        router = _router()
+
+        with pytest.raises(ValueError):
+            router.register(Application())
+
+        with pytest.raises(ValueError):
+            router.register(Application('amzn1.ask.skill.weather'))
+
+        app = router.register(Application(), 'amzn1.ask.skill.other')
+        assert router.skills['amzn1.ask.skill.other'] is app
+
+    def test_wsgi(self):
+        client = Client(_router().create_wsgi_app(validate_requests=False))
+
+        resp = client.post('/', data=json.dumps(
+            _intent('amzn1.ask.skill.trivia')))
+        assert json.loads(resp.get_data()) == respond('trivia')
+
+        resp = client.post('/', data=json.dumps(
+            _intent('amzn1.ask.skill.other')))
+        assert resp.status_code == 403
+
+    def test_lambda(self):
+        router = _router()
+
+        assert router.lambda_handler(_intent('amzn1.ask.skill.weather')) \
+            == respond('weather')
+
+    def test_shared_metrics(self):
+        router = SkillRouter()
+        first = router.register(Application('amzn1.ask.skill.first'))
+        metrics = router.enable_metrics()
+        second = router.register(Application('amzn1.ask.skill.second'))
+
+        assert first.metrics is metrics
+        assert second.metrics is metrics
+
+        router.dispatch_request(_intent('amzn1.ask.skill.second', 'Nope'))
+        assert metrics.unknown_intents.snapshot() == {('Nope',): 1}
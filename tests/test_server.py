@@ -0,0 +1,220 @@
+import http.client
+import json
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+
+import pytest
+
+from alexandra import server as alexandra_server
+
+
+SERVER = textwrap.dedent('''
+    import logging, os
+    import alexandra
+
+    logging.basicConfig(level=logging.INFO)
+    app = alexandra.Application()
+
+    @app.launch
+    def launch(session):
+        return {'pid': os.getpid()}
+
+    app.serve('127.0.0.1', 0, workers=2, threads=4, validate_requests=False,
+              warmup=lambda: print('warm %d' % os.getpid(), flush=True))
+''')
+
+LAUNCH = json.dumps({'request': {'type': 'LaunchRequest'}})
+
+
+def _post(conn):
+    conn.request('POST', '/', LAUNCH)
+    resp = conn.getresponse()
+    return json.loads(resp.read())['pid']
+
+
+def _pids(port, count=20):
+    '''Workers answering new connections.'''
+
+    pids = set()
+
+    for _ in range(count):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        pids.add(_post(conn))
+        conn.close()
+
+    return pids
+
+
+@pytest.fixture
+def server():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))] +
+        [env.get('PYTHONPATH', '')])
+
+    proc = subprocess.Popen([sys.executable, '-c', SERVER], env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            universal_newlines=True)
+    port = None
+
+    while port is None:
+        line = proc.stdout.readline()
+        assert line, 'server exited'
+
+        if 'listening on' in line:
+            port = int(line.split(':')[-1].split()[0])
+
+    try:
+        yield proc, port
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork()')
+class TestPreforkServer:
+    '''alexandra.server.PreforkServer'''
+
+    def test_workers(self, server):
+        proc, port = server
+
+        pids = _pids(port)
+        assert len(pids) <= 2
+        assert proc.pid not in pids
+
+        # Connections are kept alive
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        first = _post(conn)
+        assert all(_post(conn) == first for _ in range(5))
+        conn.close()
+
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(timeout=10) == 0
+
+    def test_errors_keep_connection(self, server):
+        proc, port = server
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+
+        conn.request('POST', '/', 'not json')
+        resp = conn.getresponse()
+        resp.read()
+        assert resp.status == 400
+
+        conn.request('GET', '/')
+        resp = conn.getresponse()
+        resp.read()
+        assert resp.status == 400
+
+        assert _post(conn)
+
+        # Too large to be worth reading just to keep the connection
+        conn.request('POST', '/', b'x' * 256 * 1024)
+        resp = conn.getresponse()
+        resp.read()
+        assert resp.status == 413
+        assert resp.getheader('Connection') == 'close'
+
+    def test_reload(self, server):
+        proc, port = server
+        before = _pids(port)
+
+        proc.send_signal(signal.SIGHUP)
+
+        for _ in range(50):
+            after = _pids(port, 5)
+            if not after & before:
+                break
+            time.sleep(0.1)
+
+        assert not after & before
+
+        proc.send_signal(signal.SIGTERM)
+        out, _ = proc.communicate(timeout=10)
+
+        # Warm-up ran in the master, and again on reload
+        assert out.count('warm %d' % proc.pid) == 1
+        assert 'reloading workers' in out
+
+    def test_replaces_dead_workers(self, server):
+        proc, port = server
+        victim = _pids(port, 1).pop()
+
+        os.kill(victim, signal.SIGKILL)
+
+        for _ in range(50):
+            pids = _pids(port, 10)
+            if victim not in pids:
+                break
+            time.sleep(0.1)
+
+        assert victim not in pids
+
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(timeout=10) == 0
+
+
+def _write_app(environ, start_response):
+    path = environ['PATH_INFO']
+    headers = [('Content-Type', 'text/plain')]
+
+    if path == '/sized':
+        headers.append(('Content-Length', '11'))
+
+    write = start_response('200 OK', headers)
+
+    if path == '/empty':
+        return [b'hello world']
+
+    write(b'hello')
+    write(b' ')
+    return [b'wor', b'ld']
+
+
+@pytest.fixture
+def write_server():
+    sock = alexandra_server._bind('127.0.0.1', 0, reuse_port=False)
+    httpd = alexandra_server._PooledServer(
+        sock, _write_app, 2, 5, False, os.getppid())
+
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        yield sock.getsockname()[1]
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        httpd.drain(1)
+
+
+class TestWrite:
+    '''The WSGI write() callable'''
+
+    def _get(self, conn, path):
+        conn.request('GET', path)
+        resp = conn.getresponse()
+        return resp, resp.read()
+
+    def test_unsized(self, write_server):
+        conn = http.client.HTTPConnection('127.0.0.1', write_server, timeout=5)
+        resp, data = self._get(conn, '/')
+
+        assert resp.status == 200
+        assert data == b'hello world'
+        assert resp.getheader('Connection') == 'close'
+
+    def test_sized_keeps_connection(self, write_server):
+        conn = http.client.HTTPConnection('127.0.0.1', write_server, timeout=5)
+
+        for path in ('/sized', '/sized', '/empty'):
+            resp, data = self._get(conn, path)
+
+            assert data == b'hello world'
+            assert resp.getheader('Connection') is None
+            assert resp.getheader('Content-Length') == '11'
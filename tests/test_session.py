@@ -1,6 +1,9 @@
 # coding: utf-8
 
-from alexandra import Session
+import pytest
+
+from alexandra import Session, respond, session
+from alexandra.app import Application
 
 
 SESSION_BODY = {
@@ -39,3 +42,123 @@ class TestSession:
         assert self.session.get('not present', 'default') == 'default'
 
         assert self.session.body is SESSION_BODY
+
+    def test_repr(self):
+        assert repr(self.session) == '<Session session_id>'
+
+        long_session = Session({'sessionId': 'x' * 1000, 'new': True,
+                                'attributes': {'big': 'y' * 10000}})
+
+        assert len(repr(long_session)) < 100
+        assert repr(long_session).endswith('... new>')
+
+    def test_no_instance_dict(self):
+        assert not hasattr(self.session, '__dict__')
+
+    def test_attributes_not_copied(self):
+        assert self.session.attributes is SESSION_BODY['attributes']
+        assert Session({}).attributes == {}
+
+
+def _store_cases(tmpdir):
+    return [
+        session.MemorySessionStore(maxsize=2, ttl=60),
+        session.SQLiteSessionStore(str(tmpdir.join('sessions.db')), ttl=60),
+    ]
+
+
+class TestSessionStores:
+    '''alexandra.session.MemorySessionStore, SQLiteSessionStore'''
+
+    def test_roundtrip(self, tmpdir):
+        for store in _store_cases(tmpdir):
+            assert store.load('a') is None
+
+            store.save('a', {'fizz': 'buzz'})
+            assert store.load('a') == {'fizz': 'buzz'}
+
+            store.save('a', {'foo': 'bar'})
+            assert store.load('a') == {'foo': 'bar'}
+
+            store.delete('a')
+            assert store.load('a') is None
+
+    def test_ttl(self, tmpdir):
+        for store in _store_cases(tmpdir):
+            store.ttl = -1
+            store.save('a', {'fizz': 'buzz'})
+
+            assert store.load('a') is None
+
+    def test_memory_bounded(self):
+        store = session.MemorySessionStore(maxsize=2)
+
+        for key in 'abc':
+            store.save(key, {'key': key})
+
+        assert store.load('a') is None
+        assert store.load('c') == {'key': 'c'}
+
+
+def _request(req_type, session_id='s1', user_id='u1', attributes=None):
+    return {
+        'session': {
+            'new': False,
+            'sessionId': session_id,
+            'user': {'userId': user_id},
+            'attributes': attributes or {},
+        },
+        'request': {'type': req_type, 'intent': {'name': 'Count'}},
+    }
+
+
+class TestApplicationSessionStore:
+    '''alexandra.app.Application.use_session_store'''
+
+    def _app(self, key):
+        app = Application()
+        app.use_session_store(session.MemorySessionStore(), key=key)
+
+        @app.intent('Count')
+        def count(slots, sesh):
+            n = sesh.get('count', 0) + 1
+            return respond(attributes={'count': n}, end_session=n >= 3)
+
+        return app
+
+    def test_keyed_by_session(self):
+        app = self._app('session_id')
+        store = app.session_store
+
+        resp = app.dispatch_request(_request('IntentRequest'))
+
+        # Attributes stay on the server
+        assert resp['sessionAttributes'] == {}
+        assert store.load('s1') == {'count': 1}
+
+        # ... and anything sent by Alexa is ignored
+        app.dispatch_request(_request('IntentRequest',
+                                      attributes={'count': 100}))
+        assert store.load('s1') == {'count': 2}
+
+        # Forgotten once the session ends
+        app.dispatch_request(_request('IntentRequest'))
+        assert store.load('s1') is None
+
+        app.dispatch_request(_request('IntentRequest', session_id='s2'))
+        app.dispatch_request(_request('SessionEndedRequest', session_id='s2'))
+        assert store.load('s2') is None
+
+    def test_keyed_by_user(self):
+        app = self._app('user_id')
+
+        app.dispatch_request(_request('IntentRequest', session_id='s1'))
+        app.dispatch_request(_request('SessionEndedRequest', session_id='s1'))
+        app.dispatch_request(_request('IntentRequest', session_id='s2'))
+
+        assert app.session_store.load('u1') == {'count': 2}
+
+    def test_bad_key(self):
+        with pytest.raises(ValueError):
+            Application().use_session_store(session.MemorySessionStore(),
+                                            key='device_id')
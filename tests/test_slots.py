@@ -0,0 +1,166 @@
+import copy
+import datetime as dt
+import pickle
+
+from alexandra import codec
+from alexandra.app import Application
+from alexandra.slots import (Slot, parse_slots, to_date, to_date_range,
+                             to_duration, to_number)
+
+
+DRINK = {
+    'name': 'Drink',
+    'value': 'a cuppa',
+    'resolutions': {
+        'resolutionsPerAuthority': [{
+            'authority': 'amzn1.er-authority.echo-sdk.skill.Drinks',
+            'status': {'code': 'ER_SUCCESS_NO_MATCH'},
+        }, {
+            'authority': 'amzn1.er-authority.echo-sdk.skill.DrinkType',
+            'status': {'code': 'ER_SUCCESS_MATCH'},
+            'values': [
+                {'value': {'name': 'tea', 'id': 'TEA'}},
+                {'value': {'name': 'coffee', 'id': 'COFFEE'}},
+            ],
+        }],
+    },
+}
+
+
+class TestSlot:
+    '''alexandra.slots.Slot'''
+
+    def test_is_a_string(self):
+        slot = Slot({'name': 'Name', 'value': 'alice'})
+
+        assert slot == 'alice'
+        assert isinstance(slot, str)
+        assert 'hi %s' % slot == 'hi alice'
+        assert {slot: 1}['alice'] == 1
+        assert slot.name == 'Name'
+
+    def test_encodes_as_string(self):
+        slot = Slot({'name': 'Name', 'value': 'alice'})
+
+        for json_codec in (codec.JsonCodec(), codec.default_codec()):
+            assert json_codec.dumps({'name': slot}) == b'{"name":"alice"}'
+
+    def test_copy(self):
+        slot = Slot(DRINK)
+
+        for other in (copy.deepcopy(slot), pickle.loads(pickle.dumps(slot))):
+            assert other == 'a cuppa'
+            assert other.id == 'TEA'
+
+    def test_resolution(self):
+        slot = Slot(DRINK)
+
+        assert slot.id == 'TEA'
+        assert slot.resolved == 'tea'
+        assert slot.resolution == {'name': 'tea', 'id': 'TEA'}
+
+    def test_no_resolution(self):
+        slot = Slot({'name': 'Drink', 'value': 'mud'})
+
+        assert slot.id is None
+        assert slot.resolved == 'mud'
+        assert type(slot.resolved) is str
+
+        no_match = dict(DRINK, resolutions={'resolutionsPerAuthority': [
+            DRINK['resolutions']['resolutionsPerAuthority'][0]]})
+        assert Slot(no_match).id is None
+
+    def test_conversions(self):
+        assert Slot({'value': '42'}).number == 42
+        assert Slot({'value': '2017-11-25'}).date == dt.date(2017, 11, 25)
+        assert Slot({'value': '2017-11'}).date_range == \
+            (dt.date(2017, 11, 1), dt.date(2017, 11, 30))
+        assert Slot({'value': 'PT10M'}).duration == dt.timedelta(minutes=10)
+
+
+class TestParseSlots:
+    '''alexandra.slots.parse_slots'''
+
+    def test_parse(self):
+        slots = parse_slots({
+            'Drink': DRINK,
+            'Size': {'name': 'Size'},
+        })
+
+        assert slots == {'Drink': 'a cuppa', 'Size': None}
+        assert slots['Drink'].id == 'TEA'
+
+    def test_dispatch(self):
+        app = Application()
+
+        @app.intent('Order')
+        def order(slots, session):
+            return slots['Drink'].id, slots['Count'].number
+
+        body = {
+            'request': {
+                'type': 'IntentRequest',
+                'intent': {
+                    'name': 'Order',
+                    'slots': {
+                        'Drink': DRINK,
+                        'Count': {'name': 'Count', 'value': '2'},
+                    },
+                },
+            },
+            'session': None,
+        }
+
+        assert app.dispatch_request(body) == ('TEA', 2)
+
+
+class TestConverters:
+    '''alexandra.slots.to_*'''
+
+    def test_number(self):
+        assert to_number('3') == 3
+        assert to_number('-12') == -12
+        assert to_number('2.5') == 2.5
+        assert to_number('?') is None
+
+    def test_date(self):
+        assert to_date('2017-11-25') == dt.date(2017, 11, 25)
+        assert to_date('2017-W48') is None
+        assert to_date('PRESENT_REF') is None
+
+    def test_date_range(self):
+        def d(*args):
+            return dt.date(*args)
+
+        assert to_date_range('2017-11-25') == (d(2017, 11, 25),) * 2
+        assert to_date_range('2017-W48') == (d(2017, 11, 27), d(2017, 12, 3))
+        assert to_date_range('2017-W48-WE') == \
+            (d(2017, 12, 2), d(2017, 12, 3))
+        assert to_date_range('2021-W01') == (d(2021, 1, 4), d(2021, 1, 10))
+        assert to_date_range('2016-02') == (d(2016, 2, 1), d(2016, 2, 29))
+        assert to_date_range('2017-12') == (d(2017, 12, 1), d(2017, 12, 31))
+        assert to_date_range('2017') == (d(2017, 1, 1), d(2017, 12, 31))
+        assert to_date_range('201X') == (d(2010, 1, 1), d(2019, 12, 31))
+        assert to_date_range('2017-SU') == (d(2017, 6, 1), d(2017, 8, 31))
+        assert to_date_range('2015-WI') == (d(2015, 12, 1), d(2016, 2, 29))
+
+        for value in ('PRESENT_REF', '?', '', '2017-W48-XX', '2017-13',
+                      '2017-11-25-1'):
+            assert to_date_range(value) is None
+
+    def test_duration(self):
+        assert to_duration('PT10M') == dt.timedelta(minutes=10)
+        assert to_duration('PT1H30M') == dt.timedelta(minutes=90)
+        assert to_duration('PT2.5S') == dt.timedelta(seconds=2.5)
+        assert to_duration('P2DT3H') == dt.timedelta(days=2, hours=3)
+        assert to_duration('P3W') == dt.timedelta(weeks=3)
+        assert to_duration('P1Y2M') == dt.timedelta(days=365 + 60)
+
+        for value in ('P', 'PT', 'P1DT', '10M', 'PT1D', '?'):
+            assert to_duration(value) is None
+
+    def test_memoized(self):
+        to_duration.cache_clear()
+
+        assert to_duration('PT5M') is to_duration('PT5M')
+        assert to_duration.cache_info().hits == 1
@@ -0,0 +1,79 @@
+import datetime as dt
+import json
+
+import pytest
+from werkzeug.test import Client
+
+from alexandra import util
+from alexandra.app import Application
+from alexandra.cache import LRUCache
+from alexandra.fetch import CertificateFetcher
+from alexandra.testing import SigningAuthority
+from alexandra.util import respond
+
+
+@pytest.fixture(scope='module')
+def authority():
+    return SigningAuthority()
+
+
+@pytest.fixture
+def server(authority, monkeypatch):
+    monkeypatch.setattr(util, '_cache', LRUCache())
+    monkeypatch.setattr(util, '_fetcher', CertificateFetcher(retries=0))
+    monkeypatch.setattr(util, '_policy', None)
+
+    with authority.serve() as server:
+        util.set_trust_policy(authority.policy(server.url))
+        yield server
+
+
+class TestSigningAuthority:
+    '''alexandra.testing.SigningAuthority'''
+
+    def test_signed_request(self, authority, server):
+        data = b'{"request": {}}'
+        headers = authority.sign(data, server.url)
+
+        assert util.validate_request_certificate(headers, data)
+        assert not util.validate_request_certificate(headers, data + b' ')
+
+        # Only the authority's own certificate URL is trusted
+        headers['SignatureCertChainUrl'] = server.url.replace(
+            '/echo.api/', '/other/')
+        assert not util.validate_request_certificate(headers, data)
+
+    def test_untrusted_by_default(self, authority, server):
+        util.set_trust_policy(None)
+
+        data = b'{}'
+        assert not util.validate_request_certificate(
+            authority.sign(data, server.url), data)
+
+    def test_save_load(self, tmpdir):
+        first = SigningAuthority.load(str(tmpdir))
+        second = SigningAuthority.load(str(tmpdir))
+
+        data = b'{}'
+        headers = first.sign(data, 'http://localhost/cert.pem')
+
+        assert second.sign(data, 'http://localhost/cert.pem') == headers
+
+    def test_wsgi(self, authority, server):
+        app = Application()
+
+        @app.launch
+        def launch(session):
+            return respond('hi')
+
+        client = Client(app.create_wsgi_app())
+        data = json.dumps({'request': {
+            'type': 'LaunchRequest',
+            'timestamp': dt.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        }}).encode('utf-8')
+
+        resp = client.post('/', data=data,
+                           headers=authority.sign(data, server.url))
+
+        assert resp.status_code == 200
+        assert json.loads(resp.get_data()) == respond('hi')
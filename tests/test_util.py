@@ -4,7 +4,10 @@ except:
     from io import StringIO
 
 import datetime as dt
+import json
 import logging
+import pickle
+import time
 
 import pytest
 
@@ -75,6 +78,25 @@ class TestReprompt:
         assert util.reprompt(ssml='foo') == util.respond(reprompt_ssml='foo', end_session=False)  # noqa
 
 
+class TestApplicationId:
+    '''alexandra.util.application_id'''
+
+    def test_session(self):
+        body = {'session': {'application': {'applicationId': 'a'}},
+                'context': {'System': {'application': {'applicationId': 'b'}}}}
+
+        assert util.application_id(body) == 'a'
+
+    def test_context(self):
+        body = {'context': {'System': {'application': {'applicationId': 'b'}}}}
+
+        assert util.application_id(body) == 'b'
+
+    def test_missing(self):
+        assert util.application_id({}) is None
+        assert util.application_id({'session': None, 'context': {}}) is None
+
+
 class TestValidateTimestamp:
     '''alexandra.util.validate_request_timestamp'''
 
@@ -121,6 +143,50 @@ class TestValidateTimestamp:
             'request': {'timestamp': now.strftime('%Y-%m-%dT%H:%M:%SZ')}
         }) is True
 
+    def test_fractional_and_offset_timestamps(self):
+        now = dt.datetime.utcnow()
+        local = now + dt.timedelta(hours=2)
+
+        for time_str in [now.strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+                         local.strftime('%Y-%m-%dT%H:%M:%S+02:00'),
+                         local.strftime('%Y-%m-%dT%H:%M:%S.123+0200')]:
+            assert util.validate_request_timestamp({
+                'request': {'timestamp': time_str}
+            }) is True
+
+    def test_invalid_timestamp(self):
+        for time_str in ['yesterday', '2016-12-28 05:59:13',
+                         '2016-13-28T05:59:13Z', '2016-12-28T05:59:13',
+                         '2016-12-28T05:59:13.Z', '2016-12-28T05:59:13+2',
+                         '2016-02-30T05:59:13Z', '2015-02-29T05:59:13Z',
+                         '2016-04-31T05:59:13Z', '2016-12-28T05:59:13+99:99',
+                         '2016-12-28T05:59:13+24:00',
+                         '2016-12-28T05:59:13-0560']:
+            assert util.validate_request_timestamp({
+                'request': {'timestamp': time_str}
+            }) is False
+
+            assert self.last_log() == 'invalid timestamp %s\n' % time_str
+
+    def test_parse_timestamp(self):
+        epoch = dt.datetime(1970, 1, 1)
+
+        for days in range(-1000, 30000, 37):
+            when = epoch + dt.timedelta(days=days, seconds=days * 7 % 86400)
+            expected = (when - epoch).total_seconds()
+
+            assert util.parse_timestamp(
+                when.strftime('%Y-%m-%dT%H:%M:%SZ')) == expected
+
+        assert util.parse_timestamp('2016-03-01T00:00:00Z') - \
+            util.parse_timestamp('2016-02-29T00:00:00Z') == 86400
+
+    def test_clock(self):
+        clock = util._Clock(resync=0)
+
+        for _ in range(3):
+            assert abs(clock() - time.time()) < 1
+
 
 class TestValidateCertificate:
     '''alexandra.util.validate_request_certificate'''
@@ -185,3 +251,68 @@ class TestValidateCertificate:
         data =  b'{"version":"1.0","session":{"new":true,"sessionId":"SessionId.a5a7c87a-4274-45bc-ac16-fb1bc02b93e4","application":{"applicationId":"amzn1.ask.skill.d4ed8492-e5ca-47f7-86d2-103d6a918c00"},"attributes":{},"user":{"userId":"amzn1.ask.account.AHVZCEBJIIIE32N24P522JWAJBM4W2CWOZVP5R74WC6LBMHQG4NPDV4CXCHV5FONOGH3WMOUYN7QWB5BIEYR26RT3VBZIRWF77ZEQZT2E23CSAYHCFWYH4NUSD7R522J2C6TCWOEFSHXTHTN3J77Z5KNEC4IHNXBJZGZELWKI5YR4KIDEXQZDOTLTK4WDREGVGVAQK73734BCYA"}},"request":{"type":"LaunchRequest","requestId":"EdwRequestId.5399ce92-0424-4dd4-b434-40213b4cd2c9","timestamp":"2016-12-28T05:59:14Z","locale":"en-US"}}'
         assert util.validate_request_certificate(headers, data) is False
         assert self.last_log() == 'invalid request signature\n'
+
+
+class TestStaticResponse:
+    '''alexandra.util.StaticResponse'''
+
+    def test_static(self):
+        resp = util.respond(text='foo', static=True)
+
+        assert isinstance(resp, util.StaticResponse)
+        assert resp == util.respond(text='foo')
+        assert json.loads(resp.data.decode('utf-8')) == resp
+
+        assert util.reprompt(text='foo', static=True) == \
+            util.reprompt(text='foo')
+
+    def test_read_only(self):
+        resp = util.respond(static=True)
+
+        with pytest.raises(TypeError):
+            resp['version'] = '2.0'
+
+        with pytest.raises(TypeError):
+            resp.update({})
+
+        with pytest.raises(TypeError):
+            resp |= {'version': '2.0'}
+
+        assert resp['version'] == '1.0'
+
+    def test_nested_read_only(self):
+        resp = util.respond(text='foo', reprompt_text='bar', static=True)
+        resp = pickle.loads(pickle.dumps(resp))
+
+        with pytest.raises(TypeError):
+            resp['response']['card'] = {}
+
+        with pytest.raises(TypeError):
+            resp['response']['outputSpeech'].update(text='changed')
+
+        with pytest.raises(TypeError):
+            resp['sessionAttributes'].setdefault('a', 1)
+
+        with pytest.raises(TypeError):
+            speech = resp['response']['outputSpeech']
+            speech |= {'text': 'changed'}
+
+        frozen = util.StaticResponse({'list': [{'a': 1}]})['list']
+
+        for change in (lambda: frozen.append(1), lambda: frozen[0].pop('a'),
+                       lambda: frozen.extend([]), frozen.sort):
+            with pytest.raises(TypeError):
+                change()
+
+        assert resp == util.respond(text='foo', reprompt_text='bar')
+
+    def test_copy(self):
+        resp = util.respond(text='foo', static=True)
+        copy = resp.copy()
+
+        assert type(copy) is dict
+        assert type(copy['response']['outputSpeech']) is dict
+        copy['response']['outputSpeech']['text'] = 'bar'
+
+        assert resp['response']['outputSpeech']['text'] == 'foo'
+        assert json.loads(resp.data.decode('utf-8')) == resp
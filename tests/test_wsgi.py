@@ -0,0 +1,163 @@
+import asyncio
+import io
+import json
+
+from werkzeug.test import Client
+
+from alexandra.app import Application
+from alexandra.codec import JsonCodec
+from alexandra.util import respond
+
+
+def _launch():
+    return json.dumps({'request': {'type': 'LaunchRequest'}})
+
+
+def _client(app, **kwargs):
+    return Client(app.create_wsgi_app(**kwargs))
+
+
+def test_dispatch():
+    app = Application()
+
+    @app.launch
+    def launch(session):
+        return {'launched': True}
+
+    resp = _client(app, validate_requests=False).post('/', data=_launch())
+
+    assert resp.status_code == 200
+    assert resp.mimetype == 'application/json'
+    assert json.loads(resp.get_data()) == {'launched': True}
+
+
+def test_async_handler():
+    app = Application()
+
+    @app.launch
+    async def launch(session):
+        await asyncio.sleep(0)
+        return {'launched': True}
+
+    client = _client(app, validate_requests=False)
+
+    for _ in range(2):
+        resp = client.post('/', data=_launch())
+        assert json.loads(resp.get_data()) == {'launched': True}
+
+
+def test_compact_output():
+    app = Application()
+    client = _client(app, validate_requests=False, codec=JsonCodec())
+
+    resp = client.post('/', data=_launch())
+
+    assert b'\n' not in resp.get_data()
+
+
+def test_bad_requests():
+    client = _client(Application(), validate_requests=False)
+
+    assert client.get('/').status_code == 400
+    assert client.post('/', data='not json').status_code == 400
+
+
+def test_validation_failure():
+    client = _client(Application())
+
+    assert client.post('/', data=_launch()).status_code == 403
+
+
+def test_too_large():
+    client = _client(Application(), validate_requests=False,
+                     max_content_length=64)
+
+    assert client.post('/', data=_launch()).status_code == 200
+    assert client.post('/', data='x' * 65).status_code == 413
+
+    # Without a Content-Length, reading stops just past the limit
+    resp = client.post('/', input_stream=io.BytesIO(b'x' * 4096),
+                       headers={'Transfer-Encoding': 'chunked'},
+                       environ_overrides={'wsgi.input_terminated': True})
+    assert resp.status_code == 413
+
+
+def test_unsigned_garbage_not_parsed():
+    class Codec(JsonCodec):
+        def loads(self, data):
+            raise AssertionError('should not be parsed')
+
+    client = _client(Application(), codec=Codec())
+
+    assert client.post('/', data='not json').status_code == 403
+
+
+def test_static_response():
+    app = Application()
+    help_response = respond(text='help!', static=True)
+
+    @app.launch
+    def launch(session):
+        return help_response
+
+    resp = _client(app, validate_requests=False).post('/', data=_launch())
+
+    assert resp.get_data() == help_response.data
+
+
+def test_instrumentation():
+    app = Application()
+    timings = []
+
+    @app.intent('Foo')
+    def foo():
+        return {}
+
+    app.instrumentation.subscribe(timings.append)
+    client = _client(app, validate_requests=False)
+
+    intent = {'request': {'type': 'IntentRequest', 'intent': {'name': 'Foo'}}}
+    client.post('/', data=json.dumps(intent))
+    client.post('/', data='garbage')
+
+    ok, bad = timings
+
+    assert ok.outcome == 'ok'
+    assert ok.request_type == 'IntentRequest'
+    assert ok.intent == 'Foo'
+    assert set(ok.phases) == set(['read', 'parse', 'dispatch', 'encode'])
+    assert ok.total >= sum(ok.phases.values())
+
+    assert bad.outcome == 'bad_request'
+    assert bad.request_type is None
+
+    # Validation failures are reported too
+    _client(app).post('/', data=json.dumps(intent))
+    assert timings[-1].outcome == 'invalid'
+    assert 'certificate' in timings[-1].phases
+
+
+def test_response_cache():
+    app = Application()
+    app.enable_response_cache()
+    calls = []
+
+    @app.intent('Foo')
+    def foo():
+        calls.append(1)
+        return respond('call %d' % len(calls))
+
+    client = _client(app, validate_requests=False)
+
+    def post(request_id):
+        intent = {'request': {'type': 'IntentRequest', 'requestId': request_id,
+                              'intent': {'name': 'Foo'}}}
+        return client.post('/', data=json.dumps(intent)).get_data()
+
+    first = post('req-1')
+
+    assert post('req-1') == first
+    assert len(calls) == 1
+
+    assert post('req-2') != first
+    assert len(calls) == 2